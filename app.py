@@ -1,102 +1,208 @@
-
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_cors import CORS
 from email_validator import validate_email, EmailNotValidError
 from datetime import datetime
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Union
+import os
+import json
+import time
 import secrets
-import mysql.connector
-from chatbot import ConversationManager
-from doctor_chatbot import DoctorConversationManager
+import logging
+import threading
+from sqlalchemy import text
+from config import Config, CONFIGS
+from database import engine_options, ensure_database, pool_stats
 from models import db, Patient
-
-# ---------- AUTO CREATE DATABASE ----------
-DB_NAME = "patient_db"
-MYSQL_USER = "root"         
-MYSQL_PASSWORD = "root"        
-MYSQL_HOST = "127.0.0.1"
-
-conn = mysql.connector.connect(
-    host=MYSQL_HOST,
-    user=MYSQL_USER,
-    password=MYSQL_PASSWORD
-)
-cursor = conn.cursor()
-cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
-cursor.close()
-conn.close()
-
-app = Flask(__name__)
-app.secret_key = secrets.token_hex(32) 
-
-# Dictionary to store conversation managers per user session
-conversation_managers = {}
-doctor_conversation_managers = {}
-
-app.config["SQLALCHEMY_DATABASE_URI"] = (
-    f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{DB_NAME}"
-)
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = "login"
-CORS(app, supports_credentials=True)
-
-
-# ---------- Models ----------
-class Patient(UserMixin, db.Model):
-    __tablename__ = "patients"
-    id = db.Column(db.BigInteger, primary_key=True)
-    full_name = db.Column(db.String(255), nullable=False)
-    email = db.Column(db.String(255), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
-    contact_number = db.Column(db.String(50))
-    gender = db.Column(db.String(50))
-    date_of_birth = db.Column(db.Date)
-    blood_group = db.Column(db.String(10))
-    marital_status = db.Column(db.String(50))
-    emergency_contact = db.Column(db.String(50))
-    allergies = db.Column(db.Text)
-    current_medications = db.Column(db.Text)
-    past_medications = db.Column(db.Text)
-    chronic_diseases = db.Column(db.Text)
-    injuries = db.Column(db.Text)
-    surgeries = db.Column(db.Text)
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "full_name": self.full_name,
-            "email": self.email,
-            "contact_number": self.contact_number,
-            "gender": self.gender,
-            "date_of_birth": self.date_of_birth.isoformat() if self.date_of_birth else None,
-            "blood_group": self.blood_group,
-            "marital_status": self.marital_status,
-            "emergency_contact": self.emergency_contact,
-            "allergies": self.allergies,
-            "current_medications": self.current_medications,
-            "past_medications": self.past_medications,
-            "chronic_diseases": self.chronic_diseases,
-            "injuries": self.injuries,
-            "surgeries": self.surgeries,
-        }
-
+from session_store import SessionConflict, build_session_store
+from identity_cache import IdentityCache
+from patient_import import import_patients, read_rows, detect_format, open_text
+from streaming import sse_stream
+
+# Importing this module, or calling create_app(), has no side effects: no
+# database connection, no LLM client and no knowledge base parsing. The
+# chatbots (and with them the LLM stack) and the knowledge base load on
+# first use, and the database is bootstrapped per DB_BOOTSTRAP. AppState.warm_up
+# does all of it ahead of traffic; /readyz and the ASGI startup hook call it.
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("healthmate", __name__)
+login_manager = LoginManager()
+login_manager.login_view = "healthmate.login"
+
+
+# ---------- App State ----------
+def load_patient_dict(patient_id):
+    patient = Patient.query.get(patient_id)
+    return patient.to_dict() if patient else None
+
+class AppState:
+    """Per-app services, built on first use rather than at import."""
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.started = time.time()
+        self.startup_ms: Optional[float] = None
+        self.warm_up_ms: Optional[float] = None
+        self.bootstrapped = False
+        self._lock = threading.Lock()
+        self._chat_stores = None
+        # Authenticated requests reuse a cached PatientIdentity instead of querying
+        # and re-serializing the patient row every time (see identity_cache.py)
+        self.patient_identities = IdentityCache(load_patient_dict)
+        self.patient_identities.watch_model(Patient)
+
+    def chat_stores(self):
+        """(patient, doctor) conversation stores; the first call imports the chatbots."""
+        if self._chat_stores is None:
+            with self._lock:
+                if self._chat_stores is None:
+                    from chatbot import ConversationManager
+                    from doctor_chatbot import DoctorConversationManager
+                    # Conversation managers per user session (in-process LRU + idle TTL, or an
+                    # out-of-process SQLite/Redis backend via SESSION_BACKEND, see session_store.py)
+                    self._chat_stores = (
+                        build_session_store(ConversationManager, "chatbot"),
+                        build_session_store(DoctorConversationManager, "doctor"),
+                    )
+        return self._chat_stores
+
+    @property
+    def conversation_managers(self):
+        return self.chat_stores()[0]
+
+    @property
+    def doctor_conversation_managers(self):
+        return self.chat_stores()[1]
+
+    def bootstrap_database(self):
+        """CREATE DATABASE (MySQL only) and any missing tables, once per process."""
+        if self.bootstrapped:
+            return
+        with self._lock:
+            if not self.bootstrapped:
+                ensure_database(self.app.config["SQLALCHEMY_DATABASE_URI"])
+                with self.app.app_context():
+                    db.create_all()
+                self.bootstrapped = True
+
+    def warm_up(self):
+        """Everything first use would do: knowledge base, chatbots, database bootstrap.
+
+        Idempotent, so a failed attempt (database still starting) can simply
+        be retried.
+        """
+        if self.warm_up_ms is not None:
+            return
+        started = time.perf_counter()
+        from knowledge_base import get_knowledge_base
+        get_knowledge_base()
+        self.chat_stores()
+        if self.app.config["DB_BOOTSTRAP"] != "off":
+            self.bootstrap_database()
+        self.warm_up_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("HealthMate warmed up in %.1f ms", self.warm_up_ms)
+
+def state() -> AppState:
+    return current_app.extensions["healthmate"]
+
+def uses_database(view):
+    """Bootstrap the database before `view` runs for the first time (DB_BOOTSTRAP=first_use)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_app.config["DB_BOOTSTRAP"] == "first_use":
+            state().bootstrap_database()
+        return view(*args, **kwargs)
+    return wrapper
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Patient.query.get(int(user_id))
+    return state().patient_identities.get(int(user_id))
+
+
+# ---------- App Factory ----------
+def create_app(config: Union[None, str, type, Mapping[str, Any]] = None) -> Flask:
+    """Build the app without touching the database, the LLM or the knowledge base.
+
+    `config` is a Config class, a mapping of overrides on top of Config, or
+    a name from config.CONFIGS ("default", "sqlite"); by default
+    $HEALTHMATE_CONFIG picks one.
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    if config is None or isinstance(config, str):
+        config = CONFIGS[config or os.getenv("HEALTHMATE_CONFIG", "default")]
+    if isinstance(config, Mapping):
+        app.config.from_object(Config)
+        app.config.update(config)
+    else:
+        app.config.from_object(config)
+    if not app.config.get("SECRET_KEY"):
+        if not app.config.get("GENERATE_SECRET_KEY"):
+            raise RuntimeError("SECRET_KEY is not set; set it in the environment (or .env), "
+                               "to the same value for every worker")
+        app.config["SECRET_KEY"] = secrets.token_hex(32)
+        logger.warning("SECRET_KEY is not set: using a random key for this process only. Logins "
+                       "won't survive a restart or work across workers; set SECRET_KEY outside development.")
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    CORS(app, supports_credentials=True)
+    app.register_blueprint(bp)
+    app_state = app.extensions["healthmate"] = AppState(app)
+
+    @app.cli.command("init-db")
+    def init_db():
+        """Create the database (MySQL) and any missing tables."""
+        app_state.bootstrap_database()
+
+    if app.config["DB_BOOTSTRAP"] == "startup":
+        app_state.bootstrap_database()
+    app_state.startup_ms = round((time.perf_counter() - started) * 1000, 1)
+    return app
+
+
+# ---------- Health ----------
+@bp.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the process is up. Touches no dependencies."""
+    app_state = state()
+    return jsonify({
+        "status": "ok",
+        "uptime_s": round(time.time() - app_state.started, 1),
+        "startup_ms": app_state.startup_ms,
+        "warm_up_ms": app_state.warm_up_ms
+    })
+
+@bp.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: warms the app up on the first call, then checks the database answers."""
+    checks = {}
+    try:
+        state().warm_up()
+        checks["warm_up"] = "ok"
+    except Exception as e:
+        checks["warm_up"] = f"{type(e).__name__}: {e}"
+    try:
+        db.session.execute(text("SELECT 1"))
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"{type(e).__name__}: {e}"
+    ready = all(result == "ok" for result in checks.values())
+    return jsonify({"status": "ready" if ready else "not_ready", "checks": checks}), 200 if ready else 503
 
 
 # ---------- Routes ----------
-@app.route("/register", methods=["POST"])
+@bp.route("/register", methods=["POST"])
+@uses_database
 def register():
     data = request.get_json() or {}
     full_name = data.get("full_name")
-    email = data.get("email")
+    email = (data.get("email") or "").strip().lower()  # stored lowercased, as by /patients/import
     password = data.get("password")
 
     if not full_name or not email or not password:
@@ -143,10 +249,11 @@ def register():
     return jsonify({"msg": "Registration successful"}), 201
 
 
-@app.route("/login", methods=["POST"])
+@bp.route("/login", methods=["POST"])
+@uses_database
 def login():
     data = request.get_json() or {}
-    email = data.get("email")
+    email = (data.get("email") or "").strip().lower()
     password = data.get("password")
 
     if not email or not password:
@@ -160,22 +267,158 @@ def login():
     return jsonify({"msg": "Login successful"}), 200
 
 
-@app.route("/logout", methods=["POST"])
+@bp.route("/logout", methods=["POST"])
+@uses_database
 @login_required
 def logout():
     logout_user()
     return jsonify({"msg": "Logged out successfully"}), 200
+
+
+# ---- Bulk Import ----
+PATIENT_IMPORT_TOKEN = os.getenv("PATIENT_IMPORT_TOKEN")
+PATIENT_IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("PATIENT_IMPORT_MAX_REPORTED_ERRORS", "1000"))
+
+@bp.route("/patients/import", methods=["POST"])
+@uses_database
+def import_patients_api():
+    """Bulk-register patients from an uploaded CSV/NDJSON file (or a raw NDJSON/CSV body).
+
+    Disabled unless PATIENT_IMPORT_TOKEN is set; callers send it as X-Import-Token.
+    """
+    if not PATIENT_IMPORT_TOKEN:
+        return jsonify({"msg": "Bulk import is disabled"}), 403
+    if not secrets.compare_digest(request.headers.get("X-Import-Token", ""), PATIENT_IMPORT_TOKEN):
+        return jsonify({"msg": "Invalid import token"}), 401
+
+    upload = request.files.get("file")
+    if upload is not None:
+        stream = open_text(upload.stream)
+        fmt = request.args.get("format") or detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = open_text(request.stream)
+        fmt = request.args.get("format") or detect_format(None, request.mimetype)
+
+    errors = []
+
+    def on_error(line_no, email, message):
+        if len(errors) < PATIENT_IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({"line": line_no, "email": email, "error": message})
+
+    try:
+        summary = import_patients(read_rows(stream, fmt), db.session, Patient.__table__, on_error=on_error)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    return jsonify({**summary, "errors": errors, "errors_truncated": summary["invalid"] + summary["duplicates"] > len(errors)}), 200
 from flask import jsonify
 
-@app.route("/getallpatients", methods=["GET"])
+# ---- Patient Listing ----
+# Column tuples rather than ORM objects: no identity map to grow, and the
+# TEXT columns are only fetched when asked for via ?fields=
+PATIENT_FIELDS = (
+    "id", "full_name", "email", "contact_number", "gender", "date_of_birth", "blood_group",
+    "marital_status", "emergency_contact", "allergies", "current_medications",
+    "past_medications", "chronic_diseases", "injuries", "surgeries",
+)
+PATIENT_PAGE_DEFAULT = int(os.getenv("PATIENT_PAGE_DEFAULT", "100"))
+PATIENT_PAGE_MAX = int(os.getenv("PATIENT_PAGE_MAX", "1000"))
+PATIENT_STREAM_WINDOW = int(os.getenv("PATIENT_STREAM_WINDOW", "10000"))
+PATIENT_YIELD_PER = int(os.getenv("PATIENT_YIELD_PER", "1000"))
+
+def parse_patient_fields(value: Optional[str]) -> List[str]:
+    """Requested columns in table order; `id` is always included (it is the cursor)."""
+    if not value:
+        return list(PATIENT_FIELDS)
+    wanted = {field.strip() for field in value.split(",") if field.strip()}
+    unknown = sorted(wanted - set(PATIENT_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return [field for field in PATIENT_FIELDS if field == "id" or field in wanted]
+
+def patient_row_to_dict(fields: List[str], row) -> Dict[str, Any]:
+    record = dict(zip(fields, row))
+    if record.get("date_of_birth") is not None:
+        record["date_of_birth"] = record["date_of_birth"].isoformat()
+    return record
+
+def iter_patient_rows(fields: List[str], after_id: Optional[int] = None,
+                      limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Patients in id order from `after_id` on, with flat memory at any table size.
+
+    The table is walked in keyset windows (id > last seen), each streamed
+    with yield_per. The windows keep memory bounded even on drivers that
+    buffer a whole result set client-side, and each query stays an index
+    range scan instead of a deep OFFSET.
+    """
+    columns = [getattr(Patient, field) for field in fields]
+    remaining = limit
+    while remaining is None or remaining > 0:
+        window = PATIENT_STREAM_WINDOW if remaining is None else min(PATIENT_STREAM_WINDOW, remaining)
+        query = db.session.query(*columns).order_by(Patient.id)
+        if after_id is not None:
+            query = query.filter(Patient.id > after_id)
+        seen = 0
+        for row in query.limit(window).yield_per(min(PATIENT_YIELD_PER, window)):
+            record = patient_row_to_dict(fields, row)
+            after_id = record["id"]
+            seen += 1
+            yield record
+        if remaining is not None:
+            remaining -= seen
+        if seen < window:
+            return
+
+def wants_ndjson() -> bool:
+    if request.args.get("format") == "ndjson":
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+def patient_json_array(records: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    """The legacy list-of-patients body, written one patient at a time."""
+    yield "["
+    for i, record in enumerate(records):
+        yield ("," if i else "") + json.dumps(record)
+    yield "]"
+
+@bp.route("/getallpatients", methods=["GET"])
+@uses_database
 def get_all_patients():
+    """List patients.
+
+    No paging parameters: the full list, as before, but streamed.
+    `limit` / `after_id`: one keyset page plus the cursor for the next.
+    `format=ndjson` (or Accept: application/x-ndjson): one patient per line.
+    `fields=a,b,c` applies to every mode.
+    """
+    try:
+        fields = parse_patient_fields(request.args.get("fields"))
+        after_id = request.args.get("after_id", type=int)
+        limit = request.args.get("limit", type=int)
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be a positive integer")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
-        patients = Patient.query.all()
-        return jsonify([patient.to_dict() for patient in patients]), 200
+        if wants_ndjson():
+            lines = (json.dumps(record) + "\n" for record in iter_patient_rows(fields, after_id, limit))
+            return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+        if limit is None and after_id is None:
+            return Response(stream_with_context(patient_json_array(iter_patient_rows(fields))),
+                            mimetype="application/json")
+
+        limit = min(limit or PATIENT_PAGE_DEFAULT, PATIENT_PAGE_MAX)
+        patients = list(iter_patient_rows(fields, after_id, limit))
+        next_after_id = patients[-1]["id"] if len(patients) == limit else None
+        return jsonify({"patients": patients, "next_after_id": next_after_id}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/patient/<int:patient_id>", methods=["GET"])
+@bp.route("/patient/<int:patient_id>", methods=["GET"])
+@uses_database
 def get_patient(patient_id):
     try:
         patient = Patient.query.get(patient_id)
@@ -185,12 +428,42 @@ def get_patient(patient_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/profile", methods=["GET"])
+@bp.route("/profile", methods=["GET"])
+@uses_database
 @login_required
 def profile():
     return jsonify({"patient": current_user.to_dict()}), 200
 
-@app.route("/chatbot", methods=["POST"])
+def wants_event_stream() -> bool:
+    """True when the client asked for Server-Sent Events rather than JSON."""
+    best = request.accept_mimetypes.best_match(["application/json", "text/event-stream"])
+    return best == "text/event-stream"
+
+@bp.errorhandler(SessionConflict)
+def session_conflict(e: SessionConflict):
+    # Two messages for one session at once: the later one would silently
+    # overwrite the earlier turn's state, so it is refused instead
+    return jsonify({"error": str(e)}), 409
+
+def stream_chat_turn(store, session_id: str, manager, user_text: str) -> Response:
+    """Run one turn as a text/event-stream of "delta" events and a final "done" event.
+
+    The manager updates its state before any LLM tokens are produced, so the
+    session is saved (or discarded) up front, before streaming starts.
+    """
+    events = manager.process_stream(user_text)
+    if manager.conversation_active:
+        store.save(session_id, manager)
+    else:
+        store.discard(session_id)
+    return Response(
+        stream_with_context(sse_stream(events)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@bp.route("/chatbot", methods=["POST"])
+@bp.route("/chatbot/stream", methods=["POST"])
 def chatbot_api():
     data = request.get_json()
     user_text = data.get("message", "").strip()
@@ -200,28 +473,32 @@ def chatbot_api():
 
     # Get or create conversation manager for this user session
     session_id = request.headers.get('X-Session-ID', 'default')
-    if session_id not in conversation_managers:
-        conversation_managers[session_id] = ConversationManager()
-    
-    conv_manager = conversation_managers[session_id]
-    
-    # Process the message
-    response = conv_manager.process(user_text)
-    
-    # If conversation ended, clean up the session
-    if response.get("conversation_ended"):
-        if session_id in conversation_managers:
-            del conversation_managers[session_id]
+    store = state().conversation_managers
+    # One turn per session at a time, from load to save (see session_store.py)
+    with store.lock(session_id):
+        conv_manager = store.get_or_create(session_id)
+
+        if request.path.endswith("/stream") or wants_event_stream():
+            return stream_chat_turn(store, session_id, conv_manager, user_text)
+
+        # Process the message
+        response = conv_manager.process(user_text)
+
+        # If conversation ended, clean up the session
+        if response.get("conversation_ended"):
+            store.discard(session_id)
+        else:
+            store.save(session_id, conv_manager)
 
     return jsonify(response)
 
-@app.route("/chatbot/status", methods=["GET"])
+@bp.route("/chatbot/status", methods=["GET"])
 def chatbot_status():
     """Get the current conversation status"""
     session_id = request.headers.get('X-Session-ID', 'default')
+    conv_manager = state().conversation_managers.get(session_id, touch=False)
     
-    if session_id in conversation_managers:
-        conv_manager = conversation_managers[session_id]
+    if conv_manager is not None:
         return jsonify({
             "active": conv_manager.conversation_active,
             "stage": conv_manager.stage,
@@ -234,19 +511,25 @@ def chatbot_status():
             "has_symptoms": False
         })
 
-@app.route("/chatbot/reset", methods=["POST"])
+@bp.route("/chatbot/reset", methods=["POST"])
 def chatbot_reset():
     """Reset the conversation for the current session"""
     session_id = request.headers.get('X-Session-ID', 'default')
-    
-    if session_id in conversation_managers:
-        conversation_managers[session_id].reset_conversation()
+    store = state().conversation_managers
+    with store.lock(session_id):
+        conv_manager = store.get(session_id)
+        if conv_manager is not None:
+            conv_manager.reset_conversation()
+            store.save(session_id, conv_manager)
+
+    if conv_manager is not None:
         return jsonify({"message": "Conversation reset successfully"})
     else:
         return jsonify({"message": "No active conversation to reset"})
 
 # ---- Doctor Chatbot Routes ----
-@app.route("/doctor-chatbot", methods=["POST"])
+@bp.route("/doctor-chatbot", methods=["POST"])
+@bp.route("/doctor-chatbot/stream", methods=["POST"])
 def doctor_chatbot_api():
     """Doctor chatbot API endpoint"""
     data = request.get_json()
@@ -257,28 +540,32 @@ def doctor_chatbot_api():
 
     # Get or create doctor conversation manager for this session
     session_id = request.headers.get('X-Session-ID', 'default')
-    if session_id not in doctor_conversation_managers:
-        doctor_conversation_managers[session_id] = DoctorConversationManager()
-    
-    doctor_conv_manager = doctor_conversation_managers[session_id]
-    
-    # Process the message
-    response = doctor_conv_manager.process(user_text)
-    
-    # If conversation ended, clean up the session
-    if response.get("conversation_ended"):
-        if session_id in doctor_conversation_managers:
-            del doctor_conversation_managers[session_id]
+    store = state().doctor_conversation_managers
+    # One turn per session at a time, from load to save (see session_store.py)
+    with store.lock(session_id):
+        doctor_conv_manager = store.get_or_create(session_id)
+
+        if request.path.endswith("/stream") or wants_event_stream():
+            return stream_chat_turn(store, session_id, doctor_conv_manager, user_text)
+
+        # Process the message
+        response = doctor_conv_manager.process(user_text)
+
+        # If conversation ended, clean up the session
+        if response.get("conversation_ended"):
+            store.discard(session_id)
+        else:
+            store.save(session_id, doctor_conv_manager)
 
     return jsonify(response)
 
-@app.route("/doctor-chatbot/status", methods=["GET"])
+@bp.route("/doctor-chatbot/status", methods=["GET"])
 def doctor_chatbot_status():
     """Get the current doctor conversation status"""
     session_id = request.headers.get('X-Session-ID', 'default')
+    doctor_conv_manager = state().doctor_conversation_managers.get(session_id, touch=False)
     
-    if session_id in doctor_conversation_managers:
-        doctor_conv_manager = doctor_conversation_managers[session_id]
+    if doctor_conv_manager is not None:
         return jsonify({
             "active": doctor_conv_manager.conversation_active,
             "stage": doctor_conv_manager.stage,
@@ -293,18 +580,95 @@ def doctor_chatbot_status():
             "has_symptoms": False
         })
 
-@app.route("/doctor-chatbot/reset", methods=["POST"])
+@bp.route("/doctor-chatbot/reset", methods=["POST"])
 def doctor_chatbot_reset():
     """Reset the doctor conversation for the current session"""
     session_id = request.headers.get('X-Session-ID', 'default')
-    
-    if session_id in doctor_conversation_managers:
-        doctor_conversation_managers[session_id].reset_conversation()
+    store = state().doctor_conversation_managers
+    with store.lock(session_id):
+        doctor_conv_manager = store.get(session_id)
+        if doctor_conv_manager is not None:
+            doctor_conv_manager.reset_conversation()
+            store.save(session_id, doctor_conv_manager)
+
+    if doctor_conv_manager is not None:
         return jsonify({"message": "Doctor consultation reset successfully"})
     else:
         return jsonify({"message": "No active doctor consultation to reset"})
 
-@app.route("/prescription/download/<prescription_id>", methods=["GET"])
+# ---- Admin ----
+# Operational endpoints (stats, knowledge base admin) need KB_ADMIN_TOKEN as
+# X-Admin-Token; with no token configured they are disabled
+KB_ADMIN_TOKEN = os.getenv("KB_ADMIN_TOKEN")
+
+def admin_denied():
+    """An error response unless the caller sent KB_ADMIN_TOKEN as X-Admin-Token."""
+    if not KB_ADMIN_TOKEN:
+        return jsonify({"msg": "Admin endpoints are disabled"}), 403
+    if not secrets.compare_digest(request.headers.get("X-Admin-Token", ""), KB_ADMIN_TOKEN):
+        return jsonify({"msg": "Invalid admin token"}), 401
+    return None
+
+@bp.route("/sessions/stats", methods=["GET"])
+def session_stats():
+    """Session store size and eviction counters"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify({
+        "chatbot": state().conversation_managers.stats(),
+        "doctor_chatbot": state().doctor_conversation_managers.stats()
+    })
+
+@bp.route("/llm/stats", methods=["GET"])
+def llm_stats():
+    """LLM response cache, request coalescing and gateway (retries, circuit breaker) counters"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    from llm_cache import llm_cache, inflight, ainflight
+    from llm_gateway import gateway
+    return jsonify({
+        "cache": llm_cache.stats(),
+        "coalescing": {"sync": inflight.stats(), "async": ainflight.stats()},
+        "gateway": gateway.stats()
+    })
+
+@bp.route("/db/stats", methods=["GET"])
+@uses_database
+def db_stats():
+    """Database connection pool occupancy, checkout wait times and the patient identity cache"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify({**pool_stats(db.engine), "identity_cache": state().patient_identities.stats()})
+
+# ---- Knowledge Base Admin ----
+@bp.route("/admin/knowledge-base", methods=["GET"])
+def knowledge_base_status():
+    """Live knowledge base version, retained versions and reload counters for this worker"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    from knowledge_base import knowledge_base
+    return jsonify(knowledge_base.stats())
+
+@bp.route("/admin/knowledge-base/reload", methods=["POST"])
+def knowledge_base_reload():
+    """Rebuild the knowledge base and swap it in (this worker; the others pick up file edits on their own)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    from knowledge_base import knowledge_base
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get("force"))
+    if data.get("background"):
+        started = knowledge_base.reload_in_background(force=force)
+        return jsonify({"started": started, "version": knowledge_base.stats()["version"]}), 202
+    result = knowledge_base.reload(force=force)
+    return jsonify(result), 500 if result.get("error") else 200
+
+@bp.route("/prescription/download/<prescription_id>", methods=["GET"])
 def download_prescription(prescription_id):
     """Download prescription as PDF (placeholder for now)"""
     # This would generate and return a PDF prescription
@@ -315,7 +679,9 @@ def download_prescription(prescription_id):
         "note": "This endpoint will generate a downloadable PDF prescription"
     })
 
+# Module-level app for `flask run`, gunicorn (app:app) and asgi.py; cheap to build
+app = create_app()
+
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()  
+    app.extensions["healthmate"].warm_up()
     app.run(debug=True)
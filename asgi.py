@@ -0,0 +1,159 @@
+# ASGI entry point: uvicorn asgi:application --workers 2
+#
+# POST /chatbot and /doctor-chatbot (and their /stream variants) are served
+# here on the event loop, awaiting the AsyncOpenAI client, so one process can
+# hold thousands of conversations waiting on the LLM. Every other route is
+# passed through to the unchanged Flask app; `python app.py` still works.
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app
+from session_store import DEFAULT_LOCK_TIMEOUT, SessionConflict, SessionStore
+from streaming import asse_stream
+
+wsgi_application = WsgiToAsgi(flask_app)
+app_state = flask_app.extensions["healthmate"]
+
+# path -> (AppState store attribute, stream); stores are built on first use
+CHAT_ROUTES = {
+    "/chatbot": ("conversation_managers", False),
+    "/chatbot/stream": ("conversation_managers", True),
+    "/doctor-chatbot": ("doctor_conversation_managers", False),
+    "/doctor-chatbot/stream": ("doctor_conversation_managers", True),
+}
+
+# Striped per-session locks for this event loop: the async counterpart of
+# session_store.SessionLocks, so turns of one session run one at a time
+_turn_locks = [asyncio.Lock() for _ in range(256)]
+
+logger = logging.getLogger(__name__)
+
+
+# ---- Helpers ----
+async def _store_call(store, method: str, *args):
+    """Session store calls; backends doing network or disk I/O run off the event loop."""
+    fn = getattr(store, method)
+    if isinstance(store, SessionStore):
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+@asynccontextmanager
+async def _session_turn(session_id: str) -> AsyncIterator[None]:
+    lock = _turn_locks[hash(session_id) % len(_turn_locks)]
+    try:
+        await asyncio.wait_for(lock.acquire(), DEFAULT_LOCK_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise SessionConflict(session_id) from None
+    try:
+        yield
+    finally:
+        lock.release()
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+def _response_headers(scope, content_type: str) -> List[Tuple[bytes, bytes]]:
+    headers = [(b"content-type", content_type.encode())]
+    # Same CORS answer Flask-CORS gives (supports_credentials=True, any origin)
+    origin = dict(scope["headers"]).get(b"origin")
+    if origin:
+        headers += [
+            (b"access-control-allow-origin", origin),
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+    return headers
+
+async def _send_json(scope, send, payload: Dict[str, Any], status: int = 200):
+    body = json.dumps(payload).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": _response_headers(scope, "application/json")})
+    await send({"type": "http.response.body", "body": body})
+
+
+# ---- Chat Endpoints ----
+async def chat_endpoint(scope, receive, send, store, stream: bool):
+    """Async equivalent of `chatbot_api` / `doctor_chatbot_api` in app.py."""
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return await _send_json(scope, send, {"error": "Request body must be a JSON object"}, 400)
+
+    user_text = str(data.get("message", "")).strip()
+    if not user_text:
+        return await _send_json(scope, send, {"error": "Message cannot be empty"}, 400)
+
+    headers = dict(scope["headers"])
+    session_id = headers.get(b"x-session-id", b"default").decode("latin-1")
+    stream = stream or b"text/event-stream" in headers.get(b"accept", b"")
+    try:
+        # One turn per session at a time, from load to save (see session_store.py)
+        async with _session_turn(session_id):
+            manager = await _store_call(store, "get_or_create", session_id)
+            if not stream:
+                response = await manager.aprocess(user_text)
+                if response.get("conversation_ended"):
+                    await _store_call(store, "discard", session_id)
+                else:
+                    await _store_call(store, "save", session_id, manager)
+            else:
+                # State is final before any tokens arrive, so save first (see app.stream_chat_turn)
+                events = manager.aprocess_stream(user_text)
+                if manager.conversation_active:
+                    await _store_call(store, "save", session_id, manager)
+                else:
+                    await _store_call(store, "discard", session_id)
+    except SessionConflict as e:
+        return await _send_json(scope, send, {"error": str(e)}, 409)
+
+    if not stream:
+        return await _send_json(scope, send, response)
+    headers = _response_headers(scope, "text/event-stream")
+    headers += [(b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    async for frame in asse_stream(events):
+        await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _warm_up():
+    try:
+        await asyncio.to_thread(app_state.warm_up)
+    except Exception as e:
+        # Not fatal: the worker still serves, /readyz says 503 and retries
+        logger.warning("Warm-up failed: %r", e)
+
+
+async def _lifespan(receive, send):
+    warm_up_task = None  # held so the task is not garbage collected
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Accept traffic right away; /readyz turns 200 once warm-up is done
+            warm_up_task = asyncio.create_task(_warm_up())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in CHAT_ROUTES:
+        store_name, stream = CHAT_ROUTES[scope["path"]]
+        store = await asyncio.to_thread(getattr, app_state, store_name)
+        return await chat_endpoint(scope, receive, send, store, stream)
+    return await wsgi_application(scope, receive, send)
@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+# Offline batch consultations over JSONL:
+#
+#   python batch_consult.py cases.jsonl results.jsonl --workers 32
+#
+# One case per input line:
+#   {"id": "c1", "mode": "patient", "symptoms": "fever and cough", "duration": "3 days",
+#    "other_symptoms": "", "allergies": "penicillin"}
+#   {"id": "c2", "mode": "doctor", "symptoms": "...", "patient_info": {"name": "A", "age": "40"}}
+#
+# Results are appended to the output as they finish (not in input order),
+# one {"line", "id", "ok", "result" | "error", "elapsed_ms"} per case. A
+# checkpoint next to the output (results.jsonl.ckpt) makes the run
+# resumable: rerun the same command and finished cases are skipped.
+
+
+# ---- Checkpoint ----
+class Checkpoint:
+    """Resume state for one output file.
+
+    `completed_through` is the highest input line such that every line up
+    to it has a result in the output, `done` holds the lines beyond it that
+    finished out of order, and `output_bytes` is the output size when they
+    were recorded. On resume, input up to `completed_through` is skipped
+    without parsing, and only the output written after `output_bytes` is
+    scanned for results the checkpoint doesn't know about yet.
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.completed_through = 0
+        self.output_bytes = 0
+        self.done: Set[int] = set()
+
+    def load(self, output_path: str):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("input") != self.input_path:
+                raise SystemExit(f"{self.path} belongs to {state.get('input')}, not {self.input_path}")
+            self.completed_through = state["completed_through"]
+            self.output_bytes = state["output_bytes"]
+            self.done = set(state.get("done", ()))
+        if not os.path.exists(output_path):
+            return
+        with open(output_path, "rb+") as f:
+            f.seek(self.output_bytes)
+            valid = self.output_bytes
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # torn write from the crash
+                self.mark(json.loads(raw)["line"])
+                valid += len(raw)
+            f.truncate(valid)
+
+    def mark(self, line: int):
+        self.done.add(line)
+        while self.completed_through + 1 in self.done:
+            self.completed_through += 1
+            self.done.discard(self.completed_through)
+
+    def is_done(self, line: int) -> bool:
+        return line <= self.completed_through or line in self.done
+
+    def save(self, output_bytes: int):
+        self.output_bytes = output_bytes
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"input": self.input_path, "completed_through": self.completed_through,
+                       "done": sorted(self.done), "output_bytes": output_bytes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+# ---- Cases ----
+def read_cases(path: str, checkpoint: Checkpoint) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """(line number, case, parse error) for every case not finished yet, read lazily."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, raw in enumerate(f, 1):
+            if checkpoint.is_done(line_no) or not raw.strip():
+                if not raw.strip():
+                    checkpoint.mark(line_no)
+                continue
+            try:
+                case = json.loads(raw)
+            except ValueError as e:
+                yield line_no, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(case, dict) or not str(case.get("symptoms", "")).strip():
+                yield line_no, None, "case needs a non-empty 'symptoms'"
+                continue
+            yield line_no, case, None
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """One case through matching, medication aggregation and LLM generation."""
+    from chatbot import handle_user_interaction
+    from doctor_chatbot import handle_doctor_consultation
+
+    mode = case.get("mode", "patient")
+    if mode == "doctor":
+        return handle_doctor_consultation(case["symptoms"], patient_info=case.get("patient_info"), mode="json")
+    if mode == "patient":
+        return handle_user_interaction(
+            case["symptoms"],
+            duration=case.get("duration"),
+            other_symptoms=case.get("other_symptoms"),
+            allergies=case.get("allergies"),
+            mode="json",
+            want_doctors=case.get("want_doctors", True),
+        )
+    raise ValueError(f"unknown mode {mode!r} (expected 'patient' or 'doctor')")
+
+
+def _timed(case: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+    start = time.perf_counter()
+    try:
+        return run_case(case), None, time.perf_counter() - start
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", time.perf_counter() - start
+
+
+# ---- Batch Runner ----
+def run_batch(input_path: str, output_path: str, workers: int = 16,
+              checkpoint_every: int = 100, log_every: int = 500) -> Dict[str, Any]:
+    """Stream `input_path` through the chatbots with `workers` cases in flight."""
+    checkpoint = Checkpoint(output_path + ".ckpt", input_path)
+    checkpoint.load(output_path)
+    resumed_from = checkpoint.completed_through + len(checkpoint.done)
+    counts = {"ok": 0, "errors": 0}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(workers) as pool:
+        since_checkpoint = 0
+
+        def write(line_no: int, case: Optional[Dict[str, Any]], result, error, elapsed: float):
+            nonlocal since_checkpoint
+            record = {"line": line_no, "id": (case or {}).get("id", line_no), "ok": error is None,
+                      "elapsed_ms": round(elapsed * 1000, 1)}
+            if error is None:
+                record["result"] = result
+                counts["ok"] += 1
+            else:
+                record["error"] = error
+                counts["errors"] += 1
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            checkpoint.mark(line_no)
+            since_checkpoint += 1
+            if since_checkpoint >= checkpoint_every:
+                out.flush()
+                checkpoint.save(out.tell())
+                since_checkpoint = 0
+            finished = counts["ok"] + counts["errors"]
+            if log_every and finished % log_every == 0:
+                rate = finished / (time.perf_counter() - started)
+                print(f"{finished} cases ({counts['errors']} errors), {rate:.1f}/s", file=sys.stderr)
+
+        # Bounded window: the input is never read more than 2x workers ahead
+        in_flight = {}
+        for line_no, case, error in read_cases(input_path, checkpoint):
+            if error is not None:
+                write(line_no, case, None, error, 0.0)
+                continue
+            in_flight[pool.submit(_timed, case)] = (line_no, case)
+            if len(in_flight) >= workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(*in_flight.pop(future), *future.result())
+        for future in list(in_flight):
+            write(*in_flight.pop(future), *future.result())
+
+        out.flush()
+        checkpoint.save(out.tell())
+
+    from llm_cache import llm_cache, inflight
+    from llm_gateway import gateway
+    elapsed = time.perf_counter() - started
+    processed = counts["ok"] + counts["errors"]
+    cache_stats = llm_cache.stats()
+    return {
+        "processed": processed,
+        "ok": counts["ok"],
+        "errors": counts["errors"],
+        "skipped_resumed": resumed_from,
+        "seconds": round(elapsed, 2),
+        "cases_per_second": round(processed / elapsed, 2) if elapsed else 0.0,
+        "llm_requests": gateway.stats()["calls"],
+        "prompt_cache_hits": cache_stats["memory_hits"] + cache_stats["disk_hits"],
+        "prompts_coalesced": inflight.stats()["coalesced"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run JSONL triage cases through HealthMate")
+    parser.add_argument("input", help="cases, one JSON object per line")
+    parser.add_argument("output", help="results JSONL (appended; resumable)")
+    parser.add_argument("--workers", type=int, default=16, help="cases in flight at once")
+    parser.add_argument("--checkpoint-every", type=int, default=100)
+    parser.add_argument("--dedupe-entries", type=int, default=None,
+                        help="identical prompts remembered in memory for this run "
+                             "(default: $LLM_CACHE_MAX_ENTRIES, else 200000)")
+    parser.add_argument("--cache-db", default=None,
+                        help="SQLite prompt cache shared across runs (sets LLM_CACHE_DB)")
+    args = parser.parse_args()
+
+    # The chatbot modules read their configuration at import time
+    if args.dedupe_entries is not None:
+        os.environ["LLM_CACHE_MAX_ENTRIES"] = str(args.dedupe_entries)
+    else:
+        os.environ.setdefault("LLM_CACHE_MAX_ENTRIES", "200000")
+    if args.cache_db:
+        os.environ["LLM_CACHE_DB"] = args.cache_db
+
+    summary = run_batch(args.input, args.output, args.workers, args.checkpoint_every)
+    print(json.dumps(summary, indent=2))
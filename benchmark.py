@@ -0,0 +1,361 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import platform
+import argparse
+import statistics
+import subprocess
+from itertools import cycle
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Micro/flow benchmarks for the matching, recommendation and conversation
+# hot paths, against synthetic knowledge bases scaled from the shipped JSON
+# files and a deterministic in-process stand-in for the OpenAI client:
+#
+#   python benchmark.py run --scales 1,10,100,1000 --output before.json
+#   python benchmark.py run --scales 1,10,100,1000 --output after.json
+#   python benchmark.py compare before.json after.json --threshold 0.10
+#
+# `run` calibrates each benchmark to at least --min-time per round and
+# reports per-call timings over --rounds rounds (min, median, mean, stdev).
+# `compare` matches results by key (e.g. "match_symptoms[100x]") and exits
+# non-zero if any median got slower by more than the threshold.
+
+RESULTS_FORMAT = 1
+DEFAULT_SCALES = (1, 10, 100, 1000)
+
+# Word lists for the synthetic symptoms each scaled-up condition gets on
+# top of a couple of its base condition's symptoms
+QUALIFIERS = ("mild", "sharp", "persistent", "recurring", "sudden", "dull", "severe", "itchy",
+              "burning", "throbbing", "intermittent", "chronic", "painful", "swollen", "tender")
+BODY_PARTS = ("knee", "elbow", "shoulder", "lower back", "neck", "wrist", "ankle", "chest", "abdomen",
+              "scalp", "jaw", "eye", "ear", "hip", "calf", "forearm", "heel", "throat", "sinus", "gum")
+SIGNS = ("pain", "stiffness", "swelling", "numbness", "tingling", "rash", "cramps", "redness",
+         "weakness", "discharge", "spasms", "bruising")
+
+
+# ---- Stub LLM ----
+class StubLLMClient:
+    """Deterministic stand-in for the OpenAI client: no network, no sleeping.
+
+    Installed under the LLM gateway (so retries, the breaker and latency
+    tracking still run); the reply text is derived from the prompt, so the
+    same inputs always produce the same output.
+    """
+
+    def __init__(self, reply_words: int = 120):
+        self.reply_words = reply_words
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _reply(self, messages: List[Dict[str, str]]) -> str:
+        digest = hashlib.sha256(messages[-1]["content"].encode("utf-8")).hexdigest()
+        words = [f"advice-{digest[i % 56:i % 56 + 8]}" for i in range(self.reply_words)]
+        return " ".join(words)
+
+    def create(self, *, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
+        self.calls += 1
+        text = self._reply(messages)
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+                     for word in text.split(" ")])
+
+
+# ---- Synthetic Knowledge Base ----
+def load_shipped_sources(kb_dir: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, List[str]]]:
+    from knowledge_base import _source_paths
+    data = {}
+    for name, path in _source_paths(kb_dir).items():
+        with open(path, "r", encoding="utf-8") as f:
+            data[name] = json.load(f)
+    return data["med_data"], data["doctor_data"], data["condition_specialization"]
+
+
+def synthetic_sources(scale: int, kb_dir: str, seed: int = 0):
+    """The shipped knowledge base with `scale` times as many conditions and doctors.
+
+    Scale 1 is the shipped data itself. Copy k of a condition keeps two of
+    its symptoms (so matches overlap the way real vocabularies do) and adds
+    synthetic ones; medications and doctors are renamed per copy so the
+    indexes and med lists grow too.
+    """
+    med_data, doctor_data, condition_specialization = load_shipped_sources(kb_dir)
+    if scale <= 1:
+        return med_data, doctor_data, condition_specialization
+
+    rng = random.Random(seed)
+    scaled_meds: Dict[str, Any] = {}
+    scaled_specialization: Dict[str, List[str]] = {}
+    for copy in range(scale):
+        for condition, info in med_data.items():
+            name = condition if copy == 0 else f"{condition} {copy}"
+            symptoms = list(info.get("symptoms", []))
+            if copy:
+                symptoms = rng.sample(symptoms, min(2, len(symptoms))) + [
+                    f"{rng.choice(QUALIFIERS)} {rng.choice(BODY_PARTS)} {rng.choice(SIGNS)}"
+                    for _ in range(rng.randint(2, 4))
+                ]
+            scaled_meds[name] = {
+                **info,
+                "symptoms": symptoms,
+                "medications": [
+                    {**med, "name": med.get("name", "") if copy == 0 else f"{med.get('name', '')} {copy}"}
+                    for med in info.get("medications", [])
+                ],
+            }
+            scaled_specialization[name] = condition_specialization.get(condition, ["General Physician"])
+
+    scaled_doctors = [
+        {**doctor, "name": doctor["name"] if copy == 0 else f"{doctor['name']} {copy}"}
+        for copy in range(scale) for doctor in doctor_data
+    ]
+    return scaled_meds, scaled_doctors, scaled_specialization
+
+
+def symptom_queries(med_data: Dict[str, Any], count: int = 50, seed: int = 0) -> List[str]:
+    """Patient-style messages built from symptoms of randomly chosen conditions."""
+    rng = random.Random(seed)
+    conditions = [info for info in med_data.values() if info.get("symptoms")]
+    queries = []
+    for _ in range(count):
+        symptoms = rng.choice(conditions)["symptoms"]
+        picked = rng.sample(symptoms, min(2, len(symptoms)))
+        queries.append(f"i have {' and '.join(picked)} since {rng.choice(['yesterday', 'two days', 'a week'])}")
+    return queries
+
+
+# ---- Timing ----
+def measure(fn: Callable[[], Any], rounds: int, min_time: float) -> Dict[str, Any]:
+    """Per-call seconds over `rounds` rounds, each looping `fn` for at least `min_time`."""
+    fn()  # warm caches and lazy imports outside the timed rounds
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+
+    samples = [elapsed / number]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    median = statistics.median(samples)
+    return {
+        "number": number,
+        "rounds": len(samples),
+        "min_s": min(samples),
+        "median_s": median,
+        "mean_s": statistics.fmean(samples),
+        "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "ops_per_s": 1.0 / median if median else None,
+    }
+
+
+# ---- Benchmarks ----
+def _install(kb):
+    """Make `kb` the process's knowledge base (no file watcher)."""
+    import knowledge_base
+    holder = knowledge_base.KnowledgeBaseHolder(builder=lambda refresh=False: kb, watch_interval=0)
+    holder.current()
+    knowledge_base.knowledge_base = holder
+
+
+def benchmarks_for(kb, queries: List[str]) -> Dict[str, Callable[[], Any]]:
+    """name -> zero-argument callable; each call is one unit of work."""
+    import chatbot
+    import doctor_chatbot
+
+    matches = [chatbot.match_symptoms(q, kb=kb) for q in queries]
+    matched = [conditions for conditions in matches if conditions] or [list(kb.med_data)[:1]]
+    meds = [kb.medications_for(conditions) for conditions in matched]
+
+    next_query = cycle(queries).__next__
+    next_conditions = cycle(matched).__next__
+    next_meds = cycle(meds).__next__
+    next_prompt_args = cycle([
+        dict(symptoms_text=q, matched_conditions=c, other_symptoms="mild headache", duration="3 days",
+             allergies="none", meds_for_conditions=m)
+        for q, c, m in zip(queries, matched, meds)
+    ]).__next__
+    next_flow_query = cycle([q for q, conditions in zip(queries, matches) if conditions] or queries).__next__
+    index = kb.symptom_index
+
+    def patient_flow():
+        manager = chatbot.ConversationManager()
+        responses = [manager.process(text)
+                     for text in ("hi", next_flow_query(), "3 days", "mild headache", "no allergies", "yes")]
+        if "advice-" not in responses[4]["reply_text"]:
+            raise RuntimeError(f"patient flow fell back instead of using the stub LLM: {responses[4]}")
+
+    def doctor_flow():
+        manager = doctor_chatbot.DoctorConversationManager()
+        manager.process("hello")
+        response = manager.process(f"Ravi 40 years old, {next_flow_query()}")
+        prescription = response.get("structured", {}).get("prescription")
+        if not prescription or prescription.get("incomplete"):
+            raise RuntimeError(f"doctor flow fell back instead of using the stub LLM: {response}")
+
+    return {
+        "match_symptoms": lambda: chatbot.match_symptoms(next_query(), kb=kb),
+        # The same lookup with and without SymptomIndex.candidates narrowing the keys
+        "symptom_index_match": lambda: index.match(next_query()),
+        "symptom_index_brute_force": lambda: index.match(next_query(), prefilter=False),
+        "match_doctors_by_condition": lambda: chatbot.match_doctors_by_condition(next_conditions(), kb=kb),
+        "build_med_list": lambda: chatbot.build_med_list(next_meds()),
+        "build_prompt_plaintext": lambda: chatbot.build_prompt_plaintext(**next_prompt_args()),
+        "patient_conversation": patient_flow,
+        "doctor_conversation": doctor_flow,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scales: List[int], rounds: int = 5, min_time: float = 0.2, only: Optional[List[str]] = None,
+        kb_dir: Optional[str] = None, matcher: Optional[str] = None, seed: int = 0) -> Dict[str, Any]:
+    """Every benchmark at every scale; returns the results document."""
+    # Every conversation must reach the stub, not the response cache
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    import numpy as np
+    from knowledge_base import KB_DIR, KnowledgeBase
+    from matchers import DEFAULT_BACKEND
+    from llm_gateway import gateway
+
+    from symptom_index import token_key
+
+    kb_dir = kb_dir or KB_DIR
+    stub = StubLLMClient()
+    gateway._sync = stub
+    random.seed(seed)  # the chatbots pick reply phrasings at random
+
+    results: List[Dict[str, Any]] = []
+    knowledge_bases: Dict[str, Dict[str, Any]] = {}
+    for scale in scales:
+        med_data, doctor_data, condition_specialization = synthetic_sources(scale, kb_dir, seed)
+        started = time.perf_counter()
+        kb = KnowledgeBase(med_data, doctor_data, condition_specialization, matcher, version=f"bench-{scale}x")
+        build_s = time.perf_counter() - started
+        _install(kb)
+        queries = symptom_queries(med_data, seed=seed)
+        # Keys left to score per query after the prefilter (default threshold)
+        candidates = statistics.fmean(len(kb.symptom_index.candidates(token_key(q))) for q in queries)
+        knowledge_bases[f"{scale}x"] = {
+            "conditions": len(med_data),
+            "symptom_keys": len(kb.symptom_index),
+            "prefilter_candidates": candidates,
+            "doctors": len(doctor_data),
+            "build_s": build_s,
+        }
+        print(f"[{scale}x] {len(med_data)} conditions, {len(kb.symptom_index)} symptom keys "
+              f"(prefilter keeps {candidates:.0f}, {candidates / len(kb.symptom_index):.0%}), "
+              f"{len(doctor_data)} doctors, built in {build_s:.2f}s", file=sys.stderr)
+
+        for name, fn in benchmarks_for(kb, queries).items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            stats = measure(fn, rounds, min_time)
+            results.append({"key": f"{name}[{scale}x]", "name": name, "scale": scale, **stats})
+            print(f"  {name:<28} {stats['median_s'] * 1e6:>12.1f} us  (x{stats['number']}, "
+                  f"stdev {stats['stdev_s'] * 1e6:.1f} us)", file=sys.stderr)
+
+    return {
+        "format": RESULTS_FORMAT,
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "matcher": (matcher or DEFAULT_BACKEND).strip().lower(),
+            "rounds": rounds,
+            "min_time": min_time,
+            "seed": seed,
+            "llm_stub_calls": stub.calls,
+        },
+        "knowledge_bases": knowledge_bases,
+        "results": results,
+    }
+
+
+# ---- Compare ----
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float = 0.10) -> Tuple[List[str], int]:
+    """Report lines and the number of regressions (median slower by more than `threshold`)."""
+    old = {r["key"]: r for r in baseline["results"]}
+    new = {r["key"]: r for r in candidate["results"]}
+    lines = [f"{'benchmark':<36} {'baseline':>12} {'candidate':>12} {'ratio':>7}",
+             f"{'':<36} {baseline['meta'].get('commit') or '?':>12} {candidate['meta'].get('commit') or '?':>12}"]
+    regressions = 0
+    for key in sorted(old.keys() | new.keys(), key=lambda k: (k.split("[")[0], int(k.split("[")[1][:-2]))):
+        if key not in old or key not in new:
+            lines.append(f"{key:<36} {'only in ' + ('baseline' if key in old else 'candidate'):>33}")
+            continue
+        ratio = new[key]["median_s"] / old[key]["median_s"]
+        verdict = ""
+        if ratio > 1 + threshold:
+            verdict = "  SLOWER"
+            regressions += 1
+        elif ratio < 1 / (1 + threshold):
+            verdict = "  faster"
+        lines.append(f"{key:<36} {old[key]['median_s'] * 1e6:>10.1f}us {new[key]['median_s'] * 1e6:>10.1f}us "
+                     f"{ratio:>6.2f}x{verdict}")
+    return lines, regressions
+
+
+def _parse_scales(value: str) -> List[int]:
+    return [int(part.strip().rstrip("xX")) for part in value.split(",") if part.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HealthMate hot-path benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write a results JSON")
+    run_parser.add_argument("--scales", type=_parse_scales, default=list(DEFAULT_SCALES),
+                            help="knowledge base multiples of the shipped JSON (default: 1,10,100,1000)")
+    run_parser.add_argument("--rounds", type=int, default=5)
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round (at least)")
+    run_parser.add_argument("--only", action="append", default=None,
+                            help="run benchmarks whose name contains this (repeatable)")
+    run_parser.add_argument("--matcher", default=None, help="symptom matcher backend (default: $SYMPTOM_MATCHER)")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", default=None, help="default: benchmark-<commit>.json")
+
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="relative slowdown of the median that counts as a regression")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        document = run(args.scales, args.rounds, args.min_time, args.only, matcher=args.matcher, seed=args.seed)
+        output = args.output or f"benchmark-{document['meta']['commit'] or 'local'}.json"
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"Wrote {len(document['results'])} results to {output}", file=sys.stderr)
+    else:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.candidate, "r", encoding="utf-8") as f:
+            candidate = json.load(f)
+        lines, regressions = compare(baseline, candidate, args.threshold)
+        print("\n".join(lines))
+        if regressions:
+            print(f"{regressions} benchmark(s) slower by more than {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
@@ -1,25 +1,32 @@
 
 import os
-import json
 import random
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
-from rapidfuzz import fuzz
+from typing import List, Dict, Any, AsyncIterator, Generator, Iterator, Optional, Tuple
+from llm_gateway import gateway, LLM_MODEL, LLMUnavailableError
+from llm_cache import cached_completion, stream_completion, acached_completion, astream_completion
+from streaming import (PendingReply, Reply, resolve_reply, iter_reply, aresolve_reply, aiter_reply,
+                       stream_with_fallback, astream_with_fallback, with_fields)
+from knowledge_base import KnowledgeBase, get_knowledge_base
+from conversation_state import ConversationState, Stage
 
 # ---- Configuration ----
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-MODEL_NAME = "gpt-4o-mini"
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# ---- Load Data ----
-with open("new.json", "r", encoding="utf-8") as f:
-    med_data = json.load(f)
-
-with open("doctor.json", "r", encoding="utf-8") as f:
-    doctor_data = json.load(f)
-
-with open("condition_specialization.json", "r", encoding="utf-8") as f:
-    condition_specialization = json.load(f)
+MODEL_NAME = LLM_MODEL  # $LLM_MODEL, default gpt-4o-mini
+# Shared pooled client with deadlines, retries and a circuit breaker (llm_gateway.py);
+# aclient is used by the async (ASGI) request path, see asgi.py
+client = gateway.client
+aclient = gateway.aclient
+
+# ---- Knowledge Base ----
+# Parsed and indexed once per process on first use and shared with
+# doctor_chatbot.py (see knowledge_base.py). The old module attributes
+# (med_data, symptom_index, ...) still resolve, to the shared instance.
+_KB_ATTRIBUTES = ("med_data", "doctor_data", "condition_specialization",
+                  "symptom_index", "symptom_matcher", "doctor_index")
+
+def __getattr__(name: str):
+    if name in _KB_ATTRIBUTES:
+        return getattr(get_knowledge_base(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ---- Utilities ----
 def _normalize(text: str) -> str:
@@ -37,33 +44,26 @@ def is_smalltalk(user_text: str) -> Optional[str]:
     return None
 
 # ---- Symptom & Doctor Matching ----
-def match_symptoms(user_input: str, threshold: int = 60) -> List[str]:
-    """Match free-text input to known conditions/symptoms using fuzzy match."""
-    u = _normalize(user_input)
-    symptom_to_condition = {}
-    for condition, info in med_data.items():
-        symptom_to_condition[condition.lower()] = condition
-        for symptom in info.get("symptoms", []):
-            symptom_to_condition[symptom.lower()] = condition
-
-    matched = set()
-    for symptom_text, condition in symptom_to_condition.items():
-        score = fuzz.token_set_ratio(symptom_text, u)
-        if score >= threshold:
-            matched.add(condition)
-    return list(matched)
-
-def match_doctors_by_condition(conditions: List[str], top_n: int = 4) -> List[Dict[str, Any]]:
+def match_symptoms(user_input: str, threshold: Optional[int] = None,
+                   kb: Optional[KnowledgeBase] = None) -> List[str]:
+    """Match free-text input to known conditions/symptoms (fuzzy or TF-IDF backend).
+
+    `threshold` (0-100) overrides the backend's own cutoff.
+    """
+    return (kb or get_knowledge_base()).symptom_matcher.match(user_input, threshold)
+
+def rank_symptoms(user_input: str, top_k: int = 5) -> List[Tuple[str, float]]:
+    """Top-k matched conditions with scores (0-1), best first."""
+    return get_knowledge_base().symptom_matcher.rank(user_input, top_k)
+
+def match_symptoms_batch(user_inputs: List[str], threshold: int = 60) -> List[List[str]]:
+    """Match many messages in one vectorized call (e.g. re-scoring transcripts)."""
+    return get_knowledge_base().symptom_index.match_batch(user_inputs, threshold)
+
+def match_doctors_by_condition(conditions: List[str], top_n: int = 4, by_priority: bool = False,
+                               kb: Optional[KnowledgeBase] = None) -> List[Dict[str, Any]]:
     """Find doctors based on condition_specialization mapping."""
-    matched = []
-    for cond in conditions:
-        specializations = condition_specialization.get(cond, [])
-        for spec in specializations:
-            for doc in doctor_data:
-                if spec in doc.get("specialization", []):
-                    if doc not in matched:
-                        matched.append(doc)
-    return matched[:top_n]
+    return (kb or get_knowledge_base()).doctor_index.match(conditions, top_n, by_priority=by_priority)
 
 # ---- Medication Helper ----
 def build_med_list(meds: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -115,12 +115,13 @@ In case of emergency, call your local emergency number."
 """
     return prompt.strip()
 
-def generate_plaintext_response(symptoms_text: str,
-                                matched_conditions: List[str],
-                                other_symptoms: str,
-                                duration: str,
-                                allergies: str,
-                                meds_for_conditions: List[Dict[str, Any]]) -> str:
+def plaintext_request(symptoms_text: str,
+                      matched_conditions: List[str],
+                      other_symptoms: str,
+                      duration: str,
+                      allergies: str,
+                      meds_for_conditions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Completion arguments for the patient-facing advice."""
     prompt = build_prompt_plaintext(
         symptoms_text=symptoms_text,
         matched_conditions=matched_conditions,
@@ -129,31 +130,137 @@ def generate_plaintext_response(symptoms_text: str,
         allergies=allergies or "None",
         meds_for_conditions=meds_for_conditions
     )
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
+    return {
+        "model": MODEL_NAME,
+        "messages": [
             {"role": "system", "content": "You are a helpful, safe, conversational medical assistant."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.7,
-        max_tokens=600
+        "temperature": 0.7,
+        "max_tokens": 600,
+    }
+
+def fallback_plaintext_response(meds_for_conditions: List[Dict[str, Any]]) -> str:
+    """Knowledge-base advice without AI prose, used while the LLM provider is unavailable."""
+    meds_list_text = "\n".join(
+        [f"- {m['name']}: {m['dosage']} {m.get('duration','')}".rstrip() for m in build_med_list(meds_for_conditions)]
+    ) or "- No medication suggestion available"
+    return (
+        "I can't generate detailed advice right now, but here is the standard guidance for your symptoms.\n\n"
+        "Suggested Medication & Dosage:\n"
+        f"{meds_list_text}\n\n"
+        "⚠️ Disclaimer - This chatbot does not provide medical advice. Always consult a doctor before taking or changing any medication. \n"
+        "In case of emergency, call your local emergency number."
     )
-    return response.choices[0].message.content.strip()
+
+def generate_plaintext_response(symptoms_text: str,
+                                matched_conditions: List[str],
+                                other_symptoms: str,
+                                duration: str,
+                                allergies: str,
+                                meds_for_conditions: List[Dict[str, Any]],
+                                use_cache: bool = True) -> str:
+    request = plaintext_request(symptoms_text, matched_conditions, other_symptoms,
+                                duration, allergies, meds_for_conditions)
+    try:
+        return cached_completion(client, **request, use_cache=use_cache)
+    except LLMUnavailableError:
+        return fallback_plaintext_response(meds_for_conditions)
+
+def stream_plaintext_response(symptoms_text: str,
+                              matched_conditions: List[str],
+                              other_symptoms: str,
+                              duration: str,
+                              allergies: str,
+                              meds_for_conditions: List[Dict[str, Any]],
+                              use_cache: bool = True) -> Generator[Any, None, str]:
+    """Same advice as `generate_plaintext_response`, yielded as it is generated.
+
+    If the LLM fails after text was sent, the stream ends with a
+    StreamInterrupted marker and returns the partial text.
+    """
+    request = plaintext_request(symptoms_text, matched_conditions, other_symptoms,
+                                duration, allergies, meds_for_conditions)
+    return (yield from stream_with_fallback(stream_completion(client, **request, use_cache=use_cache),
+                                            lambda: fallback_plaintext_response(meds_for_conditions),
+                                            (LLMUnavailableError,)))
+
+async def agenerate_plaintext_response(symptoms_text: str,
+                                       matched_conditions: List[str],
+                                       other_symptoms: str,
+                                       duration: str,
+                                       allergies: str,
+                                       meds_for_conditions: List[Dict[str, Any]],
+                                       use_cache: bool = True) -> str:
+    request = plaintext_request(symptoms_text, matched_conditions, other_symptoms,
+                                duration, allergies, meds_for_conditions)
+    try:
+        return await acached_completion(aclient, **request, use_cache=use_cache)
+    except LLMUnavailableError:
+        return fallback_plaintext_response(meds_for_conditions)
+
+async def astream_plaintext_response(symptoms_text: str,
+                                     matched_conditions: List[str],
+                                     other_symptoms: str,
+                                     duration: str,
+                                     allergies: str,
+                                     meds_for_conditions: List[Dict[str, Any]],
+                                     use_cache: bool = True) -> AsyncIterator[Any]:
+    """Async `stream_plaintext_response`; the full text comes last as a StreamResult."""
+    request = plaintext_request(symptoms_text, matched_conditions, other_symptoms,
+                                duration, allergies, meds_for_conditions)
+    async for item in astream_with_fallback(astream_completion(aclient, **request, use_cache=use_cache),
+                                            lambda: fallback_plaintext_response(meds_for_conditions),
+                                            (LLMUnavailableError,)):
+        yield item
 
 # ---- Conversation Manager ----
 class ConversationManager:
+    # One slot pointing at a compact ConversationState: no per-instance __dict__.
+    # Weak-referenceable so PersistentSessionStore can remember what it loaded.
+    __slots__ = ("state", "__weakref__")
+
     def __init__(self):
         self.reset_conversation()
 
     def reset_conversation(self):
         """Reset the conversation to start fresh"""
-        self.stage = "greeting"
-        self.symptoms = ""
-        self.duration = ""
-        self.other_symptoms = ""
-        self.allergies = ""
-        self.matched_conditions = []
-        self.conversation_active = True
+        self.state = ConversationState()
+
+    def _knowledge_base(self) -> KnowledgeBase:
+        """The knowledge base version this conversation matched against (the live one before that)."""
+        return get_knowledge_base(self.state.kb_version)
+
+    # Read-only views used by the status endpoints
+    @property
+    def stage(self) -> str:
+        return self.state.stage.label
+
+    @property
+    def conversation_active(self) -> bool:
+        return self.state.conversation_active
+
+    @property
+    def symptoms(self) -> str:
+        return self.state.symptoms
+
+    @property
+    def patient_info(self) -> Dict[str, str]:
+        return self.state.patient_info
+
+    @property
+    def matched_conditions(self) -> List[str]:
+        return list(self.state.matched_conditions)
+
+    def dumps(self) -> bytes:
+        """Versioned binary snapshot of the conversation (see conversation_state.py)."""
+        return self.state.pack()
+
+    @classmethod
+    def loads(cls, blob: bytes) -> "ConversationManager":
+        manager = cls.__new__(cls)
+        manager.state = ConversationState.unpack(blob)
+        return manager
 
     def _choose(self, options):
         return random.choice(options)
@@ -192,7 +299,29 @@ class ConversationManager:
 
 Type your symptoms to get started! """
 
+    def _turn(self, user_text: str) -> Reply:
+        # Every reply carries the stage the conversation moved to
+        return with_fields(self._handle(user_text), stage=self.stage)
+
     def process(self, user_text: str) -> Dict[str, Any]:
+        return resolve_reply(self._turn(user_text))
+
+    def process_stream(self, user_text: str) -> Iterator[Tuple[str, Any]]:
+        """Like `process`, as ("delta", text) events followed by ("done", reply).
+
+        The conversation state is updated before this returns, so the
+        session can be saved before the events are consumed.
+        """
+        return iter_reply(self._turn(user_text))
+
+    async def aprocess(self, user_text: str) -> Dict[str, Any]:
+        """`process` for the async request path: awaits the LLM instead of blocking."""
+        return await aresolve_reply(self._turn(user_text))
+
+    def aprocess_stream(self, user_text: str) -> AsyncIterator[Tuple[str, Any]]:
+        return aiter_reply(self._turn(user_text))
+
+    def _handle(self, user_text: str) -> Reply:
         user_text = user_text.strip().lower()
 
         # Check for special commands first
@@ -200,7 +329,7 @@ Type your symptoms to get started! """
             return {"reply_text": self._get_help_message()}
         
         if self._is_exit_command(user_text):
-            self.conversation_active = False
+            self.state.conversation_active = False
             return {"reply_text": self._choose([
                 "Thank you for using HealthMate! Take care and stay healthy! 👋",
                 "Goodbye! Remember to consult a doctor if symptoms persist. Stay well! 👋",
@@ -216,8 +345,8 @@ Type your symptoms to get started! """
             ])}
 
         # Stage 1: greeting
-        if self.stage == "greeting":
-            self.stage = "ask_symptoms"
+        if self.state.stage == Stage.GREETING:
+            self.state.stage = Stage.ASK_SYMPTOMS
             return {"reply_text": self._choose([
                 "Hello! I'm HealthMate. How are you feeling today?",
                 "Hi there, I'm HealthMate. Tell me what symptoms are bothering you.",
@@ -225,10 +354,12 @@ Type your symptoms to get started! """
             ])}
 
         # Stage 2: symptoms
-        if self.stage == "ask_symptoms":
-            self.symptoms = user_text
-            self.matched_conditions = match_symptoms(user_text)
-            self.stage = "ask_duration"
+        if self.state.stage == Stage.ASK_SYMPTOMS:
+            self.state.symptoms = user_text
+            kb = get_knowledge_base()
+            self.state.kb_version = kb.version
+            self.state.set_conditions(match_symptoms(user_text, kb=kb))
+            self.state.stage = Stage.ASK_DURATION
             return {"reply_text": self._choose([
                 f"Sorry to hear you’re dealing with {user_text}. Can I ask, how many days has this been going on?",
                 f"Got it. You mentioned {user_text}. Since when are you feeling this way?",
@@ -236,9 +367,9 @@ Type your symptoms to get started! """
             ])}
 
         # Stage 3: duration
-        if self.stage == "ask_duration":
-            self.duration = user_text
-            self.stage = "ask_other"
+        if self.state.stage == Stage.ASK_DURATION:
+            self.state.duration = user_text
+            self.state.stage = Stage.ASK_OTHER
             return {"reply_text": self._choose([
                 "Okay, noted. Do you have any other symptoms along with this?",
                 "Thanks. Are you noticing anything else unusual in your health?",
@@ -246,9 +377,9 @@ Type your symptoms to get started! """
             ])}
 
         # Stage 4: other symptoms
-        if self.stage == "ask_other":
-            self.other_symptoms = user_text
-            self.stage = "ask_allergies"
+        if self.state.stage == Stage.ASK_OTHER:
+            self.state.other_symptoms = user_text
+            self.state.stage = Stage.ASK_ALLERGIES
             return {"reply_text": self._choose([
                 "Thanks for telling me. Do you have any allergies or dietary concerns?",
                 "Okay. Just to be safe, do you have any known allergies?",
@@ -256,11 +387,11 @@ Type your symptoms to get started! """
             ])}
 
         # Stage 5: allergies
-        if self.stage == "ask_allergies":
-            self.allergies = user_text
-            self.stage = "give_advice"
+        if self.state.stage == Stage.ASK_ALLERGIES:
+            self.state.allergies = user_text
+            self.state.stage = Stage.GIVE_ADVICE
 
-            if not self.matched_conditions:
+            if not self.state.matched_conditions:
                 return {
                     "reply_text": self._choose([
                         "Hmm, I couldn’t clearly match your symptoms. It might be best to check with a doctor.",
@@ -269,35 +400,40 @@ Type your symptoms to get started! """
                     "structured": {"matched_conditions": []}
                 }
 
-            aggregated_meds = []
-            for cond in self.matched_conditions:
-                aggregated_meds.extend(med_data.get(cond, {}).get("medications", []))
+            aggregated_meds = self._knowledge_base().medications_for(self.state.matched_conditions)
 
-            ai_summary = generate_plaintext_response(
-                symptoms_text=self.symptoms,
-                matched_conditions=self.matched_conditions,
-                other_symptoms=self.other_symptoms,
-                duration=self.duration,
-                allergies=self.allergies,
+            advice_args = dict(
+                symptoms_text=self.state.symptoms,
+                matched_conditions=self.state.matched_conditions,
+                other_symptoms=self.state.other_symptoms,
+                duration=self.state.duration,
+                allergies=self.state.allergies,
                 meds_for_conditions=aggregated_meds
             )
+            structured = {
+                "matched_conditions": list(self.state.matched_conditions),
+                "medications": build_med_list(aggregated_meds)
+            }
 
-            reply = (
-                f"{ai_summary}\n\n"
-                "Would you like me to also suggest some doctors you can consult? (yes/no)"
+            def finish(ai_summary: str) -> Dict[str, Any]:
+                reply = (
+                    f"{ai_summary}\n\n"
+                    "Would you like me to also suggest some doctors you can consult? (yes/no)"
+                )
+                return {"reply_text": reply, "structured": structured}
+
+            return PendingReply(
+                complete=lambda: generate_plaintext_response(**advice_args),
+                stream=lambda: stream_plaintext_response(**advice_args),
+                finish=finish,
+                acomplete=lambda: agenerate_plaintext_response(**advice_args),
+                astream=lambda: astream_plaintext_response(**advice_args)
             )
-            return {
-                "reply_text": reply,
-                "structured": {
-                    "matched_conditions": self.matched_conditions,
-                    "medications": build_med_list(aggregated_meds)
-                }
-            }
 
         # Stage 6: doctor recommendation
-        if self.stage == "give_advice":
+        if self.state.stage == Stage.GIVE_ADVICE:
             if user_text in ["yes", "y"]:
-                docs = match_doctors_by_condition(self.matched_conditions)
+                docs = match_doctors_by_condition(self.state.matched_conditions, kb=self._knowledge_base())
                 if not docs:
                     return {"reply_text": "Sorry, I couldn't find doctors for your case right now."}
 
@@ -341,16 +477,15 @@ def handle_user_interaction(user_input_text: str,
     if st_response:
         return {"reply_text": st_response, "structured": {"matched_conditions": []}}
 
-    matched_conditions = match_symptoms(user_input_text)
+    kb = get_knowledge_base()  # one version for the whole call, even across a reload
+    matched_conditions = match_symptoms(user_input_text, kb=kb)
     if not matched_conditions:
         return {
             "reply_text": "Sorry, I couldn't find a recommended medicine. Please consult a doctor.",
             "structured": {"matched_conditions": []}
         }
 
-    aggregated_meds = []
-    for cond in matched_conditions:
-        aggregated_meds.extend(med_data.get(cond, {}).get("medications", []))
+    aggregated_meds = kb.medications_for(matched_conditions)
 
     ai_text = generate_plaintext_response(
         symptoms_text=user_input_text,
@@ -363,7 +498,7 @@ def handle_user_interaction(user_input_text: str,
 
     doctors = []
     if want_doctors:
-        doctors = match_doctors_by_condition(matched_conditions)
+        doctors = match_doctors_by_condition(matched_conditions, kb=kb)
 
     structured = {
         "matched_conditions": matched_conditions,
@@ -1,12 +1,59 @@
 import os
+from urllib.parse import quote_plus
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class Config:
-    SECRET_KEY = os.getenv('SECRET_KEY', 'super-secret')
-    SQLALCHEMY_DATABASE_URI = (
-        f"mysql+mysqlconnector://{os.getenv('MYSQL_USER')}:{os.getenv('MYSQL_PASSWORD')}"
-        f"@{os.getenv('MYSQL_HOST','127.0.0.1')}:{os.getenv('MYSQL_PORT','3306')}/{os.getenv('MYSQL_DATABASE')}"
+    # Signs the login/session cookies: the same value on every worker and
+    # across restarts. create_app() refuses to start without it unless
+    # GENERATE_SECRET_KEY (development configs only) allows a random one.
+    SECRET_KEY = os.getenv('SECRET_KEY')
+    GENERATE_SECRET_KEY = False
+
+    # DATABASE_URL wins (e.g. sqlite:///healthmate.db for local testing);
+    # otherwise the MySQL settings below
+    MYSQL_USER = os.getenv('MYSQL_USER', 'root')
+    MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'root')
+    MYSQL_HOST = os.getenv('MYSQL_HOST', '127.0.0.1')
+    MYSQL_PORT = os.getenv('MYSQL_PORT', '3306')
+    MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'patient_db')
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or (
+        f"mysql+mysqlconnector://{quote_plus(MYSQL_USER)}:{quote_plus(MYSQL_PASSWORD)}"
+        f"@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # ---- Connection Pool ----
+    # Steady-state connections per process, plus burst connections beyond them
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    # Whole seconds a request waits for a free connection before failing
+    # (Flask-SQLAlchemy builds the engine with engine_from_config, which
+    # coerces pool_timeout to int)
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))
+    # Replace connections older than this, ahead of MySQL's wait_timeout
+    # and any proxy idle cutoff ("MySQL server has gone away")
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    # Test each connection on checkout and reconnect transparently if it died
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+    DB_ECHO = os.getenv('DB_ECHO', '0') == '1'
+
+    # ---- Startup ----
+    # When to CREATE DATABASE / create missing tables: "first_use" (first
+    # request that needs the database), "startup" (inside create_app) or
+    # "off" (only `flask --app app init-db`)
+    DB_BOOTSTRAP = os.getenv('DB_BOOTSTRAP', 'first_use')
+
+
+class SQLiteConfig(Config):
+    """Single-file SQLite database: local development and tests, no MySQL needed."""
+    SQLALCHEMY_DATABASE_URI = os.getenv('SQLITE_DATABASE_URL', 'sqlite:///healthmate.db')
+    GENERATE_SECRET_KEY = True
+
+
+# Names accepted by create_app() and $HEALTHMATE_CONFIG
+CONFIGS = {
+    'default': Config,
+    'sqlite': SQLiteConfig,
+}
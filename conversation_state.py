@@ -0,0 +1,132 @@
+import sys
+import json
+import struct
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, Tuple
+
+# 2 added kb_version; 3 stores patient_info values as JSON so nested values
+# survive. Version 1 and 2 blobs still load.
+STATE_VERSION = 3
+_HEADER = struct.Struct("<BBB")  # version, stage, flags
+_FLAG_ACTIVE = 0x01
+
+
+class Stage(IntEnum):
+    """Conversation stages; the value is what gets serialized."""
+    GREETING = 0
+    ASK_SYMPTOMS = 1
+    ASK_DURATION = 2
+    ASK_OTHER = 3
+    ASK_ALLERGIES = 4
+    GIVE_ADVICE = 5
+    COLLECT_PATIENT_INFO = 6
+    PROVIDE_ASSESSMENT = 7
+
+    @property
+    def label(self) -> str:
+        """The stage name used by the API ("ask_symptoms", ...)."""
+        return self.name.lower()
+
+
+# ---- Binary helpers ----
+def _write_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(blob: bytes, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        byte = blob[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+def _write_str(out: bytearray, text: str):
+    data = text.encode("utf-8")
+    _write_varint(out, len(data))
+    out += data
+
+def _read_str(blob: bytes, pos: int) -> Tuple[str, int]:
+    size, pos = _read_varint(blob, pos)
+    return blob[pos:pos + size].decode("utf-8"), pos + size
+
+
+# ---- Conversation State ----
+@dataclass(slots=True)
+class ConversationState:
+    """Everything a conversation needs to resume, with no per-instance __dict__.
+
+    Condition names are interned, so every session that matched "Flu"
+    points at the same string object as the knowledge base. `kb_version`
+    pins the knowledge base version the conditions were matched against,
+    so a hot reload mid-conversation can't mix versions.
+    """
+    stage: Stage = Stage.GREETING
+    symptoms: str = ""
+    duration: str = ""
+    other_symptoms: str = ""
+    allergies: str = ""
+    matched_conditions: Tuple[str, ...] = ()
+    patient_info: Dict[str, Any] = field(default_factory=dict)
+    conversation_active: bool = True
+    kb_version: str = ""
+
+    def set_conditions(self, conditions):
+        self.matched_conditions = tuple(sys.intern(c) for c in conditions)
+
+    def pack(self) -> bytes:
+        """Versioned binary encoding: header, varint-length UTF-8 strings, counted lists."""
+        out = bytearray(_HEADER.pack(STATE_VERSION, self.stage,
+                                     _FLAG_ACTIVE if self.conversation_active else 0))
+        for text in (self.symptoms, self.duration, self.other_symptoms, self.allergies):
+            _write_str(out, text)
+        _write_varint(out, len(self.matched_conditions))
+        for condition in self.matched_conditions:
+            _write_str(out, condition)
+        _write_varint(out, len(self.patient_info))
+        for key, value in self.patient_info.items():
+            _write_str(out, str(key))
+            _write_str(out, json.dumps(value, ensure_ascii=False))
+        _write_str(out, self.kb_version)
+        return bytes(out)
+
+    @classmethod
+    def unpack(cls, blob: bytes) -> "ConversationState":
+        """Decode `pack()` output; ValueError for an unknown version or a damaged blob."""
+        try:
+            return cls._unpack(blob)
+        except (IndexError, struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"Corrupt conversation state: {e}") from None
+
+    @classmethod
+    def _unpack(cls, blob: bytes) -> "ConversationState":
+        version, stage, flags = _HEADER.unpack_from(blob)
+        if version not in (1, 2, STATE_VERSION):
+            raise ValueError(f"Unsupported conversation state version: {version}")
+        pos = _HEADER.size
+        texts = []
+        for _ in range(4):
+            text, pos = _read_str(blob, pos)
+            texts.append(text)
+        count, pos = _read_varint(blob, pos)
+        conditions = []
+        for _ in range(count):
+            condition, pos = _read_str(blob, pos)
+            conditions.append(sys.intern(condition))
+        count, pos = _read_varint(blob, pos)
+        patient_info = {}
+        for _ in range(count):
+            key, pos = _read_str(blob, pos)
+            value, pos = _read_str(blob, pos)
+            patient_info[key] = json.loads(value) if version >= 3 else value
+        kb_version = ""
+        if version >= 2:
+            kb_version, pos = _read_str(blob, pos)
+        if pos != len(blob):
+            raise ValueError(f"Corrupt conversation state: {len(blob) - pos} trailing bytes")
+        return cls(Stage(stage), *texts, tuple(conditions), patient_info, bool(flags & _FLAG_ACTIVE), kb_version)
@@ -0,0 +1,103 @@
+import time
+import threading
+from typing import Any, Dict, Mapping
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+
+# ---- Engine Options ----
+def engine_options(config: Mapping[str, Any]) -> Dict[str, Any]:
+    """SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings in `config`."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    options: Dict[str, Any] = {
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "echo": config["DB_ECHO"],
+    }
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # Flask-SQLAlchemy gives in-memory SQLite a single shared connection
+        return options
+    options.update({
+        "poolclass": TimedQueuePool,
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+    })
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def ensure_database(uri: str):
+    """Create the MySQL database named in `uri` if it doesn't exist yet (no-op for other backends)."""
+    url = make_url(uri)
+    if url.get_backend_name() != "mysql":
+        return
+    import mysql.connector
+
+    conn = mysql.connector.connect(
+        host=url.host,
+        port=url.port or 3306,
+        user=url.username,
+        password=url.password
+    )
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{url.database}`")
+    cursor.close()
+    conn.close()
+
+
+# ---- Pool Statistics ----
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.wait_stats = {"checkouts": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "timeouts": 0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self._record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self._record_wait(time.perf_counter() - started)
+        return conn
+
+    def _record_wait(self, waited: float, timed_out: bool = False):
+        with self._stats_lock:
+            self.wait_stats["timeouts" if timed_out else "checkouts"] += 1
+            self.wait_stats["wait_seconds_total"] += waited
+            self.wait_stats["wait_seconds_max"] = max(self.wait_stats["wait_seconds_max"], waited)
+
+
+def pool_stats(engine: Engine) -> Dict[str, Any]:
+    """Occupancy and checkout wait times for `engine`'s connection pool."""
+    pool = engine.pool
+    stats: Dict[str, Any] = {"pool": type(pool).__name__}
+    if not isinstance(pool, QueuePool):
+        stats["status"] = pool.status()
+        return stats
+    stats.update({
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        # negative until the pool has opened pool_size connections
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout(),
+    })
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            waits = dict(pool.wait_stats)
+        attempts = waits["checkouts"] + waits["timeouts"]
+        stats.update({
+            "checkouts": waits["checkouts"],
+            "timeouts": waits["timeouts"],
+            "wait_ms_avg": round(waits["wait_seconds_total"] / attempts * 1000, 3) if attempts else 0.0,
+            "wait_ms_max": round(waits["wait_seconds_max"] * 1000, 3),
+        })
+    return stats
@@ -1,23 +1,51 @@
 import os
-import json
+import time
 import random
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
-from rapidfuzz import fuzz
+import logging
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Callable, Generator, Iterator, Optional, Tuple
+from llm_gateway import gateway, LLM_MODEL
+from llm_cache import cached_completion, stream_completion, acached_completion, astream_completion
+from streaming import (PendingReply, Reply, StreamResult, resolve_reply, iter_reply, aresolve_reply,
+                       aiter_reply, stream_with_fallback, astream_with_fallback, with_fields)
 from datetime import datetime, date
 import uuid
+from knowledge_base import KnowledgeBase, get_knowledge_base
+from conversation_state import ConversationState, Stage
 
 # ---- Configuration ----
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-MODEL_NAME = "gpt-4o-mini"
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# ---- Load Data ----
-with open("new.json", "r", encoding="utf-8") as f:
-    med_data = json.load(f)
-
-with open("doctor.json", "r", encoding="utf-8") as f:
-    doctor_data = json.load(f)
+MODEL_NAME = LLM_MODEL  # $LLM_MODEL, default gpt-4o-mini
+# Shared pooled client with deadlines, retries and a circuit breaker (llm_gateway.py);
+# aclient is used by the async (ASGI) request path, see asgi.py
+client = gateway.client
+aclient = gateway.aclient
+# Seconds to wait for any one LLM call, from when a pool worker starts it,
+# before using its fallback text
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "30"))
+# Seconds a call may wait for a pool worker, from when it was submitted,
+# before it is dropped and its fallback text used
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))
+# Cap on concurrent sync fan-out calls per process (four per consultation);
+# calls beyond it queue for a worker, up to LLM_QUEUE_TIMEOUT, without using
+# up their LLM_CALL_TIMEOUT. Size it to the expected concurrent
+# consultations x 4.
+LLM_FAN_OUT_WORKERS = int(os.getenv("LLM_FAN_OUT_WORKERS", "32"))
+
+logger = logging.getLogger(__name__)
+
+# ---- Knowledge Base ----
+# Parsed and indexed once per process on first use and shared with
+# chatbot.py (see knowledge_base.py). The old module attributes
+# (med_data, symptom_index, ...) still resolve, to the shared instance.
+_KB_ATTRIBUTES = ("med_data", "doctor_data", "condition_specialization",
+                  "symptom_index", "symptom_matcher", "doctor_index")
+
+def __getattr__(name: str):
+    if name in _KB_ATTRIBUTES:
+        return getattr(get_knowledge_base(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ---- Utilities ----
 def _normalize(text: str) -> str:
@@ -34,21 +62,21 @@ def is_smalltalk(user_text: str) -> Optional[str]:
         return "You're welcome! Is there anything else I can help you with regarding your health?"
     return None
 
-def match_symptoms(user_input: str, threshold: int = 60) -> List[str]:
-    """Match free-text input to known conditions/symptoms using fuzzy match."""
-    u = _normalize(user_input)
-    symptom_to_condition = {}
-    for condition, info in med_data.items():
-        symptom_to_condition[condition.lower()] = condition
-        for symptom in info.get("symptoms", []):
-            symptom_to_condition[symptom.lower()] = condition
-
-    matched = set()
-    for symptom_text, condition in symptom_to_condition.items():
-        score = fuzz.token_set_ratio(symptom_text, u)
-        if score >= threshold:
-            matched.add(condition)
-    return list(matched)
+def match_symptoms(user_input: str, threshold: Optional[int] = None,
+                   kb: Optional[KnowledgeBase] = None) -> List[str]:
+    """Match free-text input to known conditions/symptoms (fuzzy or TF-IDF backend).
+
+    `threshold` (0-100) overrides the backend's own cutoff.
+    """
+    return (kb or get_knowledge_base()).symptom_matcher.match(user_input, threshold)
+
+def rank_symptoms(user_input: str, top_k: int = 5) -> List[Tuple[str, float]]:
+    """Top-k matched conditions with scores (0-1), best first."""
+    return get_knowledge_base().symptom_matcher.rank(user_input, top_k)
+
+def match_symptoms_batch(user_inputs: List[str], threshold: int = 60) -> List[List[str]]:
+    """Match many messages in one vectorized call (e.g. re-scoring transcripts)."""
+    return get_knowledge_base().symptom_index.match_batch(user_inputs, threshold)
 
 def build_med_list(meds: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Build and deduplicate medication list."""
@@ -66,31 +94,145 @@ def build_med_list(meds: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             }
     return list(dedup.values())
 
+# ---- Parallel LLM Calls ----
+_llm_pool = ThreadPoolExecutor(max_workers=LLM_FAN_OUT_WORKERS, thread_name_prefix="llm")
+
+# Used when a call times out or fails, so the consultation still completes
+FALLBACK_TEXT = {
+    "instructions": "Take the medications exactly as listed. Stop and contact your doctor if you notice side effects or if symptoms get worse.",
+    "follow_up": "Schedule a follow-up visit if symptoms persist beyond a few days, or seek care immediately if they worsen.",
+    "notes": "Clinical notes could not be generated at this time.",
+}
+
+class PooledCall:
+    """A call on the shared pool that records when a worker picks it up."""
+
+    def __init__(self, fn: Callable[[], str]):
+        self.fn = fn
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        # Set on pickup, or when the future finishes without running (cancelled)
+        self.picked_up = threading.Event()
+        self.future: Future = _llm_pool.submit(self._run)
+        self.future.add_done_callback(lambda _: self.picked_up.set())
+
+    def _run(self) -> str:
+        self.started_at = time.monotonic()
+        self.picked_up.set()
+        return self.fn()
+
+    def result(self, timeout: float, queue_timeout: float = LLM_QUEUE_TIMEOUT) -> str:
+        """The call's result, waiting at most `queue_timeout` seconds after
+        submission for a worker and `timeout` seconds after pickup."""
+        if not self.picked_up.wait(max(self.submitted_at + queue_timeout - time.monotonic(), 0)):
+            raise TimeoutError(f"no LLM worker free within {queue_timeout}s")
+        started_at = time.monotonic() if self.started_at is None else self.started_at
+        return self.future.result(timeout=max(started_at + timeout - time.monotonic(), 0))
+
+def submit_llm_calls(calls: Dict[str, Callable[[], str]]) -> Dict[str, PooledCall]:
+    """Start independent LLM calls on the shared pool."""
+    return {name: PooledCall(fn) for name, fn in calls.items()}
+
+def collect_llm_calls(pending: Dict[str, PooledCall],
+                      timeout: float = LLM_CALL_TIMEOUT,
+                      queue_timeout: float = LLM_QUEUE_TIMEOUT) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """Wait for submitted calls, each up to `timeout` seconds after a worker started it.
+
+    A call still queued `queue_timeout` seconds after submission is cancelled.
+
+    Returns the results by name (None for a call that failed or timed out)
+    and the names of those calls.
+    """
+    results: Dict[str, Optional[str]] = {}
+    failed: List[str] = []
+    for name, call in pending.items():
+        try:
+            results[name] = call.result(timeout, queue_timeout)
+        except Exception as e:
+            call.future.cancel()
+            logger.warning("LLM call %r failed: %r", name, e)
+            results[name] = None
+            failed.append(name)
+    return results, failed
+
+def run_llm_calls(calls: Dict[str, Callable[[], str]],
+                  timeout: float = LLM_CALL_TIMEOUT,
+                  queue_timeout: float = LLM_QUEUE_TIMEOUT) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """Run independent LLM calls concurrently.
+
+    Each call gets `timeout` seconds from the moment a pool worker starts it,
+    so the whole batch takes roughly as long as the slowest call; one that
+    waits longer than `queue_timeout` for a worker isn't run at all.
+    """
+    return collect_llm_calls(submit_llm_calls(calls), timeout, queue_timeout)
+
+async def _guarded_call(name: str, call, timeout: float) -> Optional[str]:
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except Exception as e:
+        logger.warning("LLM call %r failed: %r", name, e)
+        return None
+
+async def arun_llm_calls(calls: Dict[str, Any],
+                         timeout: float = LLM_CALL_TIMEOUT) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """`run_llm_calls` for coroutines: awaited together on the event loop, no threads."""
+    names = list(calls)
+    values = await asyncio.gather(*(_guarded_call(name, calls[name], timeout) for name in names))
+    results = dict(zip(names, values))
+    return results, [name for name in names if results[name] is None]
+
 # ---- Prescription Generator ----
-def generate_prescription(patient_info: Dict[str, Any], 
-                         diagnosis: str, 
-                         medications: List[Dict[str, Any]], 
-                         doctor_name: str = "Dr. HealthMate AI") -> Dict[str, Any]:
-    """Generate a structured prescription."""
-    prescription_id = str(uuid.uuid4())[:8].upper()
-    current_date = date.today().strftime("%Y-%m-%d")
-    
+def _prescription_calls(patient_info: Dict[str, Any], diagnosis: str,
+                        medications: List[Dict[str, Any]], use_cache: bool) -> Dict[str, Callable[[], str]]:
+    return {
+        "instructions": lambda: generate_medication_instructions(medications, use_cache=use_cache),
+        "follow_up": lambda: generate_follow_up_instructions(diagnosis, use_cache=use_cache),
+        "notes": lambda: generate_prescription_notes(patient_info, diagnosis, use_cache=use_cache),
+    }
+
+def _aprescription_calls(patient_info: Dict[str, Any], diagnosis: str,
+                         medications: List[Dict[str, Any]], use_cache: bool) -> Dict[str, Any]:
+    return {
+        "instructions": acached_completion(aclient, **medication_instructions_request(medications), use_cache=use_cache),
+        "follow_up": acached_completion(aclient, **follow_up_request(diagnosis), use_cache=use_cache),
+        "notes": acached_completion(aclient, **prescription_notes_request(patient_info, diagnosis), use_cache=use_cache),
+    }
+
+def build_prescription(patient_info: Dict[str, Any],
+                       diagnosis: str,
+                       medications: List[Dict[str, Any]],
+                       texts: Dict[str, Optional[str]],
+                       doctor_name: str = "Dr. HealthMate AI") -> Dict[str, Any]:
+    """Assemble a prescription from generated texts, filling in any that are missing."""
     prescription = {
-        "prescription_id": prescription_id,
-        "date": current_date,
+        "prescription_id": str(uuid.uuid4())[:8].upper(),
+        "date": date.today().strftime("%Y-%m-%d"),
         "doctor_name": doctor_name,
         "patient_info": patient_info,
         "diagnosis": diagnosis,
         "medications": medications,
-        "instructions": generate_medication_instructions(medications),
-        "follow_up": generate_follow_up_instructions(diagnosis),
-        "notes": generate_prescription_notes(patient_info, diagnosis)
     }
-    
+    incomplete = []
+    for section, fallback in FALLBACK_TEXT.items():
+        text = texts.get(section)
+        if text is None:
+            incomplete.append(section)
+        prescription[section] = text if text is not None else fallback
+    if incomplete:
+        prescription["incomplete"] = incomplete
     return prescription
 
-def generate_medication_instructions(medications: List[Dict[str, Any]]) -> str:
-    """Generate medication instructions using AI."""
+def generate_prescription(patient_info: Dict[str, Any], 
+                         diagnosis: str, 
+                         medications: List[Dict[str, Any]], 
+                         doctor_name: str = "Dr. HealthMate AI",
+                         use_cache: bool = True) -> Dict[str, Any]:
+    """Generate a structured prescription (instructions, follow-up and notes generated concurrently)."""
+    texts, _ = run_llm_calls(_prescription_calls(patient_info, diagnosis, medications, use_cache))
+    return build_prescription(patient_info, diagnosis, medications, texts, doctor_name)
+
+def medication_instructions_request(medications: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Completion arguments for the medication instructions."""
     med_list = "\n".join([f"- {m['name']}: {m['dosage']} for {m['duration']}" for m in medications])
     
     prompt = f"""
@@ -106,19 +248,22 @@ def generate_medication_instructions(medications: List[Dict[str, Any]]) -> str:
     Keep instructions clear and professional.
     """
     
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
+    return {
+        "model": MODEL_NAME,
+        "messages": [
             {"role": "system", "content": "You are a professional doctor providing medication instructions."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.7,
-        max_tokens=300
-    )
-    return response.choices[0].message.content.strip()
+        "temperature": 0.7,
+        "max_tokens": 300,
+    }
 
-def generate_follow_up_instructions(diagnosis: str) -> str:
-    """Generate follow-up instructions using AI."""
+def generate_medication_instructions(medications: List[Dict[str, Any]], use_cache: bool = True) -> str:
+    """Generate medication instructions using AI."""
+    return cached_completion(client, **medication_instructions_request(medications), use_cache=use_cache)
+
+def follow_up_request(diagnosis: str) -> Dict[str, Any]:
+    """Completion arguments for the follow-up instructions."""
     prompt = f"""
     As a doctor, provide follow-up instructions for a patient diagnosed with: {diagnosis}
     
@@ -131,19 +276,22 @@ def generate_follow_up_instructions(diagnosis: str) -> str:
     Keep instructions clear and professional.
     """
     
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
+    return {
+        "model": MODEL_NAME,
+        "messages": [
             {"role": "system", "content": "You are a professional doctor providing follow-up care instructions."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.7,
-        max_tokens=250
-    )
-    return response.choices[0].message.content.strip()
+        "temperature": 0.7,
+        "max_tokens": 250,
+    }
 
-def generate_prescription_notes(patient_info: Dict[str, Any], diagnosis: str) -> str:
-    """Generate prescription notes using AI."""
+def generate_follow_up_instructions(diagnosis: str, use_cache: bool = True) -> str:
+    """Generate follow-up instructions using AI."""
+    return cached_completion(client, **follow_up_request(diagnosis), use_cache=use_cache)
+
+def prescription_notes_request(patient_info: Dict[str, Any], diagnosis: str) -> Dict[str, Any]:
+    """Completion arguments for the prescription notes."""
     patient_summary = f"Patient: {patient_info.get('name', 'Unknown')}, Age: {patient_info.get('age', 'Not specified')}"
     
     prompt = f"""
@@ -159,16 +307,19 @@ def generate_prescription_notes(patient_info: Dict[str, Any], diagnosis: str) ->
     Keep it professional and concise.
     """
     
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
+    return {
+        "model": MODEL_NAME,
+        "messages": [
             {"role": "system", "content": "You are a professional doctor writing clinical notes."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.7,
-        max_tokens=200
-    )
-    return response.choices[0].message.content.strip()
+        "temperature": 0.7,
+        "max_tokens": 200,
+    }
+
+def generate_prescription_notes(patient_info: Dict[str, Any], diagnosis: str, use_cache: bool = True) -> str:
+    """Generate prescription notes using AI."""
+    return cached_completion(client, **prescription_notes_request(patient_info, diagnosis), use_cache=use_cache)
 
 # ---- AI Response Builder ----
 def build_doctor_prompt(patient_symptoms: str,
@@ -212,41 +363,188 @@ def build_doctor_prompt(patient_symptoms: str,
     """
     return prompt.strip()
 
-def generate_doctor_response(patient_symptoms: str,
-                           matched_conditions: List[str],
-                           patient_info: Dict[str, Any],
-                           medications: List[Dict[str, Any]]) -> str:
-    """Generate doctor AI response."""
+def doctor_request(patient_symptoms: str,
+                   matched_conditions: List[str],
+                   patient_info: Dict[str, Any],
+                   medications: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Completion arguments for the doctor assessment."""
     prompt = build_doctor_prompt(
         patient_symptoms=patient_symptoms,
         matched_conditions=matched_conditions,
         patient_info=patient_info,
         medications=medications
     )
-    
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
+    return {
+        "model": MODEL_NAME,
+        "messages": [
             {"role": "system", "content": "You are Dr. HealthMate AI, a professional medical assistant. Provide clear, professional medical advice."},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.7,
-        max_tokens=800
+        "temperature": 0.7,
+        "max_tokens": 800,
+    }
+
+def generate_doctor_response(patient_symptoms: str,
+                           matched_conditions: List[str],
+                           patient_info: Dict[str, Any],
+                           medications: List[Dict[str, Any]],
+                           use_cache: bool = True) -> str:
+    """Generate doctor AI response."""
+    request = doctor_request(patient_symptoms, matched_conditions, patient_info, medications)
+    return cached_completion(client, **request, use_cache=use_cache)
+
+def fallback_doctor_response(matched_conditions: List[str],
+                             medications: List[Dict[str, Any]]) -> str:
+    """Plain assessment from the knowledge base, used when the AI response is unavailable."""
+    med_list_text = "\n".join(
+        [f"- {m['name']}: {m['dosage']} for {m.get('duration','')}" for m in build_med_list(medications)]
+    ) or "- No medication recommendation available"
+    return (
+        "**Clinical Assessment:**\n"
+        f"- Likely conditions: {', '.join(matched_conditions)}\n\n"
+        "**Treatment Plan:**\n"
+        f"{med_list_text}\n\n"
+        "The detailed AI assessment is unavailable right now. Please review with a qualified doctor."
     )
-    return response.choices[0].message.content.strip()
+
+def generate_consultation(patient_symptoms: str,
+                          matched_conditions: List[str],
+                          patient_info: Dict[str, Any],
+                          medications: List[Dict[str, Any]],
+                          doctor_name: str = "Dr. HealthMate AI",
+                          use_cache: bool = True) -> Tuple[str, Dict[str, Any]]:
+    """Doctor response plus prescription, with all four LLM calls issued at once.
+
+    A call that fails or exceeds LLM_CALL_TIMEOUT is replaced by fallback
+    text; the prescription lists those sections under "incomplete".
+    """
+    diagnosis = ", ".join(matched_conditions)
+    prescribed = build_med_list(medications)
+    calls = _prescription_calls(patient_info, diagnosis, prescribed, use_cache)
+    calls["doctor_response"] = lambda: generate_doctor_response(
+        patient_symptoms=patient_symptoms,
+        matched_conditions=matched_conditions,
+        patient_info=patient_info,
+        medications=medications,
+        use_cache=use_cache
+    )
+    texts, _ = run_llm_calls(calls)
+
+    doctor_response = texts["doctor_response"]
+    if doctor_response is None:
+        doctor_response = fallback_doctor_response(matched_conditions, medications)
+    prescription = build_prescription(patient_info, diagnosis, prescribed, texts, doctor_name)
+    return doctor_response, prescription
+
+def stream_consultation(patient_symptoms: str,
+                        matched_conditions: List[str],
+                        patient_info: Dict[str, Any],
+                        medications: List[Dict[str, Any]],
+                        doctor_name: str = "Dr. HealthMate AI",
+                        use_cache: bool = True) -> Generator[Any, None, Tuple[str, Dict[str, Any]]]:
+    """Streaming `generate_consultation`: yields the doctor response as it is generated.
+
+    The three prescription calls run on the pool meanwhile; the generator
+    returns (doctor_response, prescription) like `generate_consultation`.
+    If the doctor response fails after text was sent, it ends with a
+    StreamInterrupted marker and keeps the partial text.
+    """
+    diagnosis = ", ".join(matched_conditions)
+    prescribed = build_med_list(medications)
+    pending = submit_llm_calls(_prescription_calls(patient_info, diagnosis, prescribed, use_cache))
+    request = doctor_request(patient_symptoms, matched_conditions, patient_info, medications)
+    doctor_response = yield from stream_with_fallback(
+        stream_completion(client, **request, use_cache=use_cache),
+        lambda: fallback_doctor_response(matched_conditions, medications))
+    texts, _ = collect_llm_calls(pending)
+    prescription = build_prescription(patient_info, diagnosis, prescribed, texts, doctor_name)
+    return doctor_response, prescription
+
+async def agenerate_consultation(patient_symptoms: str,
+                                 matched_conditions: List[str],
+                                 patient_info: Dict[str, Any],
+                                 medications: List[Dict[str, Any]],
+                                 doctor_name: str = "Dr. HealthMate AI",
+                                 use_cache: bool = True) -> Tuple[str, Dict[str, Any]]:
+    """`generate_consultation` on the async client."""
+    diagnosis = ", ".join(matched_conditions)
+    prescribed = build_med_list(medications)
+    calls = _aprescription_calls(patient_info, diagnosis, prescribed, use_cache)
+    request = doctor_request(patient_symptoms, matched_conditions, patient_info, medications)
+    calls["doctor_response"] = acached_completion(aclient, **request, use_cache=use_cache)
+    texts, _ = await arun_llm_calls(calls)
+
+    doctor_response = texts["doctor_response"]
+    if doctor_response is None:
+        doctor_response = fallback_doctor_response(matched_conditions, medications)
+    prescription = build_prescription(patient_info, diagnosis, prescribed, texts, doctor_name)
+    return doctor_response, prescription
+
+async def astream_consultation(patient_symptoms: str,
+                               matched_conditions: List[str],
+                               patient_info: Dict[str, Any],
+                               medications: List[Dict[str, Any]],
+                               doctor_name: str = "Dr. HealthMate AI",
+                               use_cache: bool = True) -> AsyncIterator[Any]:
+    """`stream_consultation` on the async client; (doctor_response, prescription) comes last as a StreamResult."""
+    diagnosis = ", ".join(matched_conditions)
+    prescribed = build_med_list(medications)
+    pending = asyncio.ensure_future(arun_llm_calls(_aprescription_calls(patient_info, diagnosis, prescribed, use_cache)))
+    request = doctor_request(patient_symptoms, matched_conditions, patient_info, medications)
+    doctor_response = ""
+    async for item in astream_with_fallback(astream_completion(aclient, **request, use_cache=use_cache),
+                                            lambda: fallback_doctor_response(matched_conditions, medications)):
+        if isinstance(item, StreamResult):
+            doctor_response = item.value
+        else:
+            yield item
+    texts, _ = await pending
+    prescription = build_prescription(patient_info, diagnosis, prescribed, texts, doctor_name)
+    yield StreamResult((doctor_response, prescription))
 
 # ---- Doctor Conversation Manager ----
 class DoctorConversationManager:
+    # One slot pointing at a compact ConversationState: no per-instance __dict__.
+    # Weak-referenceable so PersistentSessionStore can remember what it loaded.
+    __slots__ = ("state", "__weakref__")
+
     def __init__(self):
         self.reset_conversation()
 
     def reset_conversation(self):
         """Reset the conversation to start fresh"""
-        self.stage = "greeting"
-        self.patient_info = {}
-        self.symptoms = ""
-        self.matched_conditions = []
-        self.conversation_active = True
+        self.state = ConversationState()
+
+    # Read-only views used by the status endpoints
+    @property
+    def stage(self) -> str:
+        return self.state.stage.label
+
+    @property
+    def conversation_active(self) -> bool:
+        return self.state.conversation_active
+
+    @property
+    def symptoms(self) -> str:
+        return self.state.symptoms
+
+    @property
+    def patient_info(self) -> Dict[str, str]:
+        return self.state.patient_info
+
+    @property
+    def matched_conditions(self) -> List[str]:
+        return list(self.state.matched_conditions)
+
+    def dumps(self) -> bytes:
+        """Versioned binary snapshot of the conversation (see conversation_state.py)."""
+        return self.state.pack()
+
+    @classmethod
+    def loads(cls, blob: bytes) -> "DoctorConversationManager":
+        manager = cls.__new__(cls)
+        manager.state = ConversationState.unpack(blob)
+        return manager
 
     def _choose(self, options):
         return random.choice(options)
@@ -286,7 +584,29 @@ class DoctorConversationManager:
 
 Type patient information to start a consultation! 🏥"""
 
+    def _turn(self, user_text: str) -> Reply:
+        # Every reply carries the stage the conversation moved to
+        return with_fields(self._handle(user_text), stage=self.stage)
+
     def process(self, user_text: str) -> Dict[str, Any]:
+        return resolve_reply(self._turn(user_text))
+
+    def process_stream(self, user_text: str) -> Iterator[Tuple[str, Any]]:
+        """Like `process`, as ("delta", text) events followed by ("done", reply).
+
+        The conversation state is updated before this returns, so the
+        session can be saved before the events are consumed.
+        """
+        return iter_reply(self._turn(user_text))
+
+    async def aprocess(self, user_text: str) -> Dict[str, Any]:
+        """`process` for the async request path: awaits the LLM instead of blocking."""
+        return await aresolve_reply(self._turn(user_text))
+
+    def aprocess_stream(self, user_text: str) -> AsyncIterator[Tuple[str, Any]]:
+        return aiter_reply(self._turn(user_text))
+
+    def _handle(self, user_text: str) -> Reply:
         user_text = user_text.strip().lower()
 
         # Check for special commands first
@@ -294,7 +614,7 @@ Type patient information to start a consultation! 🏥"""
             return {"reply_text": self._get_help_message()}
         
         if self._is_exit_command(user_text):
-            self.conversation_active = False
+            self.state.conversation_active = False
             return {"reply_text": self._choose([
                 "Consultation ended. Thank you for using Dr. HealthMate AI! 👋",
                 "Session complete. Dr. HealthMate AI is always available for medical consultations. 👋",
@@ -310,8 +630,8 @@ Type patient information to start a consultation! 🏥"""
             ])}
 
         # Stage 1: greeting
-        if self.stage == "greeting":
-            self.stage = "collect_patient_info"
+        if self.state.stage == Stage.GREETING:
+            self.state.stage = Stage.COLLECT_PATIENT_INFO
             return {"reply_text": self._choose([
                 "Hello! I'm Dr. HealthMate AI. Please provide patient information (name, age) and symptoms.",
                 "Welcome! I'm Dr. HealthMate AI. What patient information and symptoms can you share?",
@@ -319,9 +639,9 @@ Type patient information to start a consultation! 🏥"""
             ])}
 
         # Stage 2: collect patient info and symptoms
-        if self.stage == "collect_patient_info":
+        if self.state.stage == Stage.COLLECT_PATIENT_INFO:
             # Try to extract patient info and symptoms from the input
-            self.symptoms = user_text
+            self.state.symptoms = user_text
             
             # Simple extraction (can be enhanced with NLP)
             words = user_text.split()
@@ -329,62 +649,65 @@ Type patient information to start a consultation! 🏥"""
                 # Try to extract age
                 for i, word in enumerate(words):
                     if word.isdigit() and i + 1 < len(words) and words[i + 1] in ["years", "old"]:
-                        self.patient_info["age"] = word
+                        self.state.patient_info["age"] = word
                         break
             
             # Extract name (simple approach - first word if it's capitalized)
             first_word = user_text.split()[0] if user_text.split() else ""
             if first_word and first_word[0].isupper():
-                self.patient_info["name"] = first_word
+                self.state.patient_info["name"] = first_word
             
-            self.matched_conditions = match_symptoms(user_text)
-            self.stage = "provide_assessment"
+            kb = get_knowledge_base()  # one version for the whole turn, even across a reload
+            self.state.kb_version = kb.version
+            self.state.set_conditions(match_symptoms(user_text, kb=kb))
+            self.state.stage = Stage.PROVIDE_ASSESSMENT
 
-            if not self.matched_conditions:
+            if not self.state.matched_conditions:
                 return {
                     "reply_text": "I couldn't clearly identify a specific condition from the symptoms. Could you provide more detailed symptom information?",
                     "structured": {"matched_conditions": []}
                 }
 
             # Generate medications for matched conditions
-            aggregated_meds = []
-            for cond in self.matched_conditions:
-                aggregated_meds.extend(med_data.get(cond, {}).get("medications", []))
-
-            # Generate doctor response
-            doctor_response = generate_doctor_response(
-                patient_symptoms=self.symptoms,
-                matched_conditions=self.matched_conditions,
-                patient_info=self.patient_info,
-                medications=aggregated_meds
-            )
-
-            # Generate prescription
-            prescription = generate_prescription(
-                patient_info=self.patient_info,
-                diagnosis=", ".join(self.matched_conditions),
-                medications=build_med_list(aggregated_meds),
+            aggregated_meds = kb.medications_for(self.state.matched_conditions)
+
+            # Generate doctor response and prescription concurrently
+            consultation_args = dict(
+                patient_symptoms=self.state.symptoms,
+                matched_conditions=self.state.matched_conditions,
+                patient_info=self.state.patient_info,
+                medications=aggregated_meds,
                 doctor_name="Dr. HealthMate AI"
             )
+            matched = list(self.state.matched_conditions)
+
+            def finish(result: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+                doctor_response, prescription = result
+                reply = (
+                    f"{doctor_response}\n\n"
+                    " **Prescription Generated!**\n"
+                    "A downloadable prescription has been created for this patient.\n\n"
+                    "What would you like to do next?\n"
+                    "- Type 'restart' to start a new consultation\n"
+                    "- Type 'help' to see available commands\n"
+                    "- Type 'exit' to end the consultation"
+                )
+                return {
+                    "reply_text": reply,
+                    "structured": {
+                        "matched_conditions": matched,
+                        "medications": build_med_list(aggregated_meds),
+                        "prescription": prescription
+                    }
+                }
 
-            reply = (
-                f"{doctor_response}\n\n"
-                " **Prescription Generated!**\n"
-                "A downloadable prescription has been created for this patient.\n\n"
-                "What would you like to do next?\n"
-                "- Type 'restart' to start a new consultation\n"
-                "- Type 'help' to see available commands\n"
-                "- Type 'exit' to end the consultation"
+            return PendingReply(
+                complete=lambda: generate_consultation(**consultation_args),
+                stream=lambda: stream_consultation(**consultation_args),
+                finish=finish,
+                acomplete=lambda: agenerate_consultation(**consultation_args),
+                astream=lambda: astream_consultation(**consultation_args)
             )
-            
-            return {
-                "reply_text": reply,
-                "structured": {
-                    "matched_conditions": self.matched_conditions,
-                    "medications": build_med_list(aggregated_meds),
-                    "prescription": prescription
-                }
-            }
 
         return {"reply_text": "I didn't quite get that. Can you rephrase? Type 'help' to see available commands."}
 
@@ -397,7 +720,8 @@ def handle_doctor_consultation(user_input_text: str,
     if st_response:
         return {"reply_text": st_response, "structured": {"matched_conditions": []}}
 
-    matched_conditions = match_symptoms(user_input_text)
+    kb = get_knowledge_base()
+    matched_conditions = match_symptoms(user_input_text, kb=kb)
     if not matched_conditions:
         return {
             "reply_text": "I couldn't identify a specific condition. Please provide more detailed symptom information.",
@@ -405,23 +729,14 @@ def handle_doctor_consultation(user_input_text: str,
         }
 
     # Generate medications
-    aggregated_meds = []
-    for cond in matched_conditions:
-        aggregated_meds.extend(med_data.get(cond, {}).get("medications", []))
+    aggregated_meds = kb.medications_for(matched_conditions)
 
-    # Generate doctor response
-    doctor_response = generate_doctor_response(
+    # Generate doctor response and prescription concurrently
+    doctor_response, prescription = generate_consultation(
         patient_symptoms=user_input_text,
         matched_conditions=matched_conditions,
         patient_info=patient_info or {},
-        medications=aggregated_meds
-    )
-
-    # Generate prescription
-    prescription = generate_prescription(
-        patient_info=patient_info or {},
-        diagnosis=", ".join(matched_conditions),
-        medications=build_med_list(aggregated_meds),
+        medications=aggregated_meds,
         doctor_name="Dr. HealthMate AI"
     )
 
@@ -0,0 +1,61 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+# ---- Doctor Index ----
+class DoctorIndex:
+    """Precomputed specialization -> doctor ids lookup.
+
+    Doctor ids are positions in `doctor.json`. Each bucket keeps file order,
+    which is the order `match_doctors_by_condition` has always returned.
+    """
+
+    def __init__(self, doctors: List[Dict[str, Any]], condition_specialization: Dict[str, List[str]]):
+        self.doctors = list(doctors)
+        self.by_specialization: Dict[str, List[int]] = {}
+        for i, doc in enumerate(self.doctors):
+            for spec in dict.fromkeys(doc.get("specialization", [])):
+                self.by_specialization.setdefault(spec, []).append(i)
+        # Specializations are listed most relevant first (e.g. "General Physician" last)
+        self.condition_specialization = {
+            cond: tuple(specs) for cond, specs in condition_specialization.items()
+        }
+
+    def specializations_for(self, conditions: List[str], by_priority: bool = False) -> Iterator[str]:
+        """Specializations to draw doctors from, without repeats.
+
+        By default this walks condition by condition. With `by_priority` it
+        takes every condition's first-choice specialization before any
+        second choice, so a generalist listed last for one condition can't
+        crowd out another condition's specialist.
+        """
+        lists = [self.condition_specialization.get(c, ()) for c in conditions]
+        if by_priority:
+            depth = max((len(specs) for specs in lists), default=0)
+            ordered = (specs[rank] for rank in range(depth) for specs in lists if rank < len(specs))
+        else:
+            ordered = (spec for specs in lists for spec in specs)
+        return iter(dict.fromkeys(ordered))
+
+    def match(self, conditions: List[str], top_n: int = 4, by_priority: bool = False,
+              rank: Optional[Callable[[Dict[str, Any]], Any]] = None) -> List[Dict[str, Any]]:
+        """Up to `top_n` distinct doctors for `conditions`, stopping as soon as enough are found.
+
+        `rank` is an optional sort key applied to the doctors within each
+        specialization (e.g. by city or availability).
+        """
+        matched: List[Dict[str, Any]] = []
+        if top_n <= 0:
+            return matched
+        seen = set()
+        for spec in self.specializations_for(conditions, by_priority):
+            ids = self.by_specialization.get(spec, [])
+            if rank is not None:
+                ids = sorted(ids, key=lambda i: rank(self.doctors[i]))
+            for i in ids:
+                if i in seen:
+                    continue
+                seen.add(i)
+                matched.append(self.doctors[i])
+                if len(matched) >= top_n:
+                    return matched
+        return matched
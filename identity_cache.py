@@ -0,0 +1,156 @@
+import os
+import time
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from singleflight import SingleFlight
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("PATIENT_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_TTL = float(os.getenv("PATIENT_CACHE_TTL", "30"))
+
+
+# ---- Cached Identity ----
+class PatientIdentity(UserMixin):
+    """Read-only stand-in for a Patient row, used as Flask-Login's current_user.
+
+    Built from the row's `to_dict()` output, so serving it again is a dict
+    copy rather than a query and a re-serialization. Columns read as
+    attributes (`current_user.email`); writes must go through a real
+    Patient loaded from the session.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.id = data["id"]
+        self._data = data
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.__dict__["_data"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self._data)
+
+
+# ---- Identity Cache ----
+class IdentityCache:
+    """Per-process LRU of PatientIdentity objects with a short TTL.
+
+    Writes made through this process's ORM sessions invalidate entries
+    immediately (see `watch_model`); the TTL bounds how long another
+    worker's writes can go unseen. Concurrent misses for one patient share
+    a single load.
+    """
+
+    def __init__(self, loader: Callable[[int], Optional[Dict[str, Any]]],
+                 max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (identity, expires_at)
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidation
+        self._loads = SingleFlight()
+        self.metrics: Dict[str, int] = {"hits": 0, "misses": 0, "evicted": 0, "expired": 0, "invalidated": 0}
+
+    def get(self, patient_id: int) -> Optional[PatientIdentity]:
+        """The cached identity, loading it on a miss; None if there is no such patient."""
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is not None:
+                if entry[1] > self.clock():
+                    self._entries.move_to_end(patient_id)
+                    self.metrics["hits"] += 1
+                    return entry[0]
+                del self._entries[patient_id]
+                self.metrics["expired"] += 1
+            self.metrics["misses"] += 1
+            generation = self._generation
+
+        data = self._loads.do(str(patient_id), lambda: self.loader(patient_id))
+        if data is None:
+            return None
+        identity = PatientIdentity(data)
+        with self._lock:
+            # A write committed while we were loading may not be in `data`
+            if generation == self._generation:
+                self._entries[patient_id] = (identity, self.clock() + self.ttl)
+                self._entries.move_to_end(patient_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.metrics["evicted"] += 1
+        return identity
+
+    def invalidate(self, patient_id: Optional[int] = None):
+        """Drop one patient, or every patient when `patient_id` is None."""
+        with self._lock:
+            self._generation += 1
+            if patient_id is None:
+                self.metrics["invalidated"] += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(patient_id, None) is not None:
+                self.metrics["invalidated"] += 1
+
+    def watch_model(self, model):
+        """Invalidate on every ORM update or delete of `model` rows.
+
+        Entries are dropped at flush and again after commit, so a load that
+        raced the transaction cannot keep the pre-commit row. Bulk
+        query-level UPDATE/DELETE statements clear the whole cache. The
+        cache is held weakly: dropping it (say, with its app) unwatches it.
+        """
+        with _watchers_lock:
+            caches = _watchers.get(model)
+            if caches is None:
+                caches = _watchers[model] = weakref.WeakSet()
+                event.listen(model, "after_update", _row_changed)
+                event.listen(model, "after_delete", _row_changed)
+            caches.add(self)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl, **self.metrics}
+
+
+# ---- ORM Invalidation ----
+# model -> the caches watching it. SQLAlchemy listeners are global and keep
+# whatever they reference alive, so they are registered once (per model for
+# the mapper events, at import for the Session ones) and dispatch here
+# instead of closing over a cache.
+_watchers: Dict[type, "weakref.WeakSet[IdentityCache]"] = {}
+_watchers_lock = threading.Lock()
+
+
+def _invalidate(model, patient_id: Optional[int] = None):
+    with _watchers_lock:
+        caches = list(_watchers.get(model, ()))
+    for cache in caches:
+        cache.invalidate(patient_id)
+
+
+def _row_changed(mapper, connection, target):
+    _invalidate(mapper.class_, target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_identities", set()).add((mapper.class_, target.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    for model, patient_id in session.info.pop("changed_identities", ()):
+        _invalidate(model, patient_id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_statement(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ in _watchers:
+        _invalidate(orm_execute_state.bind_mapper.class_)
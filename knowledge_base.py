@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import logging
+import stat
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from symptom_index import SymptomIndex
+from doctor_index import DoctorIndex
+from matchers import select_matcher, DEFAULT_BACKEND
+
+# Knowledge base files, resolved next to this module (not the working
+# directory) unless KB_DIR says otherwise
+KB_DIR = os.getenv("KB_DIR", os.path.dirname(os.path.abspath(__file__)))
+KB_SOURCES = {
+    "med_data": "new.json",
+    "doctor_data": "doctor.json",
+    "condition_specialization": "condition_specialization.json",
+}
+# Compiled snapshot; build it ahead of time (`python knowledge_base.py`) so
+# a cold container unpickles the indexes instead of deriving them. Empty
+# string disables it.
+#
+# Unpickling runs arbitrary code, so the snapshot is trusted exactly as far
+# as the code next to it: it is only loaded when owned by the user running
+# the process and not writable by group or others. Build it as that user
+# (e.g. after USER in the Dockerfile) and never point KB_SNAPSHOT_PATH at a
+# shared or world-writable location.
+KB_SNAPSHOT_PATH = os.getenv("KB_SNAPSHOT_PATH", os.path.join(KB_DIR, ".kb_snapshot.pickle"))
+# Bump when SymptomIndex / DoctorIndex / matcher internals change shape
+SNAPSHOT_FORMAT = 2
+# Modules whose objects end up in the pickle; their source is part of the
+# snapshot key, so a deploy that forgot to bump SNAPSHOT_FORMAT still
+# recompiles instead of unpickling stale internals
+SNAPSHOT_MODULES = ("knowledge_base", "symptom_index", "doctor_index", "matchers", "symptom_vectors")
+# Seconds between checks of the source files for edits (0: reload only on request)
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "10"))
+# Superseded versions kept for conversations that started on them
+KB_RETAINED_VERSIONS = int(os.getenv("KB_RETAINED_VERSIONS", "3"))
+
+logger = logging.getLogger(__name__)
+
+
+# ---- Knowledge Base ----
+class KnowledgeBase:
+    """The parsed JSON files plus everything derived from them.
+
+    Immutable once built: requests only ever read it, so one instance is
+    shared by every thread (and both chatbots) in the process. `version`
+    is derived from the source contents, so every worker that loaded the
+    same files agrees on it.
+    """
+
+    def __init__(self, med_data: Dict[str, Any], doctor_data: List[Dict[str, Any]],
+                 condition_specialization: Dict[str, List[str]], matcher_backend: Optional[str] = None,
+                 version: str = ""):
+        self.version = version
+        self.built_at = time.time()
+        self.med_data = med_data
+        self.doctor_data = doctor_data
+        self.condition_specialization = condition_specialization
+        self.symptom_index = SymptomIndex(med_data)
+        self.symptom_matcher = select_matcher(med_data, matcher_backend, symptom_index=self.symptom_index)
+        self.doctor_index = DoctorIndex(doctor_data, condition_specialization)
+        self.medications: Dict[str, Tuple[Dict[str, Any], ...]] = {
+            condition: tuple(info.get("medications", [])) for condition, info in med_data.items()
+        }
+
+    def medications_for(self, conditions: List[str]) -> List[Dict[str, Any]]:
+        """Every medication listed for `conditions`, in condition order (not deduplicated)."""
+        meds: List[Dict[str, Any]] = []
+        for condition in conditions:
+            meds.extend(self.medications.get(condition, ()))
+        return meds
+
+
+# ---- Snapshot ----
+def _source_paths(kb_dir: str) -> Dict[str, str]:
+    return {name: os.path.join(kb_dir, filename) for name, filename in KB_SOURCES.items()}
+
+
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _fingerprint(paths: Dict[str, str]) -> Dict[str, Tuple[int, int]]:
+    """(size, mtime_ns) per source: the cheap check."""
+    return {name: (os.stat(path).st_size, os.stat(path).st_mtime_ns) for name, path in paths.items()}
+
+
+def _content_version(hashes: Dict[str, str]) -> str:
+    combined = "".join(hashes[name] for name in sorted(hashes))
+    return hashlib.sha256(combined.encode("ascii")).hexdigest()[:12]
+
+
+_code_hash: Optional[str] = None
+
+
+def _code_version() -> str:
+    """Hash of the SNAPSHOT_MODULES sources, computed once per process."""
+    global _code_hash
+    if _code_hash is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        combined = "".join(_sha256(os.path.join(here, f"{name}.py")) for name in SNAPSHOT_MODULES)
+        _code_hash = hashlib.sha256(combined.encode("ascii")).hexdigest()[:16]
+    return _code_hash
+
+
+def _snapshot_key(backend: str) -> Tuple[Any, ...]:
+    # Pickled numpy arrays and interned layouts are only trusted by the
+    # code, interpreter and library versions that wrote them
+    return (SNAPSHOT_FORMAT, _code_version(), backend, sys.version_info[:2], np.__version__)
+
+
+def _trusted(f) -> bool:
+    """Whether the open snapshot is ours: owned by this user, not group/other-writable."""
+    if not hasattr(os, "getuid"):
+        return True  # no POSIX ownership (Windows)
+    st = os.fstat(f.fileno())
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _load_snapshot(snapshot_path: str, paths: Dict[str, str], backend: str) -> Optional[KnowledgeBase]:
+    """The pickled KnowledgeBase if it was compiled from the current sources, else None.
+
+    Sources are matched by size and mtime first; when the mtime differs
+    (a fresh checkout or image layer) the content hash decides.
+    """
+    try:
+        with open(snapshot_path, "rb") as f:
+            if not _trusted(f):
+                logger.warning("Ignoring knowledge base snapshot %s: not owned by this user "
+                               "or writable by others", snapshot_path)
+                return None
+            header = pickle.load(f)
+            if header.get("key") != _snapshot_key(backend):
+                return None
+            fingerprint = _fingerprint(paths)
+            for name, path in paths.items():
+                if fingerprint[name] != header["fingerprint"].get(name) \
+                        and _sha256(path) != header["hashes"].get(name):
+                    return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable knowledge base snapshot %s: %r", snapshot_path, e)
+        return None
+
+
+def _save_snapshot(snapshot_path: str, header: Dict[str, Any], kb: KnowledgeBase):
+    tmp = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(kb, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Whatever the umask, keep it loadable by _trusted()
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, snapshot_path)
+    except OSError as e:
+        # A read-only image still works; it just compiles on every boot
+        logger.warning("Could not write knowledge base snapshot %s: %r", snapshot_path, e)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def build_knowledge_base(kb_dir: str = KB_DIR, snapshot_path: Optional[str] = KB_SNAPSHOT_PATH,
+                         matcher_backend: Optional[str] = None, refresh: bool = False) -> KnowledgeBase:
+    """Load the knowledge base from its snapshot, or parse and compile it (refreshing the snapshot).
+
+    `refresh` skips the snapshot and always compiles, then rewrites it.
+    """
+    backend = (matcher_backend or DEFAULT_BACKEND).strip().lower()
+    paths = _source_paths(kb_dir)
+    if snapshot_path and not refresh:
+        kb = _load_snapshot(snapshot_path, paths, backend)
+        if kb is not None:
+            return kb
+
+    # Fingerprint before reading, so an edit landing mid-build leaves the
+    # snapshot stale rather than describing contents it doesn't hold
+    fingerprint = _fingerprint(paths)
+    raw = {}
+    for name, path in paths.items():
+        with open(path, "rb") as f:
+            raw[name] = f.read()
+    hashes = {name: hashlib.sha256(data).hexdigest() for name, data in raw.items()}
+    data = {name: json.loads(blob.decode("utf-8")) for name, blob in raw.items()}
+    kb = KnowledgeBase(data["med_data"], data["doctor_data"], data["condition_specialization"],
+                       backend, version=_content_version(hashes))
+    if snapshot_path:
+        header = {"key": _snapshot_key(backend), "fingerprint": fingerprint, "hashes": hashes}
+        _save_snapshot(snapshot_path, header, kb)
+    return kb
+
+
+# ---- Versioned Holder ----
+class KnowledgeBaseHolder:
+    """The process's current KnowledgeBase, swappable without a restart.
+
+    A reload builds the new version off to the side (requests keep using
+    the old one meanwhile) and then swaps a single reference, so a reader
+    sees either the old or the new version, never a mix. A failed build
+    (say, a half-saved JSON file) is logged and the current version stays.
+
+    Conversations pin the version they matched symptoms against and look
+    it up with `get(version)`; the last few superseded versions are kept
+    for them. A version this process never had (the session moved from
+    another worker) or has dropped resolves to the current one.
+
+    `builder` is called as builder(refresh=...) and must accept it; a forced
+    reload passes refresh=True so the snapshot is recompiled, not reused.
+    """
+
+    def __init__(self, builder: Callable[..., KnowledgeBase] = build_knowledge_base,
+                 kb_dir: str = KB_DIR, watch_interval: float = KB_WATCH_INTERVAL,
+                 retain: int = KB_RETAINED_VERSIONS):
+        self.builder = builder
+        self.paths = _source_paths(kb_dir)
+        self.watch_interval = watch_interval
+        self.retain = retain
+        self._current: Optional[KnowledgeBase] = None
+        self._versions: "OrderedDict[str, KnowledgeBase]" = OrderedDict()
+        self._fingerprint: Optional[Dict[str, Tuple[int, int]]] = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self.metrics: Dict[str, Any] = {"reloads": 0, "swaps": 0, "failures": 0, "last_error": None}
+
+    def current(self) -> KnowledgeBase:
+        """The live version, loaded on first use."""
+        kb = self._current
+        if kb is None:
+            with self._reload_lock:
+                if self._current is None:
+                    fingerprint = _fingerprint(self.paths)
+                    self._swap(self.builder(refresh=False), fingerprint)
+                kb = self._current
+            self._start_watcher()
+        return kb
+
+    def get(self, version: Optional[str] = None) -> KnowledgeBase:
+        """The pinned `version` if this process still holds it, else the live version."""
+        if version:
+            kb = self._versions.get(version)
+            if kb is not None:
+                return kb
+        return self.current()
+
+    def _swap(self, kb: KnowledgeBase, fingerprint: Dict[str, Tuple[int, int]]):
+        with self._lock:
+            self._fingerprint = fingerprint
+            if self._current is not None and kb.version == self._current.version:
+                return  # touched but unchanged
+            self._versions[kb.version] = kb
+            self._versions.move_to_end(kb.version)
+            while len(self._versions) > self.retain + 1:
+                self._versions.popitem(last=False)
+            self._current = kb
+            self.metrics["swaps"] += 1
+
+    def reload(self, force: bool = False) -> Dict[str, Any]:
+        """Rebuild if the sources changed and swap the result in.
+
+        `force` always rebuilds, from the sources rather than the snapshot,
+        and rewrites the snapshot.
+        """
+        with self._reload_lock:
+            fingerprint = _fingerprint(self.paths)
+            previous = self._current.version if self._current is not None else None
+            if not force and self._current is not None and fingerprint == self._fingerprint:
+                return {"reloaded": False, "version": previous}
+            self.metrics["reloads"] += 1
+            try:
+                kb = self.builder(refresh=force)
+            except Exception as e:
+                self.metrics["failures"] += 1
+                self.metrics["last_error"] = f"{type(e).__name__}: {e}"
+                # Remember the broken files so the watcher waits for the next edit
+                self._fingerprint = fingerprint
+                logger.error("Knowledge base reload failed, keeping version %s: %r", previous, e)
+                return {"reloaded": False, "version": previous, "error": self.metrics["last_error"]}
+            self.metrics["last_error"] = None
+            self._swap(kb, fingerprint)
+        if kb.version != previous:
+            logger.info("Knowledge base version %s -> %s", previous, kb.version)
+        return {"reloaded": kb.version != previous, "version": kb.version, "previous": previous}
+
+    def reload_in_background(self, force: bool = False) -> bool:
+        """Start a reload on a daemon thread; False if one is already running."""
+        if self._reload_lock.locked():
+            return False
+        threading.Thread(target=self.reload, kwargs={"force": force},
+                         name="kb-reload", daemon=True).start()
+        return True
+
+    def _start_watcher(self):
+        if self.watch_interval <= 0 or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name="kb-watcher", daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                if _fingerprint(self.paths) != self._fingerprint:
+                    self.reload()
+            except OSError as e:
+                # Mid-rename by an editor; look again next tick
+                logger.debug("Knowledge base watch skipped: %r", e)
+
+    def stats(self) -> Dict[str, Any]:
+        kb = self._current
+        return {
+            "version": kb.version if kb is not None else None,
+            "built_at": kb.built_at if kb is not None else None,
+            "retained_versions": list(self._versions),
+            "watch_interval": self.watch_interval,
+            **self.metrics,
+        }
+
+
+knowledge_base = KnowledgeBaseHolder()
+
+
+def get_knowledge_base(version: Optional[str] = None) -> KnowledgeBase:
+    """The process's knowledge base (the pinned `version` when still held), loaded on first use."""
+    return knowledge_base.get(version)
+
+
+if __name__ == "__main__":
+    # Precompile the snapshot, e.g. as a container build step:
+    #   RUN python knowledge_base.py
+    import time
+    start = time.perf_counter()
+    kb = build_knowledge_base(refresh=True)
+    print(f"Compiled {len(kb.med_data)} conditions, {len(kb.symptom_index)} symptom keys, "
+          f"{len(kb.doctor_data)} doctors into {KB_SNAPSHOT_PATH} in {time.perf_counter() - start:.2f}s")
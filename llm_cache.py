@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Generator, List, Optional, Tuple
+from singleflight import SingleFlight, AsyncSingleFlight
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+DEFAULT_DB_PATH = os.getenv("LLM_CACHE_DB", "")  # empty: memory tier only
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") not in ("0", "false", "False")
+
+
+def cache_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    """SHA-256 over a canonical JSON encoding of everything that shapes the completion."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ---- LLM Response Cache ----
+class LLMCache:
+    """Two-tier cache of completion texts keyed by `cache_key`.
+
+    The memory tier is a per-process LRU; the optional disk tier is an
+    SQLite file that survives restarts and is shared by every worker on the
+    host. Disk hits are promoted into memory. Both tiers honour a TTL.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 db_path: Optional[str] = DEFAULT_DB_PATH or None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.metrics: Dict[str, int] = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "stores": 0, "bypassed": 0, "evicted": 0, "expired": 0,
+        }
+        if db_path:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.metrics[name] += n
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.metrics["evicted"] += 1
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._memory.move_to_end(key)
+                    self.metrics["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+                self.metrics["expired"] += 1
+        return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        if row:
+            self._remember(key, row[0], row[1])
+            self._count("disk_hits")
+            return row[0]
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._get_memory(key)
+        if text is None and self.db_path:
+            text = self._get_disk(key)
+        if text is None:
+            self._count("misses")
+        return text
+
+    async def aget(self, key: str) -> Optional[str]:
+        """`get` for the event loop: the SQLite tier is read on a worker thread."""
+        text = self._get_memory(key)
+        if text is None and self.db_path:
+            text = await asyncio.to_thread(self._get_disk, key)
+        if text is None:
+            self._count("misses")
+        return text
+
+    def _set_memory(self, key: str, value: str, ttl: Optional[float]) -> Tuple[float, int]:
+        """Store in memory; returns (expires_at, stores including this one)."""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._remember(key, value, expires_at)
+        with self._lock:
+            self.metrics["stores"] += 1
+            return expires_at, self.metrics["stores"]
+
+    def _set_disk(self, key: str, value: str, expires_at: float, stores: int):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+        if stores % 1000 == 0:
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        expires_at, stores = self._set_memory(key, value, ttl)
+        if self.db_path:
+            self._set_disk(key, value, expires_at, stores)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None):
+        """`set` for the event loop: the SQLite tier is written on a worker thread."""
+        expires_at, stores = self._set_memory(key, value, ttl)
+        if self.db_path:
+            await asyncio.to_thread(self._set_disk, key, value, expires_at, stores)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            self._conn().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.metrics["memory_hits"] + self.metrics["disk_hits"] + self.metrics["misses"]
+            hits = self.metrics["memory_hits"] + self.metrics["disk_hits"]
+            return {
+                "size": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk_tier": bool(self.db_path),
+                "hit_rate": hits / lookups if lookups else 0.0,
+                **self.metrics,
+            }
+
+
+llm_cache = LLMCache()
+# Identical LLM requests currently in flight, shared by concurrent callers
+inflight = SingleFlight()
+ainflight = AsyncSingleFlight()
+
+
+def _lookup(cache: LLMCache, key: str, use_cache: bool) -> Optional[str]:
+    if use_cache and CACHE_ENABLED:
+        return cache.get(key)
+    cache._count("bypassed")
+    return None
+
+
+def _store(cache: LLMCache, key: str, text: str, use_cache: bool, ttl: Optional[float]):
+    if use_cache and CACHE_ENABLED:
+        cache.set(key, text, ttl)
+
+
+async def _alookup(cache: LLMCache, key: str, use_cache: bool) -> Optional[str]:
+    if use_cache and CACHE_ENABLED:
+        return await cache.aget(key)
+    cache._count("bypassed")
+    return None
+
+
+async def _astore(cache: LLMCache, key: str, text: str, use_cache: bool, ttl: Optional[float]):
+    if use_cache and CACHE_ENABLED:
+        await cache.aset(key, text, ttl)
+
+
+def cached_completion(client, *, model: str, messages: List[Dict[str, str]],
+                      temperature: float, max_tokens: int,
+                      use_cache: bool = True, ttl: Optional[float] = None,
+                      cache: Optional[LLMCache] = None) -> str:
+    """`client.chat.completions.create` through the response cache; returns the stripped text.
+
+    Concurrent misses for the same prompt are coalesced into one upstream
+    request (see singleflight.py). Pass `use_cache=False` for calls whose
+    answer must be fresh; they still share an identical in-flight request.
+    """
+    cache = cache or llm_cache
+    key = cache_key(model, messages, temperature, max_tokens)
+    text = _lookup(cache, key, use_cache)
+    if text is not None:
+        return text
+
+    def complete() -> str:
+        response = client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+        )
+        text = response.choices[0].message.content.strip()
+        _store(cache, key, text, use_cache, ttl)
+        return text
+
+    return inflight.do(key, complete)
+
+
+def stream_completion(client, *, model: str, messages: List[Dict[str, str]],
+                      temperature: float, max_tokens: int,
+                      use_cache: bool = True, ttl: Optional[float] = None,
+                      cache: Optional[LLMCache] = None) -> Generator[str, None, str]:
+    """Streaming counterpart of `cached_completion`: yields text deltas as they arrive.
+
+    The generator's return value is the full stripped text, which is cached
+    once the stream finishes. A cache hit, or the result of an identical
+    request already in flight, is yielded as a single delta.
+    """
+    cache = cache or llm_cache
+    key = cache_key(model, messages, temperature, max_tokens)
+    text = _lookup(cache, key, use_cache)
+    if text is not None:
+        yield text
+        return text
+
+    call, leader = inflight.acquire(key)
+    if not leader:
+        text = inflight.wait(call)
+        if not call.abandoned:
+            yield text
+            return text
+        call, leader = None, False  # the leader's client went away; stream on our own
+
+    parts = []
+    try:
+        stream = client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens, stream=True
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        if leader:
+            inflight.resolve(key, call, error=e)
+        raise
+    except BaseException:
+        if leader:
+            inflight.resolve(key, call, abandoned=True)
+        raise
+    text = "".join(parts).strip()
+    _store(cache, key, text, use_cache, ttl)
+    if leader:
+        inflight.resolve(key, call, result=text)
+    return text
+
+
+async def acached_completion(aclient, *, model: str, messages: List[Dict[str, str]],
+                             temperature: float, max_tokens: int,
+                             use_cache: bool = True, ttl: Optional[float] = None,
+                             cache: Optional[LLMCache] = None) -> str:
+    """`cached_completion` for an `AsyncOpenAI` client: the request is awaited, not blocked on."""
+    cache = cache or llm_cache
+    key = cache_key(model, messages, temperature, max_tokens)
+    text = await _alookup(cache, key, use_cache)
+    if text is not None:
+        return text
+
+    async def complete() -> str:
+        response = await aclient.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+        )
+        text = response.choices[0].message.content.strip()
+        await _astore(cache, key, text, use_cache, ttl)
+        return text
+
+    return await ainflight.do(key, complete)
+
+
+async def astream_completion(aclient, *, model: str, messages: List[Dict[str, str]],
+                             temperature: float, max_tokens: int,
+                             use_cache: bool = True, ttl: Optional[float] = None,
+                             cache: Optional[LLMCache] = None) -> AsyncIterator[str]:
+    """`stream_completion` for an `AsyncOpenAI` client.
+
+    Async generators can't return a value, so callers join the deltas
+    themselves; `"".join(deltas).strip()` is the text that gets cached.
+    """
+    cache = cache or llm_cache
+    key = cache_key(model, messages, temperature, max_tokens)
+    text = await _alookup(cache, key, use_cache)
+    if text is not None:
+        yield text
+        return
+
+    future, leader = ainflight.acquire(key)
+    if not leader:
+        text = await ainflight.wait(future)
+        if not future.result()[2]:
+            yield text
+            return
+
+    parts = []
+    try:
+        stream = await aclient.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens, stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        if leader:
+            ainflight.resolve(key, future, error=e)
+        raise
+    except BaseException:
+        if leader:
+            ainflight.resolve(key, future, abandoned=True)
+        raise
+    text = "".join(parts).strip()
+    # Release waiting followers before the (possibly disk) store
+    if leader:
+        ainflight.resolve(key, future, result=text)
+    await _astore(cache, key, text, use_cache, ttl)
@@ -0,0 +1,516 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import openai
+from openai import OpenAI, AsyncOpenAI
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # e.g. a local mock server
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "20"))  # one attempt
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "45"))  # all attempts of one call
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "50"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "4"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")  # model for hedged requests; empty: same model
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") not in ("0", "false", "False")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_INITIAL_DELAY = float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "8"))  # until enough samples
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1"))  # at most this share of calls hedged
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "8"))  # sync hedges in flight at once
+
+logger = logging.getLogger(__name__)
+
+# 429, 5xx, timeouts and dropped connections; anything else (bad request,
+# auth) is our bug and is raised straight away.
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+)
+
+
+class LLMUnavailableError(RuntimeError):
+    """The provider could not produce an answer in time; callers fall back to canned text."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+
+# ---- Circuit Breaker ----
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed.
+
+    After `failure_threshold` failed calls in a row the breaker opens and
+    every call fails fast for `reset_timeout` seconds. Then one trial call
+    is let through (half-open); its outcome closes or re-opens the breaker.
+    A trial cancelled before it had an outcome counts as a failure, and one
+    outstanding for longer than `reset_timeout` is treated as lost, so the
+    breaker can never stay half-open with nothing let through.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 reset_timeout: float = LLM_BREAKER_RESET,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = self.clock()
+            if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and self._trial_in_flight \
+                    and now - self._trial_started >= self.reset_timeout:
+                logger.warning("LLM circuit breaker trial call never reported back; allowing another")
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_abandoned(self):
+        """A call ended without an outcome (cancelled); a half-open trial counts as failed."""
+        with self._lock:
+            trial = self.state == "half_open" and self._trial_in_flight
+        if trial:
+            self.record_failure()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("LLM circuit breaker opened after %d failures", self.failures)
+                self.state = "open"
+                self.opened_at = self.clock()
+
+
+# ---- Latency Tracking ----
+class LatencyWindow:
+    """Recent call latencies for one model, for percentile-based hedge deadlines."""
+
+    def __init__(self, size: int = 500, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile (nearest rank), or None before `min_samples` calls."""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        rank = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return ordered[rank]
+
+
+# ---- Hedge Timer ----
+class HedgeTimer:
+    """Runs callbacks at a given `time.monotonic()` on one shared thread.
+
+    Sync calls arm a timer for their hedge delay instead of each keeping a
+    thread around to wait it out; callbacks must only hand work off.
+    """
+
+    def __init__(self):
+        self._queue: List[list] = []  # heap of [when, seq, callback]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def call_at(self, when: float, callback: Callable[[], None]) -> list:
+        entry = [when, next(self._seq), callback]
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-hedge-timer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return entry
+
+    def cancel(self, entry: list):
+        entry[2] = None  # dropped when it comes due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    self._cond.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                _, _, callback = heapq.heappop(self._queue)
+            if callback is not None:
+                try:
+                    callback()
+                except Exception:
+                    logger.exception("Hedge timer callback failed")
+
+
+hedge_timer = HedgeTimer()
+
+
+# ---- LLM Gateway ----
+class LLMGateway:
+    """The one place the app talks to the LLM provider.
+
+    Owns a pooled keep-alive HTTP client (sync and async, built on first
+    use), gives every call a deadline across all of its attempts, retries
+    429/5xx/timeouts with jittered exponential backoff (honouring
+    Retry-After), and trips a circuit breaker when the provider keeps
+    failing. `client` and `aclient` look like the OpenAI clients'
+    `chat.completions.create`, so `cached_completion` works unchanged.
+    The SDK's own retries are disabled so there is a single retry policy.
+
+    Non-streaming calls are hedged: if one hasn't returned by the model's
+    recent p95 latency (LLM_HEDGE_PERCENTILE), a second request is sent,
+    to LLM_FALLBACK_MODEL if set, and whichever answers first wins. Hedges
+    are capped at LLM_HEDGE_MAX_RATE of calls, so a slow provider doesn't
+    get twice the load. A blocking request can't be abandoned, so `create`
+    runs the primary on the caller's thread and sends the hedge from a
+    small pool (LLM_HEDGE_WORKERS); the hedge answers the call when the
+    primary's attempt fails or times out instead of it being retried.
+    """
+
+    def __init__(self, api_key: str = OPENAI_API_KEY, base_url: Optional[str] = OPENAI_BASE_URL,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 request_timeout: float = LLM_REQUEST_TIMEOUT,
+                 deadline: float = LLM_DEADLINE,
+                 max_connections: int = LLM_MAX_CONNECTIONS,
+                 max_keepalive: int = LLM_MAX_KEEPALIVE,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None,
+                 hedge: bool = LLM_HEDGE_ENABLED,
+                 fallback_model: str = LLM_FALLBACK_MODEL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.fallback_model = fallback_model
+        self.latency: Dict[str, LatencyWindow] = {}
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._sync: Optional[OpenAI] = None
+        self._async: Optional[AsyncOpenAI] = None
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, int] = {
+            "calls": 0, "attempts": 0, "retries": 0,
+            "failures": 0, "short_circuited": 0,
+            "hedged": 0, "hedge_wins": 0,
+        }
+        self.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self.create)))
+        self.aclient = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self.acreate)))
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.metrics[name] += n
+
+    def _client_options(self) -> Dict[str, Any]:
+        # The SDK re-exports its HTTP library's defaults; reuse their types so
+        # this works whichever httpx build the installed openai depends on.
+        limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        )
+        timeout = openai.Timeout(self.request_timeout, connect=self.connect_timeout)
+        return {"limits": limits, "timeout": timeout}
+
+    @property
+    def sync_client(self) -> OpenAI:
+        if self._sync is None:
+            with self._lock:
+                if self._sync is None:
+                    options = self._client_options()
+                    self._sync = OpenAI(
+                        api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                        timeout=options["timeout"], http_client=openai.DefaultHttpxClient(**options),
+                    )
+        return self._sync
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # Built inside the running event loop on first use
+        if self._async is None:
+            options = self._client_options()
+            self._async = AsyncOpenAI(
+                api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                timeout=options["timeout"], http_client=openai.DefaultAsyncHttpxClient(**options),
+            )
+        return self._async
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                pass
+        if retry_after is not None:
+            return min(retry_after, LLM_RETRY_MAX_DELAY)
+        # Full jitter: spreads out the retries of callers that failed together
+        return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+    def _start(self) -> float:
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError("LLM provider unavailable (circuit open)")
+        return time.monotonic() + self.deadline
+
+    def _retry_delay(self, attempt: int, error: Exception, deadline: float) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up."""
+        if attempt >= self.max_retries:
+            return None
+        delay = self._backoff(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            return None
+        self._count("retries")
+        return delay
+
+    def _give_up(self, error: Exception):
+        self._count("failures")
+        self.breaker.record_failure()
+        raise LLMUnavailableError(f"LLM call failed: {error!r}") from error
+
+    def _window(self, model: str) -> LatencyWindow:
+        window = self.latency.get(model)
+        if window is None:
+            with self._lock:
+                window = self.latency.setdefault(model, LatencyWindow())
+        return window
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait on a call to `model` before hedging it."""
+        observed = self._window(model).percentile(LLM_HEDGE_PERCENTILE)
+        if observed is None:
+            return LLM_HEDGE_INITIAL_DELAY
+        return max(observed, LLM_HEDGE_MIN_DELAY)
+
+    def _should_hedge(self, kwargs: Dict[str, Any]) -> bool:
+        if not self.hedge or kwargs.get("stream"):
+            return False
+        with self._lock:
+            return self.metrics["hedged"] < LLM_HEDGE_MAX_RATE * max(self.metrics["calls"], 1)
+
+    def _hedge_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {**kwargs, "model": self.fallback_model} if self.fallback_model else kwargs
+
+    def _send_hedge(self, hedge: Future, kwargs: Dict[str, Any]):
+        """Hedge timer callback: queue the hedge unless the primary already finished."""
+        if hedge.cancelled() or not self._should_hedge(kwargs):
+            return
+        if self._hedge_pool is None:
+            with self._lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+        self._hedge_pool.submit(self._run_hedge, hedge, kwargs)
+
+    def _run_hedge(self, hedge: Future, kwargs: Dict[str, Any]):
+        # Still queued when the primary finished: cancelled, never sent
+        if not hedge.set_running_or_notify_cancel():
+            return
+        self._count("hedged")
+        try:
+            hedge.set_result(self._call(**self._hedge_kwargs(kwargs)))
+        except BaseException as e:
+            hedge.set_exception(e)
+
+    def create(self, **kwargs):
+        """`chat.completions.create` with deadline, retries, circuit breaker and hedging."""
+        self._count("calls")  # once per logical call, however many attempts or hedges
+        if not self._should_hedge(kwargs):
+            return self._call(**kwargs)
+        hedge: Future = Future()  # pending until a pool worker sends the hedge
+        timer = hedge_timer.call_at(time.monotonic() + self.hedge_delay(kwargs["model"]),
+                                    lambda: self._send_hedge(hedge, kwargs))
+        try:
+            return self._call(_hedge=hedge, **kwargs)
+        except Exception:
+            if hedge.cancel():  # never sent
+                raise
+            try:
+                response = hedge.result()
+            except Exception:
+                response = None
+            if response is None:
+                raise  # both failed: the primary's error
+            self._count("hedge_wins")
+            return response
+        finally:
+            hedge_timer.cancel(timer)
+            hedge.cancel()  # a sent hedge finishes in the background and only feeds the latency window
+
+    async def acreate(self, **kwargs):
+        """Async `create`: the same policy, without blocking the event loop."""
+        self._count("calls")
+        if not self._should_hedge(kwargs):
+            return await self._acall(**kwargs)
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._acall(**kwargs))
+        done, _ = await asyncio.wait([primary], timeout=self.hedge_delay(kwargs["model"]))
+        if done or not self._should_hedge(kwargs):
+            return await primary
+
+        self._count("hedged")
+        hedge = asyncio.ensure_future(self._acall(**self._hedge_kwargs(kwargs)))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if primary in pending:
+                # Keep the slow tail in the window: it lasted at least this long
+                self._window(kwargs["model"]).record(time.monotonic() - started)
+
+    def _call(self, _hedge: Optional[Future] = None, **kwargs):
+        """One logical call: attempts with retries under the deadline and breaker.
+
+        Once `_hedge` has been sent, a failed attempt isn't retried: the
+        caller waits on the hedge instead.
+        """
+        deadline = self._start()
+        try:
+            attempt = 0
+            while True:
+                self._count("attempts")
+                timeout = min(self.request_timeout, max(deadline - time.monotonic(), 0.1))
+                started = time.monotonic()
+                try:
+                    response = self.sync_client.chat.completions.create(timeout=timeout, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    hedged = _hedge is not None and (_hedge.running() or (
+                        _hedge.done() and not _hedge.cancelled() and _hedge.exception() is None))
+                    delay = None if hedged else self._retry_delay(attempt, e, deadline)
+                    if delay is None:
+                        self._give_up(e)
+                    logger.info("Retrying LLM call in %.2fs after %r", delay, e)
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                except Exception:
+                    # The provider answered (e.g. 400); that says nothing about its health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_success()
+                if not kwargs.get("stream"):
+                    self._window(kwargs["model"]).record(time.monotonic() - started)
+                return response
+        except Exception:
+            raise
+        except BaseException:
+            # Cancelled (asyncio.wait_for, a hedge loser, a client that went
+            # away) before any outcome was recorded: release a half-open trial
+            self.breaker.record_abandoned()
+            raise
+
+    async def _acall(self, **kwargs):
+        deadline = self._start()
+        try:
+            attempt = 0
+            while True:
+                self._count("attempts")
+                timeout = min(self.request_timeout, max(deadline - time.monotonic(), 0.1))
+                started = time.monotonic()
+                try:
+                    response = await self.async_client.chat.completions.create(timeout=timeout, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    delay = self._retry_delay(attempt, e, deadline)
+                    if delay is None:
+                        self._give_up(e)
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                except Exception:
+                    # The provider answered (e.g. 400); that says nothing about its health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_success()
+                if not kwargs.get("stream"):
+                    self._window(kwargs["model"]).record(time.monotonic() - started)
+                return response
+        except Exception:
+            raise
+        except BaseException:
+            # Cancelled (asyncio.wait_for, a hedge loser, a client that went
+            # away) before any outcome was recorded: release a half-open trial
+            self.breaker.record_abandoned()
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        latency = {
+            model: {
+                "p50": window.percentile(50),
+                "p95": window.percentile(95),
+                "p99": window.percentile(99),
+                "hedge_delay": self.hedge_delay(model),
+                "samples": len(window.samples),
+            }
+            for model, window in list(self.latency.items())
+        }
+        with self._lock:
+            return {
+                "breaker": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "deadline": self.deadline,
+                "hedging": self.hedge,
+                "fallback_model": self.fallback_model or None,
+                "hedge_rate": self.metrics["hedged"] / self.metrics["calls"] if self.metrics["calls"] else 0.0,
+                "latency": latency,
+                **self.metrics,
+            }
+
+
+gateway = LLMGateway()
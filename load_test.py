@@ -0,0 +1,445 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+from typing import Any, Dict, List, Optional, Tuple
+
+# End-to-end load test: scripted multi-turn conversations against /chatbot
+# and /doctor-chatbot, each virtual user with its own X-Session-ID, with
+# the LLM served by mock_llm_server.py at a chosen latency distribution:
+#
+#   python load_test.py --concurrency 1,8,32,128 --duration 30 --latency lognormal:0.8,0.5
+#   python load_test.py --server asgi --server-workers 1,2,4 --concurrency 64,256
+#   python load_test.py --url http://127.0.0.1:5000 --server-pid 1234 --llm-url none
+#
+# By default the app is started for each worker count (`flask run` with
+# threads, one process; or uvicorn asgi:application) pointed at an
+# in-process mock LLM. Each concurrency level reports throughput, latency
+# percentiles per conversation stage, error and LLM-fallback rates, and
+# the server's resident memory (whole process tree) before, during and after.
+
+# (turn, message, stage the reply must report) turns; {symptoms} is filled
+# per conversation. A reply in any other stage means the session was lost
+# (e.g. the turn reached a worker that doesn't share the session store).
+PATIENT_SCRIPT = (
+    ("greeting", "hi", "ask_symptoms"),
+    ("symptoms", "{symptoms}", "ask_duration"),
+    ("duration", "3 days", "ask_other"),
+    ("other_symptoms", "slight headache", "ask_allergies"),
+    ("allergies", "no allergies", "give_advice"),  # the LLM advice turn
+    ("doctors", "yes", "give_advice"),
+    ("exit", "exit", "give_advice"),
+)
+DOCTOR_SCRIPT = (
+    ("greeting", "hello", "collect_patient_info"),
+    ("consultation", "Ravi 40 years old with {symptoms}", "provide_assessment"),  # four LLM calls
+    ("exit", "exit", "provide_assessment"),
+)
+SCRIPTS = {"patient": ("/chatbot", PATIENT_SCRIPT), "doctor": ("/doctor-chatbot", DOCTOR_SCRIPT)}
+# Stages whose reply should contain mock LLM output; anything else there is a fallback
+LLM_STAGES = {("patient", "allergies"), ("doctor", "consultation")}
+MOCK_MARKER = "[mock "
+
+
+# ---- Conversations ----
+def load_symptom_sets(kb_dir: str) -> List[List[str]]:
+    with open(os.path.join(kb_dir, "new.json"), "r", encoding="utf-8") as f:
+        return [info["symptoms"] for info in json.load(f).values() if info.get("symptoms")]
+
+
+class VirtualUser(threading.Thread):
+    """Runs conversations back to back on one keep-alive connection until told to stop."""
+
+    def __init__(self, base_url: str, user_id: str, mix: List[str], symptom_sets: List[List[str]],
+                 stop: threading.Event, results: "Results", seed: int, timeout: float):
+        super().__init__(name=f"vu-{user_id}", daemon=True)
+        self.url = urlsplit(base_url)
+        self.user_id = user_id
+        self.mix = mix
+        self.symptom_sets = symptom_sets
+        self.stop = stop
+        self.results = results
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.conn: Optional[http.client.HTTPConnection] = None
+
+    def _post(self, path: str, session_id: str, message: str) -> Tuple[int, Dict[str, Any]]:
+        body = json.dumps({"message": message})
+        headers = {"Content-Type": "application/json", "X-Session-ID": session_id}
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+            try:
+                self.conn.request("POST", path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                raw = response.read()
+                return response.status, json.loads(raw) if raw else {}
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # Keep-alive connection dropped by the server between requests
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def run(self):
+        n = 0
+        while not self.stop.is_set():
+            kind = self.rng.choice(self.mix)
+            path, script = SCRIPTS[kind]
+            session_id = f"load-{self.user_id}-{n}"
+            symptom_set = self.rng.choice(self.symptom_sets)
+            symptoms = " and ".join(self.rng.sample(symptom_set, min(2, len(symptom_set))))
+            n += 1
+            ok = True
+            for stage, template, expected_stage in script:
+                started = time.perf_counter()
+                error = None
+                fallback = False
+                try:
+                    status, payload = self._post(path, session_id, template.format(symptoms=symptoms))
+                    if status != 200:
+                        error = f"HTTP {status}"
+                    elif payload.get("stage") != expected_stage:
+                        error = f"stage {payload.get('stage')}"
+                    elif (kind, stage) in LLM_STAGES and MOCK_MARKER not in payload.get("reply_text", ""):
+                        fallback = True
+                except (OSError, http.client.HTTPException, ValueError) as e:
+                    error = type(e).__name__
+                    if self.conn is not None:
+                        self.conn.close()
+                        self.conn = None
+                self.results.record(kind, stage, time.perf_counter() - started, error, fallback)
+                if error is not None:
+                    ok = False
+                    break
+            self.results.conversation(kind, ok)
+        if self.conn is not None:
+            self.conn.close()
+
+
+# ---- Results ----
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.fallbacks: Dict[str, int] = {}
+        self.conversations = {"completed": 0, "failed": 0}
+
+    def record(self, kind: str, stage: str, seconds: float, error: Optional[str], fallback: bool):
+        key = f"{kind}.{stage}"
+        with self._lock:
+            self.latencies.setdefault(key, []).append(seconds)
+            if error is not None:
+                errors = self.errors.setdefault(key, {})
+                errors[error] = errors.get(error, 0) + 1
+            if fallback:
+                self.fallbacks[key] = self.fallbacks.get(key, 0) + 1
+
+    def conversation(self, kind: str, ok: bool):
+        with self._lock:
+            self.conversations["completed" if ok else "failed"] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            everything: List[float] = []
+            for key, values in sorted(self.latencies.items()):
+                values = sorted(values)
+                everything.extend(values)
+                stages[key] = {
+                    "requests": len(values),
+                    "errors": sum(self.errors.get(key, {}).values()),
+                    "fallbacks": self.fallbacks.get(key, 0),
+                    **{f"p{p}_ms": round(percentile(values, p) * 1000, 1) for p in (50, 90, 99)},
+                    "max_ms": round(values[-1] * 1000, 1),
+                }
+            everything.sort()
+            requests = len(everything)
+            errors = sum(sum(by_type.values()) for by_type in self.errors.values())
+            return {
+                "seconds": round(elapsed, 2),
+                "requests": requests,
+                "requests_per_s": round(requests / elapsed, 2) if elapsed else 0.0,
+                "conversations": dict(self.conversations),
+                "conversations_per_s": round(self.conversations["completed"] / elapsed, 2) if elapsed else 0.0,
+                "error_rate": round(errors / requests, 4) if requests else 0.0,
+                "fallback_rate": round(sum(self.fallbacks.values()) / requests, 4) if requests else 0.0,
+                "errors_by_stage": {key: dict(value) for key, value in self.errors.items()},
+                **{f"p{p}_ms": round(percentile(everything, p) * 1000, 1) if everything else None
+                   for p in (50, 90, 99)},
+                "stages": stages,
+            }
+
+
+# ---- Server Memory ----
+def _children(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # pid (comm) state ppid ...; comm may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def tree_rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of `pid` and its descendants (uvicorn workers), from /proc (Linux)."""
+    total_kb = 0
+    pending = [pid]
+    found = False
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        found = True
+                        break
+        except OSError:
+            continue
+        pending.extend(_children(current))
+    return round(total_kb / 1024, 1) if found else None
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[float] = None
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            rss = tree_rss_mb(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+
+# ---- App Server ----
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(server: str, workers: int, port: int, llm_url: Optional[str], env_overrides: Dict[str, str],
+              log) -> subprocess.Popen:
+    """Start the app as a subprocess and wait for /readyz (which also warms it up)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env.setdefault("HEALTHMATE_CONFIG", "sqlite")
+    env.setdefault("SQLITE_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'healthmate-load.db')}")
+    if llm_url:
+        env["OPENAI_BASE_URL"] = llm_url
+        env.setdefault("OPENAI_API_KEY", "load-test")
+    if workers > 1:
+        # Turns of one conversation land on any worker: sessions and login
+        # cookies must be shared, or conversations silently restart
+        env.setdefault("SESSION_BACKEND", "sqlite")
+        env.setdefault("SESSION_SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="healthmate-load-"), "sessions.db"))
+        env.setdefault("SECRET_KEY", "load-test-secret-key")
+    env.update(env_overrides)
+    if server == "asgi":
+        command = [sys.executable, "-m", "uvicorn", "asgi:application", "--host", "127.0.0.1", "--port", str(port),
+                   "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    else:
+        if workers != 1:
+            raise SystemExit("--server flask runs a single threaded worker; use --server asgi for more")
+        command = [sys.executable, "-m", "flask", "--app", "app", "run", "--host", "127.0.0.1", "--port", str(port),
+                   "--with-threads", "--no-reload", "--no-debugger"]
+    process = subprocess.Popen(command, cwd=here, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"app exited with status {process.returncode}; see {log.name}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            conn.request("GET", "/readyz")
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status in (200, 503):  # 503: the database check, irrelevant to the chat routes
+                return process
+        except OSError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise SystemExit(f"app did not come up on port {port}; see {log.name}")
+
+
+def stop_app(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# ---- Runner ----
+def run_level(base_url: str, concurrency: int, duration: float, mix: List[str], symptom_sets: List[List[str]],
+              server_pid: Optional[int], seed: int, timeout: float) -> Dict[str, Any]:
+    """`concurrency` virtual users for `duration` seconds."""
+    results = Results()
+    stop = threading.Event()
+    rss_before = tree_rss_mb(server_pid) if server_pid else None
+    sampler = MemorySampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+    users = [VirtualUser(base_url, f"{concurrency}-{i}", mix, symptom_sets, stop, results, seed + i, timeout)
+             for i in range(concurrency)]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    time.sleep(duration)
+    stop.set()
+    for user in users:
+        user.join()  # each finishes its current conversation
+    elapsed = time.perf_counter() - started
+    if sampler:
+        sampler.stop.set()
+        sampler.join()
+    summary = {"concurrency": concurrency, **results.summary(elapsed)}
+    if server_pid:
+        rss_after = tree_rss_mb(server_pid)
+        summary["memory_mb"] = {
+            "before": rss_before, "peak": sampler.peak, "after": rss_after,
+            "growth": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+        }
+    return summary
+
+
+def print_level(workers: Optional[int], level: Dict[str, Any]):
+    memory = level.get("memory_mb") or {}
+    print(f"\nworkers={workers or '?'} concurrency={level['concurrency']}: "
+          f"{level['requests_per_s']} req/s, {level['conversations_per_s']} conv/s, "
+          f"p50/p90/p99 {level['p50_ms']}/{level['p90_ms']}/{level['p99_ms']} ms, "
+          f"errors {level['error_rate']:.2%}, fallbacks {level['fallback_rate']:.2%}"
+          + (f", rss {memory.get('before')} -> {memory.get('after')} MB (peak {memory.get('peak')})" if memory else ""))
+    for key, stage in level["stages"].items():
+        print(f"  {key:<28} n={stage['requests']:<6} p50 {stage['p50_ms']:>8} p90 {stage['p90_ms']:>8} "
+              f"p99 {stage['p99_ms']:>8} max {stage['max_ms']:>8} ms  err {stage['errors']} fb {stage['fallbacks']}")
+
+
+def sustained(levels: List[Dict[str, Any]], p99_budget_ms: float, max_error_rate: float) -> Optional[int]:
+    """Highest concurrency whose p99 and error rate stayed within budget."""
+    best = None
+    for level in levels:
+        if level["p99_ms"] is not None and level["p99_ms"] <= p99_budget_ms \
+                and level["error_rate"] + level["fallback_rate"] <= max_error_rate:
+            best = max(best or 0, level["concurrency"])
+    return best
+
+
+def _ints(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the HealthMate chat endpoints")
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8, 32], help="virtual users per level, e.g. 1,8,32,128")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    parser.add_argument("--mix", default="patient,doctor", help="conversation kinds to pick from (repeat to weight)")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--server-workers", type=_ints, default=[1], help="app worker processes per run (asgi)")
+    parser.add_argument("--url", default=None, help="test an already running app instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="with --url: process to sample memory from")
+    parser.add_argument("--llm-url", default=None,
+                        help="OpenAI-compatible base URL for a started app (default: an in-process mock; 'none': leave unset)")
+    parser.add_argument("--latency", default="lognormal:0.8,0.5", help="mock LLM latency distribution (mock_llm_server.latency_sampler)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="mock LLM seconds between streamed chunks")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="mock LLM failure rate")
+    parser.add_argument("--llm-cache", action="store_true", help="keep the app's LLM response cache on (off by default)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request")
+    parser.add_argument("--p99-budget-ms", type=float, default=5000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the full report here as JSON")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    symptom_sets = load_symptom_sets(os.getenv("KB_DIR", here))
+    mix = [kind.strip() for kind in args.mix.split(",") if kind.strip()]
+    unknown = set(mix) - set(SCRIPTS)
+    if unknown:
+        raise SystemExit(f"unknown conversation kinds: {', '.join(sorted(unknown))}")
+
+    mock = None
+    llm_url = None if args.llm_url == "none" else args.llm_url
+    if args.url is None and args.llm_url is None:
+        from mock_llm_server import serve
+        mock_port = free_port()
+        mock = serve(mock_port, fail_rate=args.fail_rate, latency=args.latency, token_delay=args.token_delay,
+                     seed=args.seed)
+        llm_url = f"http://127.0.0.1:{mock_port}/v1"
+        print(f"mock LLM on {llm_url} (latency {args.latency}, fail rate {args.fail_rate})", file=sys.stderr)
+
+    env_overrides = {} if args.llm_cache else {"LLM_CACHE_ENABLED": "0"}
+    runs = []
+    for workers in ([None] if args.url else args.server_workers):
+        process = None
+        log = None
+        if args.url:
+            base_url, server_pid = args.url.rstrip("/"), args.server_pid
+        else:
+            port = free_port()
+            log = tempfile.NamedTemporaryFile("w", prefix="healthmate-load-", suffix=".log", delete=False)
+            process = start_app(args.server, workers, port, llm_url, env_overrides, log)
+            base_url, server_pid = f"http://127.0.0.1:{port}", process.pid
+            print(f"{args.server} app with {workers} worker(s) on {base_url} (log: {log.name})", file=sys.stderr)
+        try:
+            levels = []
+            for concurrency in args.concurrency:
+                level = run_level(base_url, concurrency, args.duration, mix, symptom_sets, server_pid,
+                                  args.seed, args.timeout)
+                levels.append(level)
+                print_level(workers, level)
+        finally:
+            if process is not None:
+                stop_app(process)
+                log.close()
+        best = sustained(levels, args.p99_budget_ms, args.max_error_rate)
+        print(f"\nworkers={workers or '?'}: sustained up to {best if best is not None else 'none of the tested'} "
+              f"concurrent conversations (p99 <= {args.p99_budget_ms:.0f} ms, "
+              f"errors+fallbacks <= {args.max_error_rate:.0%})")
+        runs.append({"server": None if args.url else args.server, "workers": workers, "levels": levels,
+                     "sustained_concurrency": best})
+
+    report = {
+        "config": {key: value for key, value in vars(args).items()},
+        "mock_llm": dict(mock.RequestHandlerClass.stats) if mock else None,
+        "runs": runs,
+    }
+    if mock:
+        mock.shutdown()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from symptom_index import SymptomIndex
+from symptom_vectors import TfidfSymptomIndex
+
+DEFAULT_BACKEND = os.getenv("SYMPTOM_MATCHER", "fuzzy")
+DEFAULT_TOP_K = int(os.getenv("SYMPTOM_MATCHER_TOP_K", "5"))
+DEFAULT_MIN_SCORE = float(os.getenv("SYMPTOM_MATCHER_MIN_SCORE", "0.2"))
+# token_set_ratio (0-100) a fuzzy match needs when the caller gives no threshold
+DEFAULT_FUZZY_THRESHOLD = 60
+
+
+# ---- Matcher Backends ----
+class FuzzyMatcher:
+    """rapidfuzz token_set_ratio over the SymptomIndex (the original behaviour).
+
+    `threshold` is the minimum ratio (0-100); None means DEFAULT_FUZZY_THRESHOLD.
+    """
+    name = "fuzzy"
+
+    def __init__(self, index: SymptomIndex):
+        self.index = index
+
+    def match(self, user_input: str, threshold: Optional[int] = None) -> List[str]:
+        return self.index.match(user_input, DEFAULT_FUZZY_THRESHOLD if threshold is None else threshold)
+
+    def rank(self, user_input: str, top_k: int = DEFAULT_TOP_K,
+             threshold: Optional[int] = None) -> List[Tuple[str, float]]:
+        return self.index.rank(user_input, top_k, DEFAULT_FUZZY_THRESHOLD if threshold is None else threshold)
+
+
+class VectorMatcher:
+    """Cosine similarity over a character n-gram TF-IDF matrix.
+
+    `match` returns at most `top_k` conditions, best first, scoring at least
+    `min_score`, or `threshold` percent cosine similarity when one is given
+    (threshold=60 keeps scores >= 0.6).
+    """
+    name = "tfidf"
+
+    def __init__(self, index: TfidfSymptomIndex,
+                 top_k: int = DEFAULT_TOP_K, min_score: float = DEFAULT_MIN_SCORE):
+        self.index = index
+        self.top_k = top_k
+        self.min_score = min_score
+
+    def match(self, user_input: str, threshold: Optional[int] = None) -> List[str]:
+        return [c for c, _ in self.rank(user_input, threshold=threshold)]
+
+    def rank(self, user_input: str, top_k: Optional[int] = None,
+             threshold: Optional[int] = None) -> List[Tuple[str, float]]:
+        min_score = self.min_score if threshold is None else threshold / 100
+        return self.index.rank(user_input, top_k or self.top_k, min_score)
+
+
+def select_matcher(med_data: Dict[str, Any], backend: Optional[str] = None,
+                   symptom_index: Optional[SymptomIndex] = None):
+    """Build the matcher named by `backend` (or $SYMPTOM_MATCHER): "fuzzy" or "tfidf"."""
+    backend = (backend or DEFAULT_BACKEND).strip().lower()
+    if backend == FuzzyMatcher.name:
+        return FuzzyMatcher(symptom_index or SymptomIndex(med_data))
+    if backend == VectorMatcher.name:
+        return VectorMatcher(TfidfSymptomIndex(med_data))
+    raise ValueError(f"Unknown symptom matcher backend: {backend!r} (expected 'fuzzy' or 'tfidf')")
+
+
+# ---- Comparison Harness ----
+def compare_matchers(med_data: Dict[str, Any], queries: List[str],
+                     candidate: str = "tfidf", baseline: str = "fuzzy",
+                     threshold: Optional[int] = None) -> Dict[str, Any]:
+    """Report how well `candidate` recovers the conditions `baseline` matches.
+
+    Recall is micro-averaged over all (query, condition) pairs the baseline
+    returns; queries the baseline does not match are skipped for recall.
+    """
+    matchers = {name: select_matcher(med_data, name) for name in (baseline, candidate)}
+    results = {}
+    for name, matcher in matchers.items():
+        start = time.perf_counter()
+        results[name] = [set(matcher.match(q, threshold)) for q in queries]
+        elapsed = time.perf_counter() - start
+        results[name + "_ms"] = elapsed * 1000 / max(len(queries), 1)
+
+    expected = found = returned = 0
+    misses = []
+    for query, base, cand in zip(queries, results[baseline], results[candidate]):
+        expected += len(base)
+        found += len(base & cand)
+        returned += len(cand)
+        if base - cand:
+            misses.append({"query": query, "missing": sorted(base - cand)})
+
+    return {
+        "queries": len(queries),
+        "baseline": baseline,
+        "candidate": candidate,
+        "recall": found / expected if expected else 1.0,
+        "precision": found / returned if returned else 1.0,
+        "avg_conditions": {
+            baseline: sum(map(len, results[baseline])) / max(len(queries), 1),
+            candidate: sum(map(len, results[candidate])) / max(len(queries), 1),
+        },
+        "avg_latency_ms": {
+            baseline: results[baseline + "_ms"],
+            candidate: results[candidate + "_ms"],
+        },
+        "misses": misses,
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python matchers.py [queries.txt]  (one query per line; defaults to every
+    # symptom in new.json)
+    from knowledge_base import KB_DIR, KB_SOURCES
+    with open(os.path.join(KB_DIR, KB_SOURCES["med_data"]), "r", encoding="utf-8") as f:
+        med_data = json.load(f)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = [s for info in med_data.values() for s in info.get("symptoms", [])]
+    print(json.dumps(compare_matchers(med_data, queries), indent=2))
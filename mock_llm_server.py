@@ -0,0 +1,165 @@
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Optional
+
+# Local stand-in for the OpenAI chat completions API, for exercising the
+# LLM gateway (timeouts, retries, circuit breaker) without a real provider:
+#
+#   python mock_llm_server.py --port 8900 --delay 0.5 --fail-rate 0.2
+#   python mock_llm_server.py --latency lognormal:0.8,0.5 --token-delay 0.01
+#   OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=x python app.py
+#
+# --latency draws each response's delay from a distribution (see
+# latency_sampler); --token-delay spaces out streamed chunks.
+
+
+def latency_sampler(spec: str, seed: Optional[int] = None) -> Callable[[], float]:
+    """Seconds-per-response sampler from a spec string.
+
+    fixed:S, uniform:LO,HI, normal:MEAN,STDEV, lognormal:MEDIAN,SIGMA
+    (long right tail, like real providers), exponential:MEAN, or
+    pareto:MIN,ALPHA. Negative draws clamp to 0.
+    """
+    kind, _, raw = spec.partition(":")
+    params = [float(part) for part in raw.split(",") if part.strip()]
+    rng = random.Random(seed)
+    kind = kind.strip().lower()
+    expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1, "pareto": 2}
+    if kind not in expected or len(params) != expected[kind]:
+        raise ValueError(f"bad latency spec {spec!r}; expected one of fixed:S, uniform:LO,HI, normal:MEAN,STDEV, "
+                         "lognormal:MEDIAN,SIGMA, exponential:MEAN, pareto:MIN,ALPHA")
+    if kind == "fixed":
+        return lambda: params[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda: max(rng.gauss(params[0], params[1]), 0.0)
+    if kind == "lognormal":
+        mu = math.log(params[0]) if params[0] > 0 else 0.0
+        return lambda: rng.lognormvariate(mu, params[1])
+    if kind == "exponential":
+        return lambda: rng.expovariate(1.0 / params[0]) if params[0] > 0 else 0.0
+    return lambda: params[0] * rng.paretovariate(params[1])
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    latency: Optional[Callable[[], float]] = None  # overrides `delay` when set
+    token_delay = 0.0
+    fail_rate = 0.0
+    fail_status = 503
+    stats = {"requests": 0, "failed": 0}
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timeout test); nothing to report
+
+    def _send(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: str):
+        raw = data.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(raw), raw))
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self._lock:
+                return self._send(200, dict(self.stats))
+        self._send(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self._lock:
+            self.stats["requests"] += 1
+        if not self.path.endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": "not found"}})
+        time.sleep(self.latency() if self.latency is not None else self.delay)
+        if random.random() < self.fail_rate:
+            with self._lock:
+                self.stats["failed"] += 1
+            headers = {"Retry-After": "0.05"} if self.fail_status == 429 else None
+            return self._send(self.fail_status, {"error": {"message": "mock failure", "type": "server_error"}}, headers)
+
+        model = body.get("model", "mock")
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        text = f"[mock {model}] " + " ".join(prompt.split()[:40])
+        if not body.get("stream"):
+            return self._send(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split()),
+                          "total_tokens": len(prompt.split()) + len(text.split())},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in text.split(" "):
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+            if self.token_delay:
+                time.sleep(self.token_delay)
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    request_queue_size = 1024  # bursts of load-test connections
+    daemon_threads = True
+
+
+def serve(port: int = 8900, delay: float = 0.0, fail_rate: float = 0.0, fail_status: int = 503,
+          latency: Optional[str] = None, token_delay: float = 0.0, seed: Optional[int] = None) -> MockLLMServer:
+    """Start the mock server on a daemon thread and return it (call .shutdown() to stop).
+
+    `latency` is a latency_sampler spec; without it every response waits `delay`.
+    """
+    sampler = latency_sampler(latency, seed) if latency else None
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {
+        "delay": delay, "latency": staticmethod(sampler) if sampler else None, "token_delay": token_delay,
+        "fail_rate": fail_rate, "fail_status": fail_status,
+        "stats": {"requests": 0, "failed": 0}, "_lock": threading.Lock(),
+    })
+    server = MockLLMServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--fail-status", type=int, default=503, help="HTTP status for failures (e.g. 429, 500, 503)")
+    parser.add_argument("--latency", default=None,
+                        help="response delay distribution, e.g. lognormal:0.8,0.5 or uniform:0.2,1.5 (overrides --delay)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--seed", type=int, default=None, help="seed for --latency draws")
+    args = parser.parse_args()
+    server = serve(args.port, args.delay, args.fail_rate, args.fail_status, args.latency, args.token_delay, args.seed)
+    print(f"Mock LLM listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
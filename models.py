@@ -1,12 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from datetime import datetime
 
 db = SQLAlchemy()
 
 class Patient(UserMixin, db.Model):
     __tablename__ = 'patients'
-    id = db.Column(db.BigInteger, primary_key=True)
+    # BIGINT in MySQL (schema.sql); SQLite only autoincrements INTEGER keys
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
     full_name = db.Column(db.String(255), nullable=False)
     email = db.Column(db.String(255), nullable=False, unique=True)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -22,8 +22,8 @@ class Patient(UserMixin, db.Model):
     chronic_diseases = db.Column(db.Text)
     injuries = db.Column(db.Text)
     surgeries = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # created_at / updated_at are left to the database (schema.sql defaults):
+    # tables made by db.create_all() have never had them
 
     def to_dict(self):
         return {
@@ -0,0 +1,250 @@
+import os
+import io
+import re
+import csv
+import sys
+import json
+import argparse
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+from email_validator import validate_email, EmailNotValidError
+from werkzeug.security import generate_password_hash
+from sqlalchemy.exc import IntegrityError, DBAPIError
+
+# Bulk patient import from CSV (header row) or NDJSON, one patient per row:
+#
+#   python patient_import.py clinic.csv --errors clinic.errors.ndjson
+#   curl -X POST -H "X-Import-Token: $PATIENT_IMPORT_TOKEN" \
+#        -F file=@clinic.ndjson http://localhost:5000/patients/import
+#
+# Columns are the /register fields. Each row needs `password` (hashed here)
+# or `password_hash` (an existing werkzeug hash, for migrated accounts).
+# Rows are validated, de-duplicated and inserted a chunk at a time; bad rows
+# are reported individually and never stop the run.
+
+IMPORT_CHUNK_SIZE = int(os.getenv("PATIENT_IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_HASH_WORKERS = int(os.getenv("PATIENT_IMPORT_HASH_WORKERS", "8"))
+
+IMPORT_FIELDS = (
+    "full_name", "email", "password_hash", "contact_number", "gender", "date_of_birth",
+    "blood_group", "marital_status", "emergency_contact", "allergies", "current_medications",
+    "past_medications", "chronic_diseases", "injuries", "surgeries",
+)
+GENDERS = {"male": "Male", "female": "Female", "other": "Other"}  # the ENUM in schema.sql
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# (line number, parsed row or None, parse error or None)
+RawRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+ErrorHandler = Callable[[int, Optional[str], str], None]
+# How a rejected row is counted in the summary
+DUPLICATE = "duplicates"
+INVALID = "invalid"
+# report(line, email, message, status)
+Reporter = Callable[[int, Optional[str], str, str], None]
+
+
+# ---- Readers ----
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    name = (filename or "").lower()
+    if name.endswith(".csv") or "csv" in (content_type or ""):
+        return "csv"
+    return "ndjson"
+
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[RawRow]:
+    """Rows from a text stream, read lazily."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_no, raw in enumerate(stream, 1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "expected a JSON object"
+            continue
+        yield line_no, row, None
+
+
+def chunked(rows: Iterable[RawRow], size: int) -> Iterator[List[RawRow]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---- Validation ----
+def _clean(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate_row(row: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """The insert values for one row (password not yet hashed), or an error message."""
+    values = {field: _clean(row.get(field)) for field in IMPORT_FIELDS}
+    password = _clean(row.get("password"))
+
+    if not values["full_name"] or not values["email"] or not (password or values["password_hash"]):
+        return None, "full_name, email and password (or password_hash) are required"
+    # One spelling per address, for validation, the duplicate checks and the insert
+    values["email"] = values["email"].lower()
+    try:
+        # No DNS lookups: deliverability checks would dominate a bulk run
+        validate_email(values["email"], check_deliverability=False)
+    except EmailNotValidError as e:
+        return None, f"Invalid email: {e}"
+
+    dob = values["date_of_birth"]
+    if dob:
+        try:
+            if not _DATE_RE.match(dob):
+                raise ValueError
+            values["date_of_birth"] = date.fromisoformat(dob)
+        except ValueError:
+            return None, "Invalid date format, use YYYY-MM-DD"
+
+    if values["gender"]:
+        gender = GENDERS.get(values["gender"].lower())
+        if gender is None:
+            return None, "gender must be Male, Female or Other"
+        values["gender"] = gender
+
+    if not values["password_hash"]:
+        values["password"] = password
+    return values, None
+
+
+# ---- Import ----
+def _existing_emails(session, table, emails: List[str]) -> set:
+    """Emails of this chunk (lowercase) already in the table: one IN query.
+
+    The comparison is the column's own: case-insensitive under MySQL's
+    default collation, so older mixed-case rows still count as taken.
+    """
+    if not emails:
+        return set()
+    found = session.execute(table.select().with_only_columns(table.c.email).where(table.c.email.in_(emails)))
+    return {email.lower() for (email,) in found}
+
+
+def _insert_rows(session, table, rows: List[Tuple[int, Dict[str, Any]]], report: Reporter) -> int:
+    """One executemany for the chunk, then commit.
+
+    If the batch is rejected (e.g. a concurrent /register took one of the
+    emails), the chunk is retried row by row so only the offending rows fail.
+    """
+    if not rows:
+        return 0
+    try:
+        session.execute(table.insert(), [values for _, values in rows])
+        session.commit()
+        return len(rows)
+    except (IntegrityError, DBAPIError):
+        session.rollback()
+
+    inserted = 0
+    for line_no, values in rows:
+        try:
+            session.execute(table.insert(), [values])
+            session.commit()
+            inserted += 1
+        except IntegrityError:
+            session.rollback()
+            report(line_no, values["email"], "Email already registered", DUPLICATE)
+        except DBAPIError as e:
+            session.rollback()
+            report(line_no, values["email"], f"Database rejected row: {e.orig}", INVALID)
+    return inserted
+
+
+def import_patients(rows: Iterable[RawRow], session, table, chunk_size: int = IMPORT_CHUNK_SIZE,
+                    on_error: Optional[ErrorHandler] = None) -> Dict[str, int]:
+    """Validate, de-duplicate and insert `rows` into the patients `table`.
+
+    Each chunk costs one duplicate lookup, one batched insert and one
+    commit, so a failure only rolls back the chunk in progress. Returns
+    the counts; per-row problems go to `on_error(line, email, message)`.
+    """
+    counts = {"rows": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    seen_emails = set()  # duplicates within the file itself
+
+    def report(line_no: int, email: Optional[str], message: str, status: str):
+        counts[status] += 1
+        if on_error is not None:
+            on_error(line_no, email, message)
+
+    with ThreadPoolExecutor(IMPORT_HASH_WORKERS) as hash_pool:
+        for chunk in chunked(rows, chunk_size):
+            valid: List[Tuple[int, Dict[str, Any]]] = []
+            for line_no, row, error in chunk:
+                counts["rows"] += 1
+                values = None
+                if error is None:
+                    values, error = validate_row(row)
+                if error is not None:
+                    report(line_no, _clean((row or {}).get("email")), error, INVALID)
+                    continue
+                if values["email"] in seen_emails:
+                    report(line_no, values["email"], "Email already registered", DUPLICATE)
+                    continue
+                seen_emails.add(values["email"])
+                valid.append((line_no, values))
+
+            existing = _existing_emails(session, table, [values["email"] for _, values in valid])
+            new_rows = []
+            for line_no, values in valid:
+                if values["email"] in existing:
+                    report(line_no, values["email"], "Email already registered", DUPLICATE)
+                else:
+                    new_rows.append((line_no, values))
+
+            # Password hashing is deliberately slow; hashlib releases the GIL,
+            # so a thread pool spreads it across cores
+            to_hash = [values for _, values in new_rows if "password" in values]
+            for values, hashed in zip(to_hash, hash_pool.map(generate_password_hash, [v.pop("password") for v in to_hash])):
+                values["password_hash"] = hashed
+
+            counts["inserted"] += _insert_rows(session, table, new_rows, report)
+    return counts
+
+
+def open_text(binary: IO[bytes]) -> IO[str]:
+    """A text view of an uploaded file or request body (BOM-tolerant)."""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import patients from CSV or NDJSON")
+    parser.add_argument("input", help="patients file (.csv with a header row, or NDJSON)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None, help="default: from the extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--errors", default=None, help="write per-row errors here as NDJSON (default: stderr)")
+    args = parser.parse_args()
+
+    from app import app, db, Patient
+    app.extensions["healthmate"].bootstrap_database()
+
+    errors_out = open(args.errors, "w", encoding="utf-8") if args.errors else sys.stderr
+
+    def on_error(line_no: int, email: Optional[str], message: str):
+        errors_out.write(json.dumps({"line": line_no, "email": email, "error": message}) + "\n")
+
+    fmt = args.format or detect_format(args.input)
+    with app.app_context(), open(args.input, "r", encoding="utf-8-sig", newline="") as f:
+        summary = import_patients(read_rows(f, fmt), db.session, Patient.__table__, args.chunk_size, on_error)
+    if args.errors:
+        errors_out.close()
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,141 @@
+import os
+import time
+import sqlite3
+import threading
+import itertools
+from typing import Optional
+
+DEFAULT_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+DEFAULT_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://127.0.0.1:6379/0")
+
+
+# ---- Session Backends ----
+# A backend is a small key -> bytes store with a per-key TTL:
+#   get(key) -> Optional[bytes], set(key, value, ttl), delete(key)
+#   replace(key, expected, value, ttl) -> bool: set only if the live value
+#     is still `expected` (None: absent or expired), atomically
+# Each chat message costs one get and one set (or delete) of a few hundred bytes.
+
+class SQLiteSessionBackend:
+    """Session blobs in a local SQLite file, shared by every worker on the host.
+
+    Uses WAL mode so readers never block the single writer, and one
+    connection per thread. Expired rows are ignored on read and purged
+    every `purge_every` writes.
+    """
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, purge_every: int = 1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        # next() on a count is atomic, unlike `+= 1` from several request threads
+        self._writes = itertools.count(1)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM sessions WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(value), time.time() + ttl),
+        )
+        self._wrote()
+
+    def _wrote(self):
+        if next(self._writes) % self.purge_every == 0:
+            self.purge()
+
+    def replace(self, key: str, expected: Optional[bytes], value: bytes, ttl: float) -> bool:
+        now = time.time()
+        if expected is None:
+            # Insert, or take over a row that has expired
+            cur = self._conn().execute(
+                "INSERT INTO sessions (key, value, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+                " WHERE sessions.expires_at <= ?",
+                (key, sqlite3.Binary(value), now + ttl, now),
+            )
+        else:
+            cur = self._conn().execute(
+                "UPDATE sessions SET value = ?, expires_at = ? WHERE key = ? AND value = ? AND expires_at > ?",
+                (sqlite3.Binary(value), now + ttl, key, sqlite3.Binary(expected), now),
+            )
+        if cur.rowcount != 1:
+            return False
+        self._wrote()
+        return True
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def purge(self) -> int:
+        """Delete expired rows; returns how many were removed."""
+        cur = self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        return cur.rowcount
+
+
+class RedisSessionBackend:
+    """Session blobs in Redis (or anything speaking its protocol), shared across nodes.
+
+    Expiry is delegated to Redis via SET ... EX; `replace` is a WATCH /
+    MULTI check-and-set. Accepts an existing client so tests can pass a
+    fake with the same get/set/delete/pipeline methods.
+    """
+
+    def __init__(self, client=None, url: str = DEFAULT_REDIS_URL):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("SESSION_BACKEND=redis needs the 'redis' package (pip install redis)") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        try:
+            from redis.exceptions import WatchError
+        except ImportError:  # a fake client without the redis package
+            WatchError = RuntimeError
+        self._watch_error = WatchError
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, ex=max(int(ttl), 1))
+
+    def replace(self, key: str, expected: Optional[bytes], value: bytes, ttl: float) -> bool:
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != expected:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.set(key, value, ex=max(int(ttl), 1))
+                pipe.execute()
+                return True
+            except self._watch_error:
+                # Written by someone else between WATCH and EXEC
+                return False
+
+    def delete(self, key: str):
+        self.client.delete(key)
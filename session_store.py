@@ -0,0 +1,289 @@
+import os
+import time
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+DEFAULT_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+DEFAULT_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+DEFAULT_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+# Seconds a turn waits for an earlier turn of the same session in this process
+DEFAULT_LOCK_TIMEOUT = float(os.getenv("SESSION_LOCK_TIMEOUT", "30"))
+
+
+# ---- Per-Session Locking ----
+class SessionConflict(Exception):
+    """Another turn of the same session is running, or saved first: retry the message."""
+
+    def __init__(self, session_id: str):
+        super().__init__("Another message for this session is still being processed. Please retry.")
+        self.session_id = session_id
+
+
+class SessionLocks:
+    """Striped in-process locks, so turns of one session run one at a time per worker.
+
+    Held from loading the session to saving it:
+
+        with store.lock(session_id):
+            manager = store.get_or_create(session_id)
+            ...
+            store.save(session_id, manager)
+
+    Sessions sharing a stripe also wait on each other, which only costs
+    latency. Waiting longer than `timeout` raises SessionConflict.
+    """
+
+    def __init__(self, stripes: int = 256, timeout: float = DEFAULT_LOCK_TIMEOUT):
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self.timeout = timeout
+
+    @contextmanager
+    def __call__(self, session_id: str) -> Iterator[None]:
+        lock = self._stripes[hash(session_id) % len(self._stripes)]
+        if not lock.acquire(timeout=self.timeout):
+            raise SessionConflict(session_id)
+        try:
+            yield
+        finally:
+            lock.release()
+
+
+# ---- Session Store ----
+class SessionStore:
+    """In-process conversation store with an LRU size cap and idle TTL.
+
+    Entries are kept in least-recently-used order, so the oldest idle
+    sessions are always at the front: capacity evictions pop from the
+    front, and a sweep stops at the first session that is still fresh.
+    Sweeps run amortized (at most every `sweep_interval` seconds, on the
+    next access) or from an optional background thread.
+    """
+
+    def __init__(self, factory: Callable[[], Any],
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 idle_ttl: float = DEFAULT_IDLE_TTL,
+                 sweep_interval: float = DEFAULT_SWEEP_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.factory = factory
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._entries: "OrderedDict[str, list]" = OrderedDict()  # session_id -> [value, last_seen]
+        self._lock = threading.RLock()
+        self._last_sweep = clock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.lock = SessionLocks()
+        self.metrics: Dict[str, int] = {
+            "hits": 0, "misses": 0, "created": 0,
+            "evicted_capacity": 0, "expired": 0, "removed": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id, touch=False) is not None
+
+    def _expired(self, last_seen: float, now: float) -> bool:
+        return self.idle_ttl > 0 and now - last_seen > self.idle_ttl
+
+    def _maybe_sweep(self, now: float):
+        if now - self._last_sweep >= self.sweep_interval:
+            self._sweep(now)
+
+    def _sweep(self, now: float) -> int:
+        removed = 0
+        while self._entries:
+            session_id, (_, last_seen) = next(iter(self._entries.items()))
+            if not self._expired(last_seen, now):
+                break
+            del self._entries[session_id]
+            removed += 1
+        self.metrics["expired"] += removed
+        self._last_sweep = now
+        return removed
+
+    def get(self, session_id: str, touch: bool = True) -> Optional[Any]:
+        """Return the live session or None; `touch` refreshes its idle timer."""
+        with self._lock:
+            now = self.clock()
+            self._maybe_sweep(now)
+            entry = self._entries.get(session_id)
+            if entry is not None and self._expired(entry[1], now):
+                del self._entries[session_id]
+                self.metrics["expired"] += 1
+                entry = None
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            self.metrics["hits"] += 1
+            if touch:
+                entry[1] = now
+                self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def put(self, session_id: str, value: Any):
+        with self._lock:
+            now = self.clock()
+            self._entries[session_id] = [value, now]
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries > 0:
+                self._entries.popitem(last=False)
+                self.metrics["evicted_capacity"] += 1
+
+    def get_or_create(self, session_id: str) -> Any:
+        with self._lock:
+            value = self.get(session_id)
+            if value is None:
+                value = self.factory()
+                self.put(session_id, value)
+                self.metrics["created"] += 1
+            return value
+
+    def save(self, session_id: str, value: Any):
+        """Record the session after a turn. In-process values are already live, so this only touches."""
+        with self._lock:
+            if session_id in self._entries:
+                self._entries[session_id][1] = self.clock()
+                self._entries.move_to_end(session_id)
+            else:
+                self.put(session_id, value)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            if self._entries.pop(session_id, None) is not None:
+                self.metrics["removed"] += 1
+
+    def sweep(self) -> int:
+        """Drop every session idle longer than `idle_ttl`; returns how many were dropped."""
+        with self._lock:
+            return self._sweep(self.clock())
+
+    def start_sweeper(self, interval: Optional[float] = None) -> threading.Thread:
+        """Sweep from a daemon thread instead of waiting for the next access."""
+        if self._sweeper is None or not self._sweeper.is_alive():
+            self._stop.clear()
+            wait = interval or self.sweep_interval
+
+            def run():
+                while not self._stop.wait(wait):
+                    self.sweep()
+
+            self._sweeper = threading.Thread(target=run, name="session-sweeper", daemon=True)
+            self._sweeper.start()
+        return self._sweeper
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "idle_ttl": self.idle_ttl,
+                **self.metrics,
+            }
+
+
+class PersistentSessionStore:
+    """Conversation store backed by an out-of-process key/value backend.
+
+    Same interface as SessionStore, but nothing is kept in the worker: each
+    request reads the conversation state, rebuilds the manager with
+    `manager_cls.loads`, and `save` writes `manager.dumps()` back. Any
+    worker (or node) can therefore continue any conversation. Idle expiry
+    is the backend TTL, refreshed on every save.
+
+    `lock` only serializes turns within this process. Across processes,
+    `save` is a compare-and-set against the state this manager was loaded
+    from: if another worker saved the session in between, it raises
+    SessionConflict instead of overwriting that turn.
+    """
+
+    def __init__(self, manager_cls, backend, namespace: str,
+                 idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.manager_cls = manager_cls
+        self.backend = backend
+        self.namespace = namespace
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self.lock = SessionLocks()
+        # manager -> the blob it was loaded from (None: new session)
+        self._loaded_from: "weakref.WeakKeyDictionary[Any, Optional[bytes]]" = weakref.WeakKeyDictionary()
+        self.metrics: Dict[str, int] = {
+            "hits": 0, "misses": 0, "created": 0, "removed": 0,
+            "reads": 0, "writes": 0, "bytes_written": 0, "conflicts": 0,
+        }
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.namespace}:{session_id}"
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self.metrics[name] += delta
+
+    def get(self, session_id: str, touch: bool = True) -> Optional[Any]:
+        blob = self.backend.get(self._key(session_id))
+        if blob is None:
+            self._count(reads=1, misses=1)
+            return None
+        self._count(reads=1, hits=1)
+        manager = self.manager_cls.loads(blob)
+        self._loaded_from[manager] = blob
+        return manager
+
+    def get_or_create(self, session_id: str) -> Any:
+        manager = self.get(session_id)
+        if manager is None:
+            manager = self.manager_cls()
+            self._loaded_from[manager] = None
+            self._count(created=1)
+        return manager
+
+    def save(self, session_id: str, manager: Any):
+        """Write the manager back; SessionConflict if the session changed since it was loaded."""
+        blob = manager.dumps()
+        expected = self._loaded_from.get(manager)
+        if not self.backend.replace(self._key(session_id), expected, blob, self.idle_ttl):
+            self._count(conflicts=1)
+            raise SessionConflict(session_id)
+        self._loaded_from[manager] = blob
+        self._count(writes=1, bytes_written=len(blob))
+
+    def discard(self, session_id: str):
+        self.backend.delete(self._key(session_id))
+        self._count(removed=1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "idle_ttl": self.idle_ttl,
+                **self.metrics,
+            }
+
+
+def build_session_store(manager_cls, namespace: str, backend: Optional[str] = None):
+    """Session store for `manager_cls` chosen by `backend` (or $SESSION_BACKEND).
+
+    "memory" keeps managers in this process (single worker only); "sqlite"
+    and "redis" keep serialized state out of process so several workers can
+    share conversations.
+    """
+    backend = (backend or DEFAULT_BACKEND).strip().lower()
+    if backend == "memory":
+        return SessionStore(manager_cls)
+    from session_backends import SQLiteSessionBackend, RedisSessionBackend
+    if backend == "sqlite":
+        return PersistentSessionStore(manager_cls, SQLiteSessionBackend(), namespace)
+    if backend == "redis":
+        return PersistentSessionStore(manager_cls, RedisSessionBackend(), namespace)
+    raise ValueError(f"Unknown session backend: {backend!r} (expected 'memory', 'sqlite' or 'redis')")
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+# ---- Single-flight Coalescing ----
+class _Call:
+    __slots__ = ("done", "result", "error", "abandoned")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one.
+
+    The first caller for a key (the leader) does the work; callers that
+    arrive while it is in flight wait for the leader's result or exception
+    instead of issuing their own. Nothing is remembered once the call
+    finishes; that is the response cache's job. If a leader gives up
+    without an outcome (e.g. a streaming client disconnected), its
+    followers run the call themselves.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, int] = {"leaders": 0, "coalesced": 0}
+
+    def acquire(self, key: str) -> Tuple[_Call, bool]:
+        """The in-flight call for `key` and whether the caller is its leader."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.metrics["coalesced"] += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.metrics["leaders"] += 1
+            return call, True
+
+    def resolve(self, key: str, call: _Call, result: Any = None,
+                error: Optional[BaseException] = None, abandoned: bool = False):
+        """Publish the leader's outcome and wake its followers."""
+        call.result, call.error, call.abandoned = result, error, abandoned
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    @staticmethod
+    def wait(call: _Call, timeout: Optional[float] = None) -> Any:
+        """The leader's result (re-raising its exception); None if it was abandoned."""
+        if not call.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for an in-flight LLM call")
+        if call.error is not None:
+            raise call.error
+        return None if call.abandoned else call.result
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        call, leader = self.acquire(key)
+        if not leader:
+            result = self.wait(call)
+            return fn() if call.abandoned else result
+        try:
+            result = fn()
+        except Exception as e:
+            self.resolve(key, call, error=e)
+            raise
+        except BaseException:
+            self.resolve(key, call, abandoned=True)
+            raise
+        self.resolve(key, call, result=result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._calls), **self.metrics}
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop (the ASGI path).
+
+    Same contract as SingleFlight. A cancelled leader counts as abandoned,
+    so its followers run the call themselves.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.metrics: Dict[str, int] = {"leaders": 0, "coalesced": 0}
+
+    def acquire(self, key: str) -> Tuple[asyncio.Future, bool]:
+        future = self._calls.get(key)
+        if future is not None:
+            self.metrics["coalesced"] += 1
+            return future, False
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self.metrics["leaders"] += 1
+        return future, True
+
+    def resolve(self, key: str, future: asyncio.Future, result: Any = None,
+                error: Optional[BaseException] = None, abandoned: bool = False):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.done():
+            # The outcome is a plain result, so a call without followers
+            # never leaves an unretrieved exception on the future
+            future.set_result((result, error, abandoned))
+
+    @staticmethod
+    async def wait(future: asyncio.Future) -> Any:
+        """The leader's result (re-raising its exception); None if it was abandoned."""
+        result, error, abandoned = await asyncio.shield(future)
+        if error is not None:
+            raise error
+        return None if abandoned else result
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future, leader = self.acquire(key)
+        if not leader:
+            result = await self.wait(future)
+            return await fn() if future.result()[2] else result
+        try:
+            result = await fn()
+        except Exception as e:
+            self.resolve(key, future, error=e)
+            raise
+        except BaseException:
+            self.resolve(key, future, abandoned=True)
+            raise
+        self.resolve(key, future, result=result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._calls), **self.metrics}
@@ -0,0 +1,201 @@
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Generator, Iterator, Optional, Tuple, Union
+
+
+# ---- Pending Replies ----
+class PendingReply:
+    """A conversation turn whose reply still has to come from the LLM.
+
+    The managers' `_handle` updates the conversation state and returns
+    either a finished reply dict or one of these. `complete` produces the
+    LLM result in one blocking call; `stream` is a generator yielding text
+    deltas whose return value is that same result. `finish` turns the
+    result into the reply dict.
+
+    `acomplete` and `astream` are the async counterparts used by the ASGI
+    path. `astream` is an async generator, so it yields its result last,
+    wrapped in a StreamResult.
+    """
+    __slots__ = ("complete", "stream", "finish", "acomplete", "astream")
+
+    def __init__(self, complete: Callable[[], Any],
+                 stream: Callable[[], Generator[str, None, Any]],
+                 finish: Callable[[Any], Dict[str, Any]],
+                 acomplete: Optional[Callable[[], Awaitable[Any]]] = None,
+                 astream: Optional[Callable[[], AsyncIterator[Any]]] = None):
+        self.complete = complete
+        self.stream = stream
+        self.finish = finish
+        self.acomplete = acomplete
+        self.astream = astream
+
+
+class StreamResult:
+    """Final item of a PendingReply.astream: the value `finish` is called with."""
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class StreamInterrupted:
+    """Yielded by a reply stream whose LLM call failed after text was already sent.
+
+    Sent deltas can't be taken back, so rather than appending a fallback the
+    stream stops there and the reply keeps the partial text; clients get an
+    "interrupted" event before "done".
+    """
+    __slots__ = ("error",)
+
+    def __init__(self, error: str = "The reply was cut off because the AI service failed mid-response."):
+        self.error = error
+
+
+Reply = Union[Dict[str, Any], PendingReply]
+
+
+def with_fields(reply: Reply, **fields: Any) -> Reply:
+    """`reply` with `fields` added to its finished dict."""
+    if isinstance(reply, PendingReply):
+        finish = reply.finish
+        reply.finish = lambda result: {**finish(result), **fields}
+        return reply
+    return {**reply, **fields}
+
+logger = logging.getLogger(__name__)
+
+
+# ---- Fallbacks ----
+def stream_with_fallback(deltas: Generator[str, None, str], fallback: Callable[[], str],
+                         errors: Tuple[type, ...] = (Exception,)) -> Generator[Any, None, str]:
+    """Yield from `deltas` and return its text; on one of `errors`, fall back.
+
+    Before any delta went out, the fallback text is sent (and returned) in
+    its place. After that, a StreamInterrupted ends the stream and the
+    partial text is returned.
+    """
+    parts = []
+    try:
+        while True:
+            try:
+                delta = next(deltas)
+            except StopIteration as stop:
+                return stop.value
+            except errors as e:
+                logger.warning("LLM stream failed after %d deltas: %r", len(parts), e)
+                if parts:
+                    yield StreamInterrupted()
+                    return "".join(parts).strip()
+                text = fallback()
+                yield text
+                return text
+            parts.append(delta)
+            yield delta
+    finally:
+        deltas.close()
+
+
+async def astream_with_fallback(deltas: AsyncIterator[str], fallback: Callable[[], str],
+                                errors: Tuple[type, ...] = (Exception,)) -> AsyncIterator[Any]:
+    """`stream_with_fallback` for async deltas; the text comes last as a StreamResult."""
+    parts = []
+    try:
+        while True:
+            try:
+                delta = await deltas.__anext__()
+            except StopAsyncIteration:
+                break
+            except errors as e:
+                logger.warning("LLM stream failed after %d deltas: %r", len(parts), e)
+                if parts:
+                    yield StreamInterrupted()
+                    break
+                parts = [fallback()]
+                yield parts[0]
+                break
+            parts.append(delta)
+            yield delta
+    finally:
+        await deltas.aclose()
+    yield StreamResult("".join(parts).strip())
+
+
+def resolve_reply(reply: Reply) -> Dict[str, Any]:
+    """The finished reply dict, waiting for the LLM if needed."""
+    if isinstance(reply, PendingReply):
+        return reply.finish(reply.complete())
+    return reply
+
+
+def _delta_event(item: Any) -> Tuple[str, Any]:
+    if isinstance(item, StreamInterrupted):
+        return "interrupted", {"error": item.error}
+    return "delta", item
+
+
+def iter_reply(reply: Reply) -> Iterator[Tuple[str, Any]]:
+    """("delta", text) events as the LLM produces them, then ("done", reply dict).
+
+    A stream cut short by a failing LLM call sends ("interrupted", {"error": ...})
+    before "done", whose reply then holds the partial text.
+    """
+    if isinstance(reply, PendingReply):
+        deltas = reply.stream()
+        while True:
+            try:
+                delta = next(deltas)
+            except StopIteration as stop:
+                result = stop.value
+                break
+            yield _delta_event(delta)
+        reply = reply.finish(result)
+    yield "done", reply
+
+
+async def aresolve_reply(reply: Reply) -> Dict[str, Any]:
+    """`resolve_reply` without blocking the event loop."""
+    if isinstance(reply, PendingReply):
+        return reply.finish(await reply.acomplete())
+    return reply
+
+
+async def aiter_reply(reply: Reply) -> AsyncIterator[Tuple[str, Any]]:
+    """`iter_reply` driven by the async LLM client."""
+    if isinstance(reply, PendingReply):
+        result = None
+        async for item in reply.astream():
+            if isinstance(item, StreamResult):
+                result = item.value
+            else:
+                yield _delta_event(item)
+        reply = reply.finish(result)
+    yield "done", reply
+
+
+# ---- Server-Sent Events ----
+def sse_event(event: str, data: Any) -> str:
+    """One `text/event-stream` frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_stream(events: Iterator[Tuple[str, Any]]) -> Iterator[str]:
+    """Format reply events for SSE; deltas are sent as {"text": ...}.
+
+    An exception after the stream has started can no longer become an HTTP
+    error status, so it is sent as a final "error" event instead.
+    """
+    try:
+        for event, payload in events:
+            yield sse_event(event, {"text": payload} if event == "delta" else payload)
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+
+
+async def asse_stream(events: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+    """`sse_stream` for async event sources."""
+    try:
+        async for event, payload in events:
+            yield sse_event(event, {"text": payload} if event == "delta" else payload)
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
@@ -0,0 +1,175 @@
+import sys
+from collections import Counter
+from typing import Any, Dict, List, Sequence, Tuple, Union
+import numpy as np
+from rapidfuzz import fuzz, process
+
+
+def normalize(text: str) -> str:
+    return (text or "").strip().lower()
+
+def token_key(text: str) -> str:
+    """Canonical token-set form of a string.
+
+    `fuzz.token_set_ratio` only looks at the set of whitespace tokens, so
+    "runny nose" and "nose runny" score identically against any query and
+    can share a single key.
+    """
+    return " ".join(sorted(set(normalize(text).split())))
+
+
+# ---- Symptom Index ----
+class SymptomIndex:
+    """Lookup table from symptom / condition text to conditions.
+
+    Built once when the knowledge base is loaded: every condition name and
+    symptom is normalized and tokenized up front, and each key keeps a
+    reverse map to every condition that lists it. Matching a message only
+    has to normalize the message itself.
+    """
+
+    def __init__(self, med_data: Dict[str, Any]):
+        key_conditions: Dict[str, List[str]] = {}
+        for condition, info in med_data.items():
+            condition = sys.intern(condition)
+            for text in [condition, *info.get("symptoms", [])]:
+                key = token_key(text)
+                if not key:
+                    continue
+                conditions = key_conditions.setdefault(key, [])
+                if condition not in conditions:
+                    conditions.append(condition)
+
+        self.conditions: Tuple[str, ...] = tuple(sys.intern(c) for c in med_data)
+        self.condition_position: Dict[str, int] = {c: i for i, c in enumerate(self.conditions)}
+        # Keys are ordered by length so a length window is a contiguous id range
+        self.keys: List[str] = sorted(key_conditions, key=len)
+        self.key_tokens: List[Tuple[str, ...]] = [tuple(k.split()) for k in self.keys]
+        self.key_conditions: List[Tuple[str, ...]] = [tuple(key_conditions[k]) for k in self.keys]
+        self.key_lengths = np.array([len(k) for k in self.keys], dtype=np.int32)
+
+        # Inverted index: token -> ids of keys containing it
+        token_ids: Dict[str, List[int]] = {}
+        for i, tokens in enumerate(self.key_tokens):
+            for token in tokens:
+                token_ids.setdefault(token, []).append(i)
+        self.token_postings: Dict[str, np.ndarray] = {
+            t: np.array(ids, dtype=np.int32) for t, ids in token_ids.items()
+        }
+        # Inverted index: character -> (ids of keys containing it, occurrences in each key)
+        char_ids: Dict[str, Tuple[List[int], List[int]]] = {}
+        for i, key in enumerate(self.keys):
+            for char, count in Counter(key).items():
+                ids, counts = char_ids.setdefault(char, ([], []))
+                ids.append(i)
+                counts.append(count)
+        self.char_postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            c: (np.array(ids, dtype=np.int32), np.array(counts, dtype=np.int32))
+            for c, (ids, counts) in char_ids.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def conditions_for(self, key_ids) -> List[str]:
+        """Resolve matched key positions to condition names, in knowledge-base order."""
+        found = set()
+        for i in key_ids:
+            found.update(self.key_conditions[i])
+        return sorted(found, key=self.condition_position.__getitem__)
+
+    def candidates(self, query_key: str, threshold: float = 60) -> np.ndarray:
+        """Ids of keys that can score at least `threshold` against `query_key`.
+
+        `query_key` must already be in `token_key` form. Keys sharing a token
+        with the query are always kept. For the rest, `token_set_ratio` reduces
+        to a plain Indel ratio between the two canonical strings, which needs an
+        LCS of at least s * (la + lb) with s = threshold / 200. The LCS is
+        bounded by the characters the strings have in common, so keys outside
+        the length window or without enough shared characters are dropped.
+        No key that the brute-force scan would accept is ever dropped.
+
+        Character bigram counts would be more selective per gram, but the
+        q-gram lemma only guarantees max(la, lb) - 1 - 2d shared bigrams for
+        an Indel distance d <= (1 - 2s)(la + lb), which is vacuous below a
+        threshold of about 75; single characters stay exact at the default 60.
+        The filter is coarse: on the 1000x benchmark catalog it keeps ~12% of
+        keys (755 of 6,345), and a lookup takes ~1.4 ms against ~8.6 ms for
+        the full scan (`python benchmark.py run --only symptom_index`).
+        """
+        s = threshold / 200
+        lb = len(query_key)
+        lo, hi = 0, len(self.keys)
+        if s > 0:
+            lo = int(np.searchsorted(self.key_lengths, s / (1 - s) * lb - 1e-6, "left"))
+            hi = int(np.searchsorted(self.key_lengths, (1 - s) / s * lb + 1e-6, "right"))
+
+        keep = np.zeros(len(self.keys), dtype=bool)
+        if lo < hi:
+            overlap = np.zeros(hi - lo, dtype=np.int32)
+            for char, count in Counter(query_key).items():
+                hit = self.char_postings.get(char)
+                if hit is None:
+                    continue
+                ids, counts = hit
+                a, b = np.searchsorted(ids, (lo, hi))
+                overlap[ids[a:b] - lo] += np.minimum(counts[a:b], count)
+            keep[lo:hi] = overlap >= s * (self.key_lengths[lo:hi] + lb) - 1e-6
+
+        for token in query_key.split():
+            ids = self.token_postings.get(token)
+            if ids is not None:
+                keep[ids] = True
+        return np.flatnonzero(keep)
+
+    def score_batch(self, user_inputs: Sequence[str], score_cutoff: float = 0) -> np.ndarray:
+        """Score many messages against every key in a single cdist call.
+
+        Returns a float32 matrix of shape (len(user_inputs), len(self)) with
+        `token_set_ratio` scores; scores below `score_cutoff` are set to 0.
+        Rows are spread across all cores (`workers=-1`).
+        """
+        queries = [token_key(u) for u in user_inputs]
+        return process.cdist(queries, self.keys, scorer=fuzz.token_set_ratio,
+                             score_cutoff=score_cutoff, dtype=np.float32, workers=-1)
+
+    def match_batch(self, user_inputs: Sequence[str],
+                    threshold: Union[float, Sequence[float]] = 60) -> List[List[str]]:
+        """Match many messages at once; `threshold` may be a scalar or one value per message."""
+        if not len(user_inputs):
+            return []
+        thresholds = np.asarray(threshold, dtype=np.float32).reshape(-1, 1)
+        scores = self.score_batch(user_inputs, score_cutoff=float(thresholds.min()))
+        hits = scores >= thresholds
+        return [self.conditions_for(np.flatnonzero(row)) for row in hits]
+
+    def _score(self, user_input: str, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and scores of the keys scoring at least `threshold`."""
+        u = token_key(user_input)
+        if not u:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = self.candidates(u, threshold)
+        scores = process.cdist([u], [self.keys[i] for i in ids], scorer=fuzz.token_set_ratio,
+                               score_cutoff=threshold, dtype=np.float32)[0]
+        hit = scores >= threshold
+        return ids[hit], scores[hit]
+
+    def match(self, user_input: str, threshold: int = 60, prefilter: bool = True) -> List[str]:
+        """Match free-text input to known conditions using fuzzy match.
+
+        With `prefilter` the inverted index narrows the keys before scoring;
+        the result is identical to scoring every key.
+        """
+        if not prefilter:
+            return self.match_batch([user_input], threshold)[0]
+        ids, _ = self._score(user_input, threshold)
+        return self.conditions_for(ids)
+
+    def rank(self, user_input: str, top_k: int = 5, threshold: int = 60) -> List[Tuple[str, float]]:
+        """Top-k matched conditions by their best key score (0-1), best first."""
+        best: Dict[str, float] = {}
+        for i, score in zip(*self._score(user_input, threshold)):
+            for condition in self.key_conditions[i]:
+                best[condition] = max(best.get(condition, 0.0), float(score) / 100)
+        ranked = sorted(best.items(), key=lambda item: (-item[1], self.condition_position[item[0]]))
+        return ranked[:top_k]
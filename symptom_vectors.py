@@ -0,0 +1,98 @@
+import sys
+import math
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from symptom_index import normalize
+
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    """Character n-grams taken inside word boundaries ("fever" -> " fe", "fev", ...)."""
+    grams = Counter()
+    for word in normalize(text).split():
+        padded = f" {word} "
+        for i in range(max(len(padded) - n + 1, 1)):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+
+# ---- TF-IDF Index ----
+class TfidfSymptomIndex:
+    """Character n-gram TF-IDF vectors for every condition.
+
+    Each condition is one document made of its name and all of its symptoms.
+    The condition x gram matrix is L2-normalized and stored column-wise
+    (CSC layout in plain NumPy arrays), so scoring a message is a single
+    sparse query vector times the matrix: only the columns of grams that
+    occur in the message are touched.
+    """
+
+    def __init__(self, med_data: Dict[str, Any], n: int = 3):
+        self.n = n
+        self.conditions: Tuple[str, ...] = tuple(sys.intern(c) for c in med_data)
+
+        docs = []
+        for condition, info in med_data.items():
+            grams = Counter()
+            for text in [condition, *info.get("symptoms", [])]:
+                grams.update(char_ngrams(text, n))
+            docs.append(grams)
+
+        df = Counter()
+        for grams in docs:
+            df.update(grams.keys())
+        n_docs = len(docs)
+        self.vocabulary: Dict[str, int] = {g: i for i, g in enumerate(sorted(df))}
+        self.idf = np.array(
+            [math.log((1 + n_docs) / (1 + df[g])) + 1 for g in sorted(df)], dtype=np.float32
+        )
+
+        columns: List[List[Tuple[int, float]]] = [[] for _ in self.vocabulary]
+        for row, grams in enumerate(docs):
+            weights = {g: (1 + math.log(tf)) * self.idf[self.vocabulary[g]] for g, tf in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for g, w in weights.items():
+                columns[self.vocabulary[g]].append((row, w / norm))
+
+        self.indptr = np.zeros(len(columns) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(c) for c in columns])
+        self.indices = np.array([r for c in columns for r, _ in c], dtype=np.int32)
+        self.data = np.array([w for c in columns for _, w in c], dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.conditions)
+
+    def query_vector(self, user_input: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sparse, L2-normalized TF-IDF vector of a message as (columns, weights)."""
+        grams = char_ngrams(user_input, self.n)
+        cols = [self.vocabulary[g] for g in grams if g in self.vocabulary]
+        if not cols:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        cols = np.array(cols, dtype=np.int64)
+        tf = np.array([grams[g] for g in grams if g in self.vocabulary], dtype=np.float32)
+        weights = (1 + np.log(tf)) * self.idf[cols]
+        return cols, weights / np.linalg.norm(weights)
+
+    def scores(self, user_input: str) -> np.ndarray:
+        """Cosine similarity of the message against every condition."""
+        cols, weights = self.query_vector(user_input)
+        starts, ends = self.indptr[cols], self.indptr[cols + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return np.zeros(len(self.conditions), dtype=np.float32)
+        # Positions of every stored entry in the selected columns, flattened
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(lengths.sum())
+        values = self.data[positions] * np.repeat(weights, lengths)
+        return np.bincount(self.indices[positions], weights=values,
+                           minlength=len(self.conditions)).astype(np.float32)
+
+    def rank(self, user_input: str, top_k: int = 5, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Top-k conditions by cosine similarity, best first."""
+        scores = self.scores(user_input)
+        if not len(scores) or top_k <= 0:
+            return []
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.conditions[i], float(scores[i])) for i in top if scores[i] > 0 and scores[i] >= min_score]
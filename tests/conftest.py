@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# create_app() requires one outside development configs (config.py)
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
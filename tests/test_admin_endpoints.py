@@ -0,0 +1,42 @@
+import pytest
+
+import app as app_module
+
+ADMIN_ROUTES = ["/sessions/stats", "/db/stats", "/llm/stats"]
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, "KB_ADMIN_TOKEN", "s3cret")
+    app = app_module.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}"})
+    return app.test_client()
+
+
+@pytest.mark.parametrize("path", ADMIN_ROUTES)
+def test_stats_need_the_admin_token(client, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+
+@pytest.mark.parametrize("path", ADMIN_ROUTES)
+def test_stats_disabled_without_a_configured_token(client, monkeypatch, path):
+    monkeypatch.setattr(app_module, "KB_ADMIN_TOKEN", None)
+    assert client.get(path, headers={"X-Admin-Token": "s3cret"}).status_code == 403
+
+
+def test_session_stats_with_token(client):
+    response = client.get("/sessions/stats", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert set(response.get_json()) == {"chatbot", "doctor_chatbot"}
+
+
+def test_db_stats_with_token(client):
+    response = client.get("/db/stats", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert "identity_cache" in response.get_json()
+
+
+def test_llm_stats_do_not_expose_the_upstream_url(client):
+    response = client.get("/llm/stats", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert "base_url" not in response.get_json()["gateway"]
@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import subprocess
+from collections import Counter
+
+import batch_consult
+from conftest import ROOT
+
+CASES = 300
+
+# Child process: run the batch with a fake, jittery run_case and die hard
+# (no flushing, no cleanup) after `crash_after` results have been marked
+CRASHING_RUN = """
+import os, sys, time, random
+import batch_consult
+
+def fake_case(case):
+    time.sleep(random.random() * 0.004)
+    return {"echo": case["symptoms"]}
+
+batch_consult.run_case = fake_case
+crash_after = int(sys.argv[3])
+marks = 0
+original_mark = batch_consult.Checkpoint.mark
+
+def mark(self, line):
+    global marks
+    original_mark(self, line)
+    marks += 1
+    if marks == crash_after:
+        os._exit(1)
+
+batch_consult.Checkpoint.mark = mark
+batch_consult.run_batch(sys.argv[1], sys.argv[2], workers=8, checkpoint_every=10, log_every=0)
+"""
+
+
+def write_cases(path, count=CASES):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, count + 1):
+            f.write(json.dumps({"id": f"c{i}", "symptoms": f"fever {i}"}) + "\n")
+
+
+def output_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(raw)["line"] for raw in f]
+
+
+def test_resume_after_crash_writes_every_line_exactly_once(tmp_path, monkeypatch):
+    cases, output = str(tmp_path / "cases.jsonl"), str(tmp_path / "results.jsonl")
+    write_cases(cases)
+
+    crashed = subprocess.run([sys.executable, "-c", CRASHING_RUN, cases, output, "137"], cwd=ROOT)
+    assert crashed.returncode == 1
+    assert len(output_lines(output)) < CASES
+
+    monkeypatch.setattr(batch_consult, "run_case", lambda case: {"echo": case["symptoms"]})
+    batch_consult.run_batch(cases, output, workers=8, checkpoint_every=10, log_every=0)
+
+    counts = Counter(output_lines(output))
+    assert sorted(counts) == list(range(1, CASES + 1))
+    assert [line for line, n in counts.items() if n > 1] == []
+
+
+def test_checkpoint_keeps_out_of_order_lines(tmp_path):
+    cases, output = str(tmp_path / "cases.jsonl"), str(tmp_path / "results.jsonl")
+    write_cases(cases, 10)
+    open(output, "w").close()
+
+    checkpoint = batch_consult.Checkpoint(output + ".ckpt", cases)
+    for line in (1, 2, 5, 7):
+        checkpoint.mark(line)
+    checkpoint.save(0)
+
+    resumed = batch_consult.Checkpoint(output + ".ckpt", cases)
+    resumed.load(output)
+    assert resumed.completed_through == 2
+    assert [line for line in range(1, 11) if resumed.is_done(line)] == [1, 2, 5, 7]
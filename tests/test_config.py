@@ -0,0 +1,27 @@
+import logging
+
+import pytest
+
+import app as app_module
+from config import Config, SQLiteConfig
+
+
+def test_missing_secret_key_fails_at_startup(monkeypatch):
+    monkeypatch.setattr(Config, "SECRET_KEY", None)
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        app_module.create_app("default")
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        app_module.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"})
+
+
+def test_development_config_generates_a_key_loudly(monkeypatch, caplog):
+    monkeypatch.setattr(Config, "SECRET_KEY", None)
+    with caplog.at_level(logging.WARNING, logger=app_module.logger.name):
+        app = app_module.create_app(type("TestSQLiteConfig", (SQLiteConfig,), {"SQLALCHEMY_DATABASE_URI": "sqlite://"}))
+    assert len(app.config["SECRET_KEY"]) == 64
+    assert "SECRET_KEY is not set" in caplog.text
+
+
+def test_configured_secret_key_is_used(monkeypatch):
+    monkeypatch.setattr(Config, "SECRET_KEY", "from-env")
+    assert app_module.create_app("default").config["SECRET_KEY"] == "from-env"
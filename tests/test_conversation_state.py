@@ -0,0 +1,97 @@
+import pytest
+
+from conversation_state import ConversationState, Stage, STATE_VERSION, _HEADER
+
+
+def roundtrip(state: ConversationState) -> ConversationState:
+    return ConversationState.unpack(state.pack())
+
+
+@pytest.mark.parametrize("stage", list(Stage))
+def test_every_stage_roundtrips(stage):
+    state = ConversationState(stage=stage, symptoms="fever", conversation_active=stage != Stage.GIVE_ADVICE)
+    assert roundtrip(state) == state
+
+
+def test_empty_state_roundtrips():
+    state = ConversationState()
+    assert roundtrip(state) == state
+
+
+def test_non_ascii_text_roundtrips():
+    state = ConversationState(
+        stage=Stage.ASK_ALLERGIES,
+        symptoms="mal de tête et fièvre 🤒",
+        duration="३ दिन",
+        other_symptoms="咳嗽",
+        allergies="pénicilline",
+        kb_version="ab12cd34ef56",
+    )
+    state.set_conditions(["Grippe saisonnière", "感冒"])
+    assert roundtrip(state) == state
+
+
+def test_many_conditions_roundtrip_and_are_interned():
+    state = ConversationState(stage=Stage.GIVE_ADVICE)
+    state.set_conditions([f"Condition {i}" for i in range(5000)])
+    restored = roundtrip(state)
+    assert restored.matched_conditions == state.matched_conditions
+    assert restored.matched_conditions[42] is state.matched_conditions[42]
+
+
+def test_long_text_uses_multibyte_lengths():
+    state = ConversationState(symptoms="x" * 100000)
+    assert roundtrip(state) == state
+
+
+def test_nested_patient_info_roundtrips():
+    info = {"name": "Ravi", "age": 40, "vitals": {"bp": [120, 80], "temp_c": 38.2}, "notes": None}
+    state = ConversationState(stage=Stage.PROVIDE_ASSESSMENT, patient_info=info)
+    assert roundtrip(state).patient_info == info
+
+
+def test_version_2_blob_still_loads():
+    # Version 2 wrote patient_info values as plain strings
+    blob = bytearray(_HEADER.pack(2, Stage.PROVIDE_ASSESSMENT, 1))
+    for text in ("cough", "", "", ""):
+        blob += bytes([len(text)]) + text.encode()
+    blob += bytes([1, 3]) + b"Flu"
+    blob += bytes([1, 3]) + b"age" + bytes([2]) + b"40"
+    blob += bytes([4]) + b"v123"
+    state = ConversationState.unpack(bytes(blob))
+    assert state.stage == Stage.PROVIDE_ASSESSMENT
+    assert state.matched_conditions == ("Flu",)
+    assert state.patient_info == {"age": "40"}
+    assert state.kb_version == "v123"
+
+
+def test_unknown_version_is_rejected():
+    blob = bytearray(ConversationState().pack())
+    blob[0] = STATE_VERSION + 1
+    with pytest.raises(ValueError, match="Unsupported conversation state version"):
+        ConversationState.unpack(bytes(blob))
+
+
+def test_unknown_stage_is_rejected():
+    blob = bytearray(ConversationState().pack())
+    blob[1] = 200
+    with pytest.raises(ValueError):
+        ConversationState.unpack(bytes(blob))
+
+
+@pytest.mark.parametrize("cut", [0, 2, 5, -1])
+def test_truncated_blob_is_rejected(cut):
+    state = ConversationState(symptoms="fever", patient_info={"name": "A"}, kb_version="v1")
+    state.set_conditions(["Flu"])
+    with pytest.raises(ValueError):
+        ConversationState.unpack(state.pack()[:cut])
+
+
+def test_trailing_bytes_are_rejected():
+    with pytest.raises(ValueError, match="trailing"):
+        ConversationState.unpack(ConversationState().pack() + b"\x00")
+
+
+def test_json_state_is_not_accepted():
+    with pytest.raises(ValueError):
+        ConversationState.unpack(b'{"stage": "greeting"}')
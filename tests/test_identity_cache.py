@@ -0,0 +1,58 @@
+import gc
+
+from sqlalchemy import Integer, String, create_engine, update
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+import identity_cache
+from identity_cache import IdentityCache
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Person(Base):
+    __tablename__ = "people"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(50))
+
+
+def _setup():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Person(id=1, name="Ada"))
+        session.commit()
+
+    def load(person_id):
+        with Session(engine) as session:
+            person = session.get(Person, person_id)
+            return {"id": person.id, "name": person.name} if person else None
+
+    return engine, load
+
+
+def test_commit_invalidates_every_watching_cache():
+    engine, load = _setup()
+    caches = [IdentityCache(load), IdentityCache(load)]
+    for cache in caches:
+        cache.watch_model(Person)
+        assert cache.get(1).name == "Ada"
+
+    with Session(engine) as session:
+        session.get(Person, 1).name = "Grace"
+        session.commit()
+    assert [cache.get(1).name for cache in caches] == ["Grace", "Grace"]
+
+    with Session(engine) as session:
+        session.execute(update(Person).where(Person.id == 1).values(name="Edsger"))
+        session.commit()
+    assert [cache.get(1).name for cache in caches] == ["Edsger", "Edsger"]
+
+
+def test_dropped_caches_are_not_kept_alive():
+    _, load = _setup()
+    for _ in range(50):
+        IdentityCache(load).watch_model(Person)
+    gc.collect()
+    assert len(identity_cache._watchers[Person]) == 0
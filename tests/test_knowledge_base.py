@@ -0,0 +1,75 @@
+import os
+import shutil
+
+import pytest
+
+import knowledge_base
+from knowledge_base import KB_SOURCES, KnowledgeBaseHolder, build_knowledge_base
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def kb_dir(tmp_path):
+    for filename in KB_SOURCES.values():
+        shutil.copy(os.path.join(ROOT, filename), tmp_path / filename)
+    return str(tmp_path)
+
+
+def _builds(monkeypatch):
+    """Count how often the KnowledgeBase is compiled rather than unpickled."""
+    built = []
+    original = knowledge_base.KnowledgeBase.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(1)
+        original(self, *args, **kwargs)
+
+    monkeypatch.setattr(knowledge_base.KnowledgeBase, "__init__", counting_init)
+    return built
+
+
+def test_snapshot_is_reused(kb_dir, monkeypatch):
+    snapshot = os.path.join(kb_dir, "kb.pickle")
+    first = build_knowledge_base(kb_dir, snapshot)
+    built = _builds(monkeypatch)
+    second = build_knowledge_base(kb_dir, snapshot)
+    assert built == []
+    assert second.version == first.version
+
+
+def test_snapshot_from_other_code_is_ignored(kb_dir, monkeypatch):
+    snapshot = os.path.join(kb_dir, "kb.pickle")
+    build_knowledge_base(kb_dir, snapshot)
+    monkeypatch.setattr(knowledge_base, "_code_hash", "different-source")
+    built = _builds(monkeypatch)
+    build_knowledge_base(kb_dir, snapshot)
+    assert built == [1]
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_writable_snapshot_is_not_unpickled(kb_dir, monkeypatch):
+    snapshot = os.path.join(kb_dir, "kb.pickle")
+    build_knowledge_base(kb_dir, snapshot)
+    os.chmod(snapshot, 0o666)
+    monkeypatch.setattr(knowledge_base.pickle, "load",
+                        lambda f: pytest.fail("unpickled an untrusted snapshot"))
+    built = _builds(monkeypatch)
+    build_knowledge_base(kb_dir, snapshot, refresh=False)
+    assert built == [1]
+
+
+def test_forced_reload_bypasses_and_rewrites_snapshot(kb_dir, monkeypatch):
+    snapshot = os.path.join(kb_dir, "kb.pickle")
+    holder = KnowledgeBaseHolder(
+        builder=lambda refresh=False: build_knowledge_base(kb_dir, snapshot, refresh=refresh),
+        kb_dir=kb_dir, watch_interval=0)
+    holder.current()
+    written = os.stat(snapshot).st_ino
+
+    built = _builds(monkeypatch)
+    holder.reload()
+    assert built == []  # sources unchanged: nothing to do
+    holder.reload(force=True)
+    assert built == [1]
+    assert os.stat(snapshot).st_ino != written  # replaced by a fresh file
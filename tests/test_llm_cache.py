@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+from llm_cache import LLMCache
+
+
+def test_disk_tier_round_trip(tmp_path):
+    db = str(tmp_path / "cache.db")
+    LLMCache(db_path=db).set("k", "cached text")
+    cache = LLMCache(db_path=db)
+    assert cache.get("k") == "cached text"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["misses"]) == (1, 1)
+
+
+def test_async_disk_tier_runs_off_the_event_loop(tmp_path, monkeypatch):
+    cache = LLMCache(db_path=str(tmp_path / "cache.db"))
+    loop_thread = []
+    disk_threads = []
+    real_get_disk, real_set_disk = cache._get_disk, cache._set_disk
+    monkeypatch.setattr(cache, "_get_disk",
+                        lambda *a: disk_threads.append(threading.get_ident()) or real_get_disk(*a))
+    monkeypatch.setattr(cache, "_set_disk",
+                        lambda *a: disk_threads.append(threading.get_ident()) or real_set_disk(*a))
+
+    async def run():
+        loop_thread.append(threading.get_ident())
+        await cache.aset("k", "v")
+        cache._memory.clear()
+        return await cache.aget("k")
+
+    assert asyncio.run(run()) == "v"
+    assert len(disk_threads) == 2
+    assert loop_thread[0] not in disk_threads
+
+
+def test_purge_runs_once_per_thousand_stores(tmp_path, monkeypatch):
+    cache = LLMCache(db_path=str(tmp_path / "cache.db"))
+    purges = []
+    real_set_disk = cache._set_disk
+
+    def set_disk(key, value, expires_at, stores):
+        if stores % 1000 == 0:
+            purges.append(stores)
+        real_set_disk(key, value, expires_at, stores)
+
+    monkeypatch.setattr(cache, "_set_disk", set_disk)
+    threads = [threading.Thread(target=lambda i=i: [cache.set(f"{i}-{n}", "v") for n in range(500)])
+               for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats()["stores"] == 4000
+    assert sorted(purges) == [1000, 2000, 3000, 4000]
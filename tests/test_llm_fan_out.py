@@ -0,0 +1,44 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import doctor_chatbot
+
+
+def _slow(text, seconds):
+    def call():
+        time.sleep(seconds)
+        return text
+    return call
+
+
+def test_queue_wait_does_not_count_against_timeout(monkeypatch):
+    # One worker: the second call waits for the first before it starts
+    monkeypatch.setattr(doctor_chatbot, "_llm_pool", ThreadPoolExecutor(max_workers=1))
+    results, failed = doctor_chatbot.run_llm_calls(
+        {"a": _slow("A", 0.3), "b": _slow("B", 0.3)}, timeout=0.5)
+    assert failed == []
+    assert results == {"a": "A", "b": "B"}
+
+
+def test_call_times_out_after_pickup(monkeypatch):
+    monkeypatch.setattr(doctor_chatbot, "_llm_pool", ThreadPoolExecutor(max_workers=2))
+    results, failed = doctor_chatbot.run_llm_calls(
+        {"fast": _slow("F", 0.01), "slow": _slow("S", 1.0)}, timeout=0.2)
+    assert results == {"fast": "F", "slow": None}
+    assert failed == ["slow"]
+
+
+def test_call_stuck_in_the_queue_falls_back(monkeypatch):
+    # One worker, busy for longer than the queue timeout
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(doctor_chatbot, "_llm_pool", pool)
+    pool.submit(time.sleep, 0.6)
+    ran = []
+    started = time.monotonic()
+    results, failed = doctor_chatbot.run_llm_calls(
+        {"queued": lambda: ran.append(1) or "Q"}, timeout=1.0, queue_timeout=0.2)
+    assert results == {"queued": None}
+    assert failed == ["queued"]
+    assert time.monotonic() - started < 0.5
+    pool.shutdown(wait=True)
+    assert ran == []  # cancelled before a worker got to it
@@ -0,0 +1,133 @@
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from llm_gateway import LLMGateway
+
+
+class FakeClient:
+    """Sync/async OpenAI stand-in: `delays` maps model -> seconds before answering,
+    `timeouts` lists models whose (sync) attempts time out after their delay."""
+
+    def __init__(self, delays, timeouts=()):
+        self.delays = delays
+        self.timeouts = timeouts
+        self.threads = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _response(self, model):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=model))])
+
+    def create(self, *, model, timeout=None, **kwargs):
+        self.threads.append(threading.current_thread())
+        time.sleep(self.delays.get(model, 0))
+        if model in self.timeouts:
+            raise openai.APITimeoutError(request=None)
+        return self._response(model)
+
+
+class FakeAsyncClient(FakeClient):
+    async def create(self, *, model, timeout=None, **kwargs):
+        await asyncio.sleep(self.delays.get(model, 0))
+        return self._response(model)
+
+
+def gateway_with(client, hedge=True, warm_latency=0.01):
+    gateway = LLMGateway(api_key="x", hedge=hedge, fallback_model="fast")
+    gateway._sync = client
+    gateway._async = client
+    for _ in range(50):
+        gateway._window("slow").record(warm_latency)  # hedge after LLM_HEDGE_MIN_DELAY
+    return gateway
+
+
+def test_unhedged_call_runs_on_callers_thread():
+    client = FakeClient({})
+    gateway = gateway_with(client, hedge=False)
+    gateway.create(model="slow", messages=[])
+    assert client.threads == [threading.current_thread()]
+    assert gateway.metrics["calls"] == 1
+
+
+def test_hedge_answers_a_timed_out_primary_instead_of_a_retry():
+    client = FakeClient({"slow": 1.0, "fast": 0.0}, timeouts={"slow"})
+    gateway = gateway_with(client)
+    response = gateway.create(model="slow", messages=[])
+    assert response.choices[0].message.content == "fast"
+    assert client.threads[0] is threading.current_thread()  # the primary ran inline
+    assert client.threads[1].name.startswith("llm-hedge")
+    assert gateway.metrics["calls"] == 1
+    assert gateway.metrics["hedged"] == 1
+    assert gateway.metrics["hedge_wins"] == 1
+    assert gateway.metrics["attempts"] == 2
+    assert gateway.metrics["retries"] == 0
+
+
+def test_primary_that_answers_first_sends_no_hedge():
+    client = FakeClient({"slow": 0.0})
+    gateway = gateway_with(client)
+    for _ in range(20):
+        gateway.create(model="slow", messages=[])
+    time.sleep(0.7)  # past the hedge delay: the disarmed timers stay quiet
+    assert client.threads == [threading.current_thread()] * 20
+    assert gateway.metrics["hedged"] == 0
+    assert gateway._hedge_pool is None
+
+
+def test_slow_primary_still_answers_when_hedged():
+    client = FakeClient({"slow": 1.0, "fast": 2.0})
+    gateway = gateway_with(client)
+    response = gateway.create(model="slow", messages=[])
+    assert response.choices[0].message.content == "slow"
+    assert gateway.metrics["hedged"] == 1
+    assert gateway.metrics["hedge_wins"] == 0
+
+
+def test_async_hedge_wins_and_counts_one_call():
+    client = FakeAsyncClient({"slow": 3.0, "fast": 0.0})
+    gateway = gateway_with(client)
+    response = asyncio.run(gateway.acreate(model="slow", messages=[]))
+    assert response.choices[0].message.content == "fast"
+    assert gateway.metrics["calls"] == 1
+    assert gateway.metrics["hedge_wins"] == 1
+
+
+def _half_open(gateway):
+    clock = [0.0]
+    gateway.breaker.clock = lambda: clock[0]
+    for _ in range(gateway.breaker.failure_threshold):
+        gateway.breaker.record_failure()
+    clock[0] += gateway.breaker.reset_timeout
+    return clock
+
+
+def test_cancelled_half_open_trial_releases_the_breaker():
+    client = FakeAsyncClient({"slow": 5.0, "fast": 0.0})
+    gateway = gateway_with(client, hedge=False)
+    clock = _half_open(gateway)
+
+    async def cancelled_trial():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(gateway.acreate(model="slow", messages=[]), 0.05)
+
+    asyncio.run(cancelled_trial())
+    assert gateway.breaker.state == "open"
+    assert not gateway.breaker._trial_in_flight
+
+    clock[0] += gateway.breaker.reset_timeout
+    response = asyncio.run(gateway.acreate(model="fast", messages=[]))
+    assert response.choices[0].message.content == "fast"
+    assert gateway.breaker.state == "closed"
+
+
+def test_lost_half_open_trial_goes_stale():
+    gateway = gateway_with(FakeClient({}), hedge=False)
+    clock = _half_open(gateway)
+    assert gateway.breaker.allow()  # the trial, which never reports back
+    assert not gateway.breaker.allow()
+    clock[0] += gateway.breaker.reset_timeout
+    assert gateway.breaker.allow()
@@ -0,0 +1,30 @@
+import json
+import os
+
+from conftest import ROOT
+from matchers import VectorMatcher
+from symptom_vectors import TfidfSymptomIndex
+
+
+def _matcher():
+    with open(os.path.join(ROOT, "new.json"), encoding="utf-8") as f:
+        return VectorMatcher(TfidfSymptomIndex(json.load(f)), min_score=0.0)
+
+
+def test_vector_threshold_is_a_cosine_percentage():
+    matcher = _matcher()
+    query = "fever and a sore throat"
+    ranked = matcher.rank(query)
+    assert ranked
+    cutoff = ranked[0][1] * 100
+    strict = matcher.match(query, threshold=int(cutoff) + 1)
+    loose = matcher.match(query, threshold=0)
+    assert strict == []
+    assert loose == [condition for condition, _ in ranked]
+    assert all(score >= 0.3 for _, score in matcher.rank(query, threshold=30))
+
+
+def test_vector_without_threshold_uses_min_score():
+    matcher = _matcher()
+    matcher.min_score = 1.01
+    assert matcher.match("fever") == []
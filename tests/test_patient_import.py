@@ -0,0 +1,63 @@
+import io
+import json
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+import app as app_module
+from models import Patient
+from patient_import import import_patients, read_rows
+
+TABLE = Patient.__table__
+
+
+def _import(lines, session):
+    errors = []
+    stream = io.StringIO("\n".join(json.dumps(line) for line in lines))
+    counts = import_patients(read_rows(stream, "ndjson"), session, TABLE, chunk_size=2,
+                             on_error=lambda *error: errors.append(error))
+    return counts, errors
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    TABLE.create(engine)
+    return Session(engine)
+
+
+def test_emails_are_lowercased_and_deduplicated_case_insensitively():
+    session = _session()
+    counts, errors = _import([
+        {"full_name": "Ada", "email": "Ada@Example.com", "password_hash": "x"},
+        {"full_name": "Ada again", "email": "ada@example.COM", "password_hash": "x"},
+    ], session)
+    assert counts == {"rows": 2, "inserted": 1, "duplicates": 1, "invalid": 0}
+    assert session.execute(select(TABLE.c.email)).scalars().all() == ["ada@example.com"]
+
+    counts, _ = _import([{"full_name": "Ada", "email": "ADA@example.com", "password_hash": "x"}], session)
+    assert counts["duplicates"] == 1 and counts["inserted"] == 0
+
+
+def test_invalid_rows_are_counted_by_status_not_message():
+    session = _session()
+    counts, errors = _import([
+        {"full_name": "No Email", "password_hash": "x"},
+        {"full_name": "Bad", "email": "not-an-email", "password_hash": "x"},
+        {"full_name": "Grace", "email": "grace@example.com", "password_hash": "x", "gender": "robot"},
+        {"full_name": "Grace", "email": "grace@example.com", "password_hash": "x"},
+    ], session)
+    assert counts == {"rows": 4, "inserted": 1, "duplicates": 0, "invalid": 3}
+    assert [line for line, _, _ in errors] == [1, 2, 3]
+
+
+def test_imported_patient_can_log_in_whatever_the_email_case(monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, "PATIENT_IMPORT_TOKEN", "import-token")
+    client = app_module.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}"}).test_client()
+    body = json.dumps({"full_name": "Ada", "email": " Ada@Example.com ", "password": "pw-12345"})
+    response = client.post("/patients/import?format=ndjson", data=body,
+                           headers={"X-Import-Token": "import-token", "Content-Type": "application/x-ndjson"})
+    assert response.get_json()["inserted"] == 1
+
+    assert client.post("/login", json={"email": "ADA@example.com ", "password": "pw-12345"}).status_code == 200
+    response = client.post("/register", json={"full_name": "Ada", "email": "ada@EXAMPLE.com", "password": "x"})
+    assert response.status_code == 400
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from session_backends import SQLiteSessionBackend
+from session_store import PersistentSessionStore, SessionConflict
+
+
+class Counter:
+    __slots__ = ("turns", "__weakref__")
+
+    def __init__(self, turns=0):
+        self.turns = turns
+
+    def dumps(self) -> bytes:
+        return str(self.turns).encode()
+
+    @classmethod
+    def loads(cls, blob: bytes) -> "Counter":
+        return cls(int(blob))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PersistentSessionStore(Counter, SQLiteSessionBackend(str(tmp_path / "sessions.db")), "test")
+
+
+def test_concurrent_turn_from_another_worker_is_rejected(store):
+    first = store.get_or_create("s")
+    store.save("s", first)
+
+    a, b = store.get("s"), store.get("s")
+    a.turns += 1
+    store.save("s", a)
+    b.turns += 1
+    with pytest.raises(SessionConflict):
+        store.save("s", b)
+    assert store.get("s").turns == 1
+    assert store.stats()["conflicts"] == 1
+
+
+def test_two_new_sessions_with_one_id_conflict(store):
+    a, b = store.get_or_create("s"), store.get_or_create("s")
+    store.save("s", a)
+    with pytest.raises(SessionConflict):
+        store.save("s", b)
+
+
+def test_manager_can_save_again_after_its_own_save(store):
+    manager = store.get_or_create("s")
+    for _ in range(3):
+        manager.turns += 1
+        store.save("s", manager)
+    assert store.get("s").turns == 3
+
+
+def test_locked_turns_in_one_process_never_lose_updates(store):
+    def turns():
+        for _ in range(20):
+            with store.lock("s"):
+                manager = store.get_or_create("s")
+                manager.turns += 1
+                store.save("s", manager)
+
+    threads = [threading.Thread(target=turns) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.get("s").turns == 160
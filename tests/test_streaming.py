@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import chatbot
+from llm_gateway import LLMUnavailableError
+from streaming import (PendingReply, StreamInterrupted, StreamResult, astream_with_fallback,
+                       iter_reply, resolve_reply, stream_with_fallback, with_fields)
+
+
+def _deltas(*parts, fail=None):
+    def gen():
+        for part in parts:
+            yield part
+        if fail is not None:
+            raise fail
+        return "".join(parts).strip()
+    return gen()
+
+
+async def _adeltas(*parts, fail=None):
+    for part in parts:
+        yield part
+    if fail is not None:
+        raise fail
+
+
+def _drain(gen):
+    items = []
+    while True:
+        try:
+            items.append(next(gen))
+        except StopIteration as stop:
+            return items, stop.value
+
+
+def _adrain(agen):
+    async def run():
+        return [item async for item in agen]
+    return asyncio.run(run())
+
+
+def test_completed_stream_passes_through():
+    items, text = _drain(stream_with_fallback(_deltas("Rest ", "well."), lambda: "fallback"))
+    assert items == ["Rest ", "well."]
+    assert text == "Rest well."
+
+
+def test_failure_before_any_delta_sends_fallback():
+    items, text = _drain(stream_with_fallback(_deltas(fail=LLMUnavailableError("down")), lambda: "fallback"))
+    assert items == ["fallback"]
+    assert text == "fallback"
+
+
+def test_failure_mid_stream_keeps_partial_text():
+    items, text = _drain(stream_with_fallback(_deltas("Rest ", "and ", fail=RuntimeError("reset")),
+                                              lambda: "fallback"))
+    assert items[:2] == ["Rest ", "and "]
+    assert isinstance(items[2], StreamInterrupted)
+    assert len(items) == 3
+    assert text == "Rest and"
+
+
+def test_unlisted_errors_propagate():
+    with pytest.raises(RuntimeError):
+        _drain(stream_with_fallback(_deltas("Rest", fail=RuntimeError("bug")), lambda: "fallback",
+                                    (LLMUnavailableError,)))
+
+
+def test_async_failure_mid_stream_keeps_partial_text():
+    items = _adrain(astream_with_fallback(_adeltas("Rest ", "and ", fail=RuntimeError("reset")),
+                                          lambda: "fallback"))
+    assert items[:2] == ["Rest ", "and "]
+    assert isinstance(items[2], StreamInterrupted)
+    assert isinstance(items[3], StreamResult) and items[3].value == "Rest and"
+
+
+def test_async_failure_before_any_delta_sends_fallback():
+    items = _adrain(astream_with_fallback(_adeltas(fail=RuntimeError("down")), lambda: "fallback"))
+    assert items[0] == "fallback"
+    assert items[1].value == "fallback"
+
+
+def test_interrupted_reply_ends_with_marker_then_partial_done(monkeypatch):
+    monkeypatch.setattr(chatbot, "stream_completion",
+                        lambda client, **kwargs: _deltas("Drink ", "water", fail=LLMUnavailableError("open")))
+    reply = PendingReply(
+        complete=lambda: "",
+        stream=lambda: chatbot.stream_plaintext_response("cough", ["Cold"], "", "2 days", "none", []),
+        finish=lambda text: {"reply_text": text},
+    )
+    events = list(iter_reply(reply))
+    assert [name for name, _ in events] == ["delta", "delta", "interrupted", "done"]
+    assert events[-1][1] == {"reply_text": "Drink water"}
+
+
+def test_with_fields_reaches_plain_and_pending_replies():
+    assert with_fields({"reply_text": "hi"}, stage="greeting") == {"reply_text": "hi", "stage": "greeting"}
+    reply = with_fields(PendingReply(complete=lambda: "done", stream=lambda: _deltas("done"),
+                                     finish=lambda text: {"reply_text": text}), stage="give_advice")
+    assert resolve_reply(reply) == {"reply_text": "done", "stage": "give_advice"}
+
+
+def test_chat_replies_report_the_stage_moved_to():
+    bot = chatbot.ConversationManager()
+    assert bot.process("hi")["stage"] == "ask_symptoms"